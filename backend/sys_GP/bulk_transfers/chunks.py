@@ -0,0 +1,153 @@
+# bulk_transfers/chunks.py
+"""
+Exécution d'un même Job par plusieurs workers, en tranches.
+
+Après validation, un Job de plus de BULK_CHUNK_ROWS lignes est découpé en
+tranches (BulkTransferChunk) : des plages contiguës de lignes du fichier.
+Chaque tranche est réservée par un worker (bulk_transfers/worker.py) et
+exécutée comme un Job à part entière via process_utils.execute_rows, sur sa
+seule plage. Les workers de plusieurs processus ou machines avancent ainsi en
+parallèle sur le même fichier.
+
+Le finaliseur (finalize_job) est appelé à la fin de chaque tranche : quand plus
+aucune tranche n'est en attente ni en cours, il totalise les compteurs des
+tranches et clôt le Job (COMPLETED, ou FAILED si une tranche a échoué).
+"""
+import os
+
+from django.db.models import Count, Exists, OuterRef, Q, Sum
+from django.utils import timezone
+
+from transfert.ledger import job_reference, release
+from transfert.models import Transfer
+from .models import BulkTransferChunk, BulkTransferJob
+from .process_utils import execute_rows
+
+# Nombre de lignes par tranche ; un Job plus petit est exécuté d'un bloc (0 : jamais découpé).
+# La tranche est aussi l'unité d'ordonnancement entre Jobs : un worker ne change de Job
+# qu'entre deux tranches, d'où une taille qui reste de l'ordre de quelques secondes d'envoi.
+CHUNK_ROWS = int(os.environ.get("BULK_CHUNK_ROWS", "5000"))
+
+UNFINISHED_STATUSES = ('PENDING', 'PROCESSING')
+
+
+def partition_job(job_id, chunk_rows=None):
+    """
+    Découpe un Job validé en tranches et le passe en PROCESSING.
+    Retourne False si le Job est assez petit pour être exécuté d'un bloc.
+
+    Un Job déjà découpé (reprise après FAILED) garde ses tranches : seules les
+    tranches en échec repartent, les lignes déjà enregistrées ne sont pas renvoyées.
+    """
+    chunk_rows = CHUNK_ROWS if chunk_rows is None else chunk_rows
+    job = BulkTransferJob.objects.get(id=job_id)
+    chunks = BulkTransferChunk.objects.filter(job=job)
+
+    if chunks.exists():
+        chunks.filter(status='FAILED').update(
+            status='PENDING',
+            claimed_by=None,
+            heartbeat_at=None,
+            finished_at=None,
+            error_message='',
+        )
+    elif chunk_rows <= 0 or job.total_transfers <= chunk_rows:
+        return False
+    else:
+        BulkTransferChunk.objects.bulk_create([
+            BulkTransferChunk(
+                job=job,
+                sequence=sequence,
+                first_line=first_line,
+                last_line=min(first_line + chunk_rows - 1, job.total_transfers),
+            )
+            for sequence, first_line in enumerate(range(1, job.total_transfers + 1, chunk_rows))
+        ])
+
+    job.status = 'PROCESSING'
+    job.save(update_fields=['status'])
+    # Toutes les tranches peuvent déjà être terminées (échec survenu après la dernière)
+    finalize_job(job.id)
+    return True
+
+
+def partitioned_jobs():
+    """Condition « le Job est exécuté en tranches », utilisable dans un filter()."""
+    return Exists(BulkTransferChunk.objects.filter(job=OuterRef('pk')))
+
+
+def process_chunk(chunk_id, max_in_flight=None, claim_lost=None):
+    """
+    Exécute la plage de lignes d'une tranche réservée, puis tente de finaliser son Job.
+    `claim_lost` : voir process_utils.process_bulk_file.
+    """
+    chunk = BulkTransferChunk.objects.select_related('job', 'job__submitter').get(id=chunk_id)
+    execute_rows(chunk.job, chunk.first_line, chunk.last_line, max_in_flight=max_in_flight, claim_lost=claim_lost)
+    _close_chunk(chunk, 'COMPLETED')
+
+
+def fail_chunk(chunk_id, message):
+    """Passe une tranche en FAILED ; le Job est clos en FAILED une fois les autres terminées."""
+    chunk = BulkTransferChunk.objects.filter(id=chunk_id).first()
+    if chunk is not None:
+        chunk.error_message = message
+        _close_chunk(chunk, 'FAILED')
+
+
+def _close_chunk(chunk, status):
+    """Enregistre le statut final et les compteurs de la plage d'une tranche, puis tente de finaliser son Job."""
+    counts = Transfer.objects.filter(
+        bulk_job_id=chunk.job_id, bulk_line__gte=chunk.first_line, bulk_line__lte=chunk.last_line,
+    ).aggregate(
+        completed=Count('id', filter=Q(status='MOJALOOP_COMPLETED')),
+        failed=Count('id', filter=Q(status='FAILED')),
+    )
+    chunk.transfers_completed = counts['completed']
+    chunk.transfers_failed = counts['failed']
+    chunk.status = status
+    chunk.finished_at = timezone.now()
+    chunk.save(update_fields=['transfers_completed', 'transfers_failed', 'status', 'finished_at', 'error_message'])
+    finalize_job(chunk.job_id)
+
+
+def finalize_job(job_id):
+    """
+    Clôt le Job si toutes ses tranches sont terminées ; retourne True si cet appel
+    l'a clos. Plusieurs workers peuvent finir leur tranche en même temps : l'UPDATE
+    filtré sur PROCESSING garantit qu'un seul d'entre eux clôt le Job.
+    """
+    chunks = BulkTransferChunk.objects.filter(job_id=job_id)
+    if chunks.filter(status__in=UNFINISHED_STATUSES).exists():
+        return False
+
+    totals = chunks.aggregate(
+        completed=Sum('transfers_completed'),
+        failed=Sum('transfers_failed'),
+        failed_chunks=Count('id', filter=Q(status='FAILED')),
+    )
+    now = timezone.now()
+    fields = {
+        'transfers_completed': totals['completed'] or 0,
+        'transfers_failed': totals['failed'] or 0,
+        'finished_at': now,
+        'progress_updated_at': now,
+    }
+    if totals['failed_chunks']:
+        fields['status'] = 'FAILED'
+        fields['error_message'] = f"{totals['failed_chunks']} tranche(s) en échec ; relancez le Job pour les reprendre."
+    else:
+        fields['status'] = 'COMPLETED'
+    closed = bool(BulkTransferJob.objects.filter(id=job_id, status='PROCESSING').update(**fields))
+    if closed:
+        release(job_reference(job_id))
+    return closed
+
+
+def chunk_summary(job):
+    """État des tranches d'un Job (liste vide s'il est exécuté d'un bloc)."""
+    return list(
+        BulkTransferChunk.objects.filter(job=job).order_by('sequence').values(
+            'sequence', 'first_line', 'last_line', 'status', 'claimed_by',
+            'transfers_completed', 'transfers_failed', 'error_message',
+        )
+    )
@@ -0,0 +1,180 @@
+# bulk_transfers/csv_stream.py
+"""
+Lecture en flux des fichiers CSV de transferts de masse.
+
+Le fichier n'est jamais chargé en mémoire : les lignes sont lues une à une,
+ce qui permet de résumer, paginer ou exécuter des fichiers de plusieurs
+centaines de milliers de lignes à mémoire constante.
+
+Colonnes attendues : type_id, valeur_id, devise, montant, nom_complet
+(+ fsp_id optionnelle).
+
+À l'upload, la position (en octets) d'une ligne sur ROW_INDEX_STEP est relevée
+(BulkTransferJob.row_index) : une page de la liste des bénéficiaires est lue à
+partir de l'entrée la plus proche, sans reparcourir le début du fichier.
+"""
+import csv
+import decimal
+from contextlib import contextmanager
+from io import TextIOWrapper
+from itertools import islice
+
+REQUIRED_COLUMNS = ('type_id', 'valeur_id', 'devise', 'montant')
+
+# Pas de l'index des positions : une entrée pour les lignes 1, 1 + ROW_INDEX_STEP, ...
+ROW_INDEX_STEP = 1000
+
+
+def iter_csv_rows(binary_file):
+    """
+    Itère sur les lignes d'un fichier CSV binaire et produit (numéro_ligne, ligne),
+    la numérotation commençant à 1 pour la première ligne de données.
+    """
+    # utf-8-sig : tolère le BOM ajouté par Excel en tête de fichier
+    text = TextIOWrapper(binary_file, encoding='utf-8-sig', newline='')
+    try:
+        for line_number, row in enumerate(csv.DictReader(text), start=1):
+            yield line_number, row
+    finally:
+        # Rend la main sur le fichier sous-jacent sans le fermer
+        text.detach()
+
+
+class _Lines:
+    """
+    Lignes décodées d'un fichier binaire, pour csv.reader. `position` est l'octet
+    qui suit la dernière ligne lue : csv.reader ne lisant jamais au-delà de
+    l'enregistrement en cours, c'est le début de l'enregistrement suivant.
+    """
+
+    def __init__(self, binary_file):
+        self.file = binary_file
+        self.position = binary_file.tell()
+        # utf-8-sig : tolère le BOM ajouté par Excel en tête de fichier
+        self.encoding = 'utf-8-sig' if self.position == 0 else 'utf-8'
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        line = self.file.readline()
+        if not line:
+            raise StopIteration
+        self.position += len(line)
+        text = line.decode(self.encoding)
+        self.encoding = 'utf-8'
+        return text
+
+
+def iter_indexed_rows(binary_file, index):
+    """
+    Comme iter_csv_rows, en ajoutant à `index` la position du début des lignes
+    1, 1 + ROW_INDEX_STEP, 1 + 2 * ROW_INDEX_STEP, ... au fil de la lecture.
+    """
+    lines = _Lines(binary_file)
+    reader = csv.DictReader(lines)
+    reader.fieldnames  # lecture de l'en-tête : la ligne 1 commence après
+    start = lines.position
+    for line_number, row in enumerate(reader, start=1):
+        if (line_number - 1) % ROW_INDEX_STEP == 0:
+            index.append(start)
+        start = lines.position
+        yield line_number, row
+
+
+@contextmanager
+def open_job_rows(job, index=None):
+    """
+    Ouvre le fichier d'un Job et fournit l'itérateur de ses lignes ; avec une
+    liste `index`, les positions des lignes y sont relevées (iter_indexed_rows).
+    """
+    with job.file.open('rb') as binary_file:
+        rows = iter_csv_rows(binary_file) if index is None else iter_indexed_rows(binary_file, index)
+        try:
+            yield rows
+        finally:
+            # Termine le générateur tant que le fichier est encore ouvert
+            rows.close()
+
+
+def parse_amount(value):
+    """Montant décimal strictement positif, ou None s'il est invalide."""
+    try:
+        amount = decimal.Decimal(str(value).strip())
+    except (decimal.InvalidOperation, ValueError):
+        return None
+    if not amount.is_finite() or amount <= 0:
+        return None
+    return amount
+
+
+def row_errors(row):
+    """Liste des problèmes détectés sur une ligne (vide si la ligne est exploitable)."""
+    errors = [f"Colonne manquante ou vide : {column}" for column in REQUIRED_COLUMNS if not (row.get(column) or '').strip()]
+    if row.get('montant') and parse_amount(row['montant']) is None:
+        errors.append(f"Montant invalide : {row['montant']}")
+    return errors
+
+
+def recipient(row):
+    """Représentation d'une ligne pour l'affichage côté frontend."""
+    amount = parse_amount(row.get('montant'))
+    return {
+        'phoneNumber': row.get('valeur_id', ''),
+        'fullName': row.get('nom_complet', ''),
+        'amount': float(amount) if amount is not None else 0,
+        'currency': row.get('devise') or 'XOF',
+    }
+
+
+def summarize_rows(rows):
+    """
+    Résume un itérateur de lignes en un seul passage : nombre de lignes,
+    lignes valides/invalides et montants (total et par devise).
+    """
+    total_rows = 0
+    invalid_rows = 0
+    total_amount = decimal.Decimal('0')
+    amount_by_currency = {}
+
+    for _, row in rows:
+        total_rows += 1
+        if row_errors(row):
+            invalid_rows += 1
+            continue
+        amount = parse_amount(row['montant'])
+        total_amount += amount
+        currency = row['devise'].strip()
+        amount_by_currency[currency] = amount_by_currency.get(currency, decimal.Decimal('0')) + amount
+
+    return {
+        'total_rows': total_rows,
+        'valid_rows': total_rows - invalid_rows,
+        'invalid_rows': invalid_rows,
+        'total_amount': total_amount,
+        'amount_by_currency': amount_by_currency,
+    }
+
+
+def page(rows, offset, limit):
+    """Lignes [offset, offset + limit) d'un itérateur, sans matérialiser le reste."""
+    return list(islice(rows, offset, offset + limit))
+
+
+def job_page(job, offset, limit):
+    """
+    Lignes [offset, offset + limit) du fichier d'un Job, lues à partir de l'entrée
+    de Job.row_index la plus proche : au plus ROW_INDEX_STEP + limit lignes parsées.
+    Sans index (Job antérieur), le fichier est lu depuis le début.
+    """
+    if not job.row_index:
+        with open_job_rows(job) as rows:
+            return page(rows, offset, limit)
+
+    entry = min(offset // ROW_INDEX_STEP, len(job.row_index) - 1)
+    first_line = entry * ROW_INDEX_STEP + 1
+    with job.file.open('rb') as binary_file:
+        fieldnames = csv.DictReader(_Lines(binary_file)).fieldnames
+        binary_file.seek(job.row_index[entry])
+        rows = enumerate(csv.DictReader(_Lines(binary_file), fieldnames=fieldnames), start=first_line)
+        return page(rows, offset - (first_line - 1), limit)
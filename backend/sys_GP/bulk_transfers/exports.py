@@ -0,0 +1,193 @@
+# bulk_transfers/exports.py
+"""
+Export en flux des rapports de Job (CSV, CSV gzip, XLSX).
+
+Les transferts sont lus par paquets via un curseur serveur (QuerySet.iterator)
+et seules les colonnes du rapport sont chargées : la mémoire reste constante
+quelle que soit la taille du Job. Aucun format ne passe par un fichier
+temporaire : le XLSX est une archive zip écrite au fil de l'eau.
+"""
+import csv
+import re
+import zipfile
+import zlib
+from xml.sax.saxutils import escape, quoteattr
+
+from transfert.models import Transfer
+
+REPORT_HEADER = ['Bénéficiaire', 'Montant', 'Devise', 'Référence', 'Statut', 'Message erreur', 'Horodatage', 'ID transaction']
+
+# Nombre de transferts lus par aller-retour avec la base
+FETCH_CHUNK_SIZE = 2000
+# Nombre de lignes CSV regroupées par morceau envoyé au client
+CSV_ROWS_PER_CHUNK = 500
+
+
+def report_rows(job):
+    """Lignes du rapport d'un Job, dans l'ordre d'exécution."""
+    transfers = (
+        Transfer.objects.filter(bulk_job=job)
+        .order_by('created_at', 'id')
+        .values_list(
+            'receiver_msisdn', 'amount', 'currency', 'note', 'status',
+            'error_message', 'created_at', 'home_transaction_id',
+        )
+        .iterator(chunk_size=FETCH_CHUNK_SIZE)
+    )
+    for receiver_msisdn, amount, currency, note, status, error_message, created_at, home_transaction_id in transfers:
+        yield [
+            receiver_msisdn,
+            str(amount),
+            currency,
+            note or 'N/A', # Utiliser note comme référence temporaire
+            status,
+            error_message or '',
+            created_at.strftime('%Y-%m-%d %H:%M:%S'),
+            home_transaction_id,
+        ]
+
+
+class _Echo:
+    """Pseudo-fichier : csv.writer renvoie directement la ligne formatée."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(job):
+    """Rapport CSV en morceaux de texte."""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(REPORT_HEADER)
+
+    lines = []
+    for row in report_rows(job):
+        lines.append(writer.writerow(row))
+        if len(lines) >= CSV_ROWS_PER_CHUNK:
+            yield ''.join(lines)
+            lines = []
+    if lines:
+        yield ''.join(lines)
+
+
+def iter_csv_gzip(job):
+    """Rapport CSV compressé gzip à la volée."""
+    compressor = zlib.compressobj(wbits=31)  # 16 + MAX_WBITS : en-tête gzip
+    for chunk in iter_csv(job):
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+# Parties fixes du classeur XLSX (SpreadsheetML) ; la feuille est écrite en flux
+_XLSX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+_XLSX_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+_XLSX_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name={title} sheetId="1" r:id="rId1"/></sheets></workbook>'
+)
+_XLSX_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+    '<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>'
+    '</Relationships>'
+)
+_XLSX_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/></cellXfs>'
+    '</styleSheet>'
+)
+_XLSX_SHEET_HEAD = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+_XLSX_SHEET_TAIL = '</sheetData></worksheet>'
+_XLSX_COLUMNS = 'ABCDEFGH'
+# Colonne numérique du rapport (Montant) ; les autres sont du texte
+_XLSX_NUMBER_COLUMN = 1
+# Caractères de contrôle interdits en XML 1.0
+_XML_ILLEGAL = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+class _ZipStream:
+    """Pseudo-fichier non positionnable : zipfile y écrit, iter_xlsx en retire les octets produits."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _xlsx_row(number, row):
+    cells = []
+    for index, value in enumerate(row):
+        ref = f"{_XLSX_COLUMNS[index]}{number}"
+        if index == _XLSX_NUMBER_COLUMN and number > 1:
+            cells.append(f'<c r="{ref}"><v>{value}</v></c>')
+        else:
+            text = escape(_XML_ILLEGAL.sub('', str(value)))
+            cells.append(f'<c r="{ref}" t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>')
+    return f'<row r="{number}">{"".join(cells)}</row>'
+
+
+def iter_xlsx(job):
+    """
+    Rapport XLSX (une feuille « Job {id} », montants numériques) en morceaux
+    d'octets : l'archive zip est produite au fil de la lecture des transferts,
+    sans fichier temporaire ni classeur en mémoire.
+    """
+    stream = _ZipStream()
+    with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('[Content_Types].xml', _XLSX_CONTENT_TYPES)
+        archive.writestr('_rels/.rels', _XLSX_ROOT_RELS)
+        archive.writestr('xl/workbook.xml', _XLSX_WORKBOOK.format(title=quoteattr(f"Job {job.id}")))
+        archive.writestr('xl/_rels/workbook.xml.rels', _XLSX_WORKBOOK_RELS)
+        archive.writestr('xl/styles.xml', _XLSX_STYLES)
+        yield stream.drain()
+
+        # force_zip64 : taille de la feuille inconnue avant la fin du flux
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            lines = [_XLSX_SHEET_HEAD, _xlsx_row(1, REPORT_HEADER)]
+            for number, row in enumerate(report_rows(job), start=2):
+                lines.append(_xlsx_row(number, row))
+                if len(lines) >= CSV_ROWS_PER_CHUNK:
+                    sheet.write(''.join(lines).encode('utf-8'))
+                    lines = []
+                    data = stream.drain()
+                    if data:
+                        yield data
+            lines.append(_XLSX_SHEET_TAIL)
+            sheet.write(''.join(lines).encode('utf-8'))
+    yield stream.drain()
@@ -0,0 +1,92 @@
+import multiprocessing
+import os
+import signal
+
+from django.core.management.base import BaseCommand
+from prometheus_client import start_http_server
+from django.db import connections
+
+from bulk_transfers.worker import POLL_INTERVAL, run_worker
+from transfert.metrics import registry
+from transfert.services import sdk_client
+
+
+class Command(BaseCommand):
+    help = "Démarre un pool de workers qui exécutent les Jobs de transferts de masse en file (statut UPLOADED)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int,
+            default=int(os.environ.get("BULK_WORKER_PROCESSES", "1")),
+            help="Nombre de processus workers (défaut: BULK_WORKER_PROCESSES ou 1).",
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=POLL_INTERVAL,
+            help="Secondes d'attente lorsque la file est vide.",
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help="Vide la file puis s'arrête au lieu de tourner en continu.",
+        )
+        parser.add_argument(
+            '--metrics-port', type=int,
+            default=int(os.environ.get("BULK_METRICS_PORT", "0")),
+            help="Port HTTP des métriques Prometheus des workers (défaut: BULK_METRICS_PORT, 0 : désactivé).",
+        )
+        parser.add_argument(
+            '--metrics-addr',
+            default=os.environ.get("BULK_METRICS_ADDR", "127.0.0.1"),
+            help="Adresse d'écoute des métriques des workers (défaut: BULK_METRICS_ADDR, 127.0.0.1).",
+        )
+
+    def handle(self, *args, **options):
+        workers = max(1, options['workers'])
+        poll_interval = options['poll_interval']
+        once = options['once']
+
+        if options['metrics_port']:
+            # Plusieurs processus : PROMETHEUS_MULTIPROC_DIR pour agréger leurs métriques
+            start_http_server(options['metrics_port'], addr=options['metrics_addr'], registry=registry())
+
+        if workers == 1:
+            self.stdout.write("Démarrage d'un worker de transferts de masse...")
+            _worker_main(poll_interval, once)
+            return
+
+        # Les connexions DB ne doivent pas être partagées entre processus forkés
+        connections.close_all()
+
+        processes = [
+            multiprocessing.Process(target=_worker_main, args=(poll_interval, once), daemon=False)
+            for _ in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        self.stdout.write(f"{workers} workers de transferts de masse démarrés.")
+
+        def _forward(signum, frame):
+            for process in processes:
+                if process.is_alive():
+                    os.kill(process.pid, signal.SIGTERM)
+
+        signal.signal(signal.SIGTERM, _forward)
+        signal.signal(signal.SIGINT, _forward)
+
+        for process in processes:
+            process.join()
+
+
+def _worker_main(poll_interval, once):
+    # Arrêt propre : le Job en cours se termine avant la sortie du worker
+    stop = {'requested': False}
+
+    def _request_stop(signum, frame):
+        stop['requested'] = True
+
+    signal.signal(signal.SIGTERM, _request_stop)
+    signal.signal(signal.SIGINT, _request_stop)
+
+    try:
+        run_worker(poll_interval=poll_interval, once=once, should_stop=lambda: stop['requested'])
+    finally:
+        sdk_client.close()
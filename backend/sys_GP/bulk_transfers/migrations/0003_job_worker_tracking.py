@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-18 08:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bulk_transfers', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bulktransferjob',
+            name='claimed_by',
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+        migrations.AddField(
+            model_name='bulktransferjob',
+            name='error_message',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='bulktransferjob',
+            name='finished_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='bulktransferjob',
+            name='started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
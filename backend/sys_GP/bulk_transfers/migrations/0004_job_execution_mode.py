@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 08:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bulk_transfers', '0003_job_worker_tracking'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bulktransferjob',
+            name='execution_mode',
+            field=models.CharField(choices=[('INDIVIDUAL', 'One /transfers call per row'), ('BULK', 'Batched /bulkQuotes + /bulkTransfers')], default='INDIVIDUAL', max_length=20),
+        ),
+    ]
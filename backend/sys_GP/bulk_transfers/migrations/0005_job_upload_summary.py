@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-18 08:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bulk_transfers', '0004_job_execution_mode'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bulktransferjob',
+            name='invalid_rows',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='bulktransferjob',
+            name='total_amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+    ]
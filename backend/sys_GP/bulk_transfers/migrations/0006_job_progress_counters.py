@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-18 08:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bulk_transfers', '0005_job_upload_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bulktransferjob',
+            name='progress_updated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='bulktransferjob',
+            name='transfers_failed',
+            field=models.IntegerField(default=0),
+        ),
+    ]
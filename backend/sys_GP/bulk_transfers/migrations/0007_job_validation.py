@@ -0,0 +1,42 @@
+# Generated by Django 4.2.7 on 2026-10-18 08:28
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bulk_transfers', '0006_job_progress_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bulktransferjob',
+            name='validated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='bulktransferjob',
+            name='status',
+            field=models.CharField(choices=[('UPLOADED', 'Uploaded'), ('VALIDATING', 'Validating'), ('VALIDATION_FAILED', 'Validation failed'), ('PROCESSING', 'Processing'), ('COMPLETED', 'Completed'), ('FAILED', 'Failed')], default='UPLOADED', max_length=20),
+        ),
+        migrations.CreateModel(
+            name='BulkRowVerdict',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('line_number', models.IntegerField()),
+                ('verdict', models.CharField(choices=[('ACCEPTED', 'Accepted'), ('REJECTED', 'Rejected')], max_length=10)),
+                ('errors', models.JSONField(blank=True, default=list)),
+                ('receiver_fsp_id', models.CharField(blank=True, max_length=64, null=True)),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='verdicts', to='bulk_transfers.bulktransferjob')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['job', 'verdict', 'line_number'], name='verdict_job_verdict_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='bulkrowverdict',
+            constraint=models.UniqueConstraint(fields=('job', 'line_number'), name='verdict_job_line_uniq'),
+        ),
+    ]
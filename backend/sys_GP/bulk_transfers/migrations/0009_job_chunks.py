@@ -0,0 +1,39 @@
+# Generated by Django 4.2.7 on 2026-10-18 08:39
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bulk_transfers', '0008_job_heartbeat'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BulkTransferChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sequence', models.IntegerField()),
+                ('first_line', models.IntegerField()),
+                ('last_line', models.IntegerField()),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('PROCESSING', 'Processing'), ('COMPLETED', 'Completed'), ('FAILED', 'Failed')], default='PENDING', max_length=20)),
+                ('transfers_completed', models.IntegerField(default=0)),
+                ('transfers_failed', models.IntegerField(default=0)),
+                ('claimed_by', models.CharField(blank=True, max_length=100, null=True)),
+                ('heartbeat_at', models.DateTimeField(blank=True, null=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('error_message', models.TextField(blank=True, default='')),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='bulk_transfers.bulktransferjob')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'job', 'sequence'], name='chunk_status_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='bulktransferchunk',
+            constraint=models.UniqueConstraint(fields=('job', 'sequence'), name='chunk_job_sequence_uniq'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-18 08:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bulk_transfers', '0009_job_chunks'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RateLimitBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=100, unique=True)),
+                ('tokens', models.FloatField()),
+                ('updated_at', models.DateTimeField()),
+                ('version', models.IntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 09:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bulk_transfers', '0011_job_priority'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bulktransferjob',
+            index=models.Index(fields=['status', 'created_at'], name='job_status_created_idx'),
+        ),
+    ]
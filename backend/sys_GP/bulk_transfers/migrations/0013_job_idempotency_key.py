@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-18 09:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bulk_transfers', '0012_job_status_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bulktransferjob',
+            name='file_sha256',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='bulktransferjob',
+            name='idempotency_key',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+    ]
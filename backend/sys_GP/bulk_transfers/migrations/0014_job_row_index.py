@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 09:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bulk_transfers', '0013_job_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bulktransferjob',
+            name='row_index',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 14:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bulk_transfers', '0014_job_row_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bulktransferjob',
+            name='upload_summary',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
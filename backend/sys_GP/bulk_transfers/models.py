@@ -5,17 +5,143 @@ from transfert.models import Account
 class BulkTransferJob(models.Model):
     STATUSES = (
         ('UPLOADED', 'Uploaded'),
+        ('VALIDATING', 'Validating'),
+        ('VALIDATION_FAILED', 'Validation failed'),
         ('PROCESSING', 'Processing'),
         ('COMPLETED', 'Completed'),
         ('FAILED', 'Failed'),
     )
 
+    EXECUTION_MODES = (
+        ('INDIVIDUAL', 'One /transfers call per row'),
+        ('BULK', 'Batched /bulkQuotes + /bulkTransfers'),
+    )
+
+    # Classe de priorité : ordre de réservation et part des workers (voir worker.py)
+    PRIORITIES = (
+        ('HIGH', 'High'),
+        ('NORMAL', 'Normal'),
+        ('LOW', 'Low'),
+    )
+
     file = models.FileField(upload_to='bulk_uploads/')
     submitter = models.ForeignKey(Account, on_delete=models.SET_NULL, null=True)
     status = models.CharField(max_length=20, choices=STATUSES, default='UPLOADED')
     created_at = models.DateTimeField(auto_now_add=True)
     total_transfers = models.IntegerField(default=0)
     transfers_completed = models.IntegerField(default=0)
+    # Résumé calculé à l'upload (voir bulk_transfers/csv_stream.py)
+    total_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    invalid_rows = models.IntegerField(default=0)
+    # Positions (octets) des lignes 1, 1 + ROW_INDEX_STEP, ... pour paginer les bénéficiaires
+    row_index = models.JSONField(default=list, blank=True)
+    # Résumé rendu par l'upload, tel quel : un upload rejoué le renvoie sans relire le fichier
+    # (total_transfers et invalid_rows sont ensuite mis à jour par la validation)
+    upload_summary = models.JSONField(null=True, blank=True)
+    # Compteurs de progression, mis à jour à chaque écriture de lot de Transfer
+    transfers_failed = models.IntegerField(default=0)
+    progress_updated_at = models.DateTimeField(null=True, blank=True)
+    execution_mode = models.CharField(max_length=20, choices=EXECUTION_MODES, default='INDIVIDUAL')
+    priority = models.CharField(max_length=10, choices=PRIORITIES, default='NORMAL')
+
+    # Suivi de l'exécution par les workers (voir bulk_transfers/worker.py)
+    claimed_by = models.CharField(max_length=100, null=True, blank=True)
+    # Battement de cœur du worker qui exécute le Job ; un Job sans battement récent est repris
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    error_message = models.TextField(blank=True, default='')
+    # Fin de la phase de validation préalable (voir bulk_transfers/validation.py)
+    validated_at = models.DateTimeField(null=True, blank=True)
+    # Idempotence de l'upload : dérivé de l'en-tête Idempotency-Key (voir transfert/idempotency.py)
+    idempotency_key = models.CharField(max_length=64, null=True, blank=True, unique=True)
+    # Empreinte SHA-256 du fichier, comparée lors d'un upload rejoué avec la même clé
+    file_sha256 = models.CharField(max_length=64, blank=True, default='')
+
+    class Meta:
+        indexes = [
+            # File des workers (Jobs UPLOADED par ancienneté) et Jobs en cours
+            models.Index(fields=['status', 'created_at'], name='job_status_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"Bulk Job {self.id} - {self.status}"
+
+
+class BulkRowVerdict(models.Model):
+    """Verdict de la validation préalable pour une ligne du fichier d'un Job."""
+    VERDICTS = (
+        ('ACCEPTED', 'Accepted'),
+        ('REJECTED', 'Rejected'),
+    )
+
+    job = models.ForeignKey(BulkTransferJob, on_delete=models.CASCADE, related_name='verdicts')
+    line_number = models.IntegerField()
+    verdict = models.CharField(max_length=10, choices=VERDICTS)
+    errors = models.JSONField(default=list, blank=True)
+    # FSP du bénéficiaire résolu via /parties (None si non vérifiable)
+    receiver_fsp_id = models.CharField(max_length=64, null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['job', 'line_number'], name='verdict_job_line_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['job', 'verdict', 'line_number'], name='verdict_job_verdict_idx'),
+        ]
+
+    def __str__(self):
+        return f"Job {self.job_id} ligne {self.line_number} - {self.verdict}"
+
+
+class BulkTransferChunk(models.Model):
+    """
+    Tranche d'un Job : plage de lignes [first_line, last_line] du fichier, réservée
+    et exécutée indépendamment par un worker (voir bulk_transfers/chunks.py).
+    """
+    STATUSES = (
+        ('PENDING', 'Pending'),
+        ('PROCESSING', 'Processing'),
+        ('COMPLETED', 'Completed'),
+        ('FAILED', 'Failed'),
+    )
+
+    job = models.ForeignKey(BulkTransferJob, on_delete=models.CASCADE, related_name='chunks')
+    sequence = models.IntegerField()
+    first_line = models.IntegerField()
+    last_line = models.IntegerField()
+    status = models.CharField(max_length=20, choices=STATUSES, default='PENDING')
+    transfers_completed = models.IntegerField(default=0)
+    transfers_failed = models.IntegerField(default=0)
+
+    claimed_by = models.CharField(max_length=100, null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    error_message = models.TextField(blank=True, default='')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['job', 'sequence'], name='chunk_job_sequence_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'job', 'sequence'], name='chunk_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"Job {self.job_id} tranche {self.sequence} ({self.first_line}-{self.last_line}) - {self.status}"
+
+
+class RateLimitBucket(models.Model):
+    """
+    Seau à jetons partagé par tous les workers (voir bulk_transfers/rate_limits.py).
+    Le débit et la capacité viennent de la configuration ; seul l'état est stocké ici.
+    """
+    key = models.CharField(max_length=100, unique=True)
+    tokens = models.FloatField()
+    updated_at = models.DateTimeField()
+    # Incrémenté à chaque prélèvement : sert d'UPDATE conditionnel entre workers
+    version = models.IntegerField(default=0)
 
     def __str__(self):
-        return f"Bulk Job {self.id} - {self.status}"
\ No newline at end of file
+        return f"{self.key} : {self.tokens:.1f} jetons"
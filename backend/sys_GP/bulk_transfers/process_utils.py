@@ -1,75 +1,571 @@
-import csv
-from io import TextIOWrapper
-from transfert.services import execute_p2p_transfer_via_sdk
+import logging
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+from transfert.services import (
+    SDK_BULK_BATCH_SIZE, CircuitOpenError, execute_bulk_transfer_via_sdk, execute_p2p_transfer_via_sdk,
+    get_transfer_state_via_sdk, is_not_sent, lookup_party, sdk_client,
+)
+from transfert.idempotency import bulk_home_transaction_id, bulk_transfer_id
+from transfert.ledger import job_reference, release, settle
+from transfert.metrics import BULK_EXECUTION_SECONDS, METRICS_ENABLED, StageTimer, observe_bulk_rows
 from transfert.models import Transfer
+from transfert.payloads import RESULT_FIELDS, apply_outcome, apply_sdk_result, archive
+from .csv_stream import open_job_rows, row_errors
 from .models import BulkTransferJob
+from .rate_limits import RATE_LIMITS, schedule
+from .validation import rejected_lines, resolved_fsps
 
-def process_bulk_file(job_id):
+# Nombre maximal de lignes dont l'appel SDK est en cours simultanément pour un Job
+MAX_IN_FLIGHT = int(os.environ.get("BULK_MAX_IN_FLIGHT", "32"))
+
+# Écriture des Transfer par lots : tous les BULK_FLUSH_ROWS lignes ou BULK_FLUSH_SECONDS secondes
+FLUSH_ROWS = int(os.environ.get("BULK_FLUSH_ROWS", "500"))
+FLUSH_SECONDS = float(os.environ.get("BULK_FLUSH_SECONDS", "2"))
+
+# Attente maximale (secondes) de la refermeture du disjoncteur SDK avant d'interrompre le Job
+CIRCUIT_WAIT = float(os.environ.get("BULK_CIRCUIT_WAIT", "300"))
+
+logger = logging.getLogger(__name__)
+
+class ClaimLost(Exception):
+    """Le Job (ou la tranche) a été repris par un autre worker : l'envoi s'arrête."""
+
+
+def _check_claim(claim_lost):
+    """Interrompt l'envoi si le battement de cœur du worker a constaté la perte de sa réservation."""
+    if claim_lost is not None and claim_lost.is_set():
+        raise ClaimLost("Réservation reprise par un autre worker : envoi interrompu.")
+
+
+def process_bulk_file(job_id, max_in_flight=None, claim_lost=None):
     """
     Lit le CSV, déclenche un transfert Mojaloop pour chaque ligne via la fonction de service.
+
+    Appelée par les workers (bulk_transfers/worker.py) une fois le Job réservé ;
+    le statut est déjà PROCESSING dans ce cas.
+
+    Jusqu'à `max_in_flight` appels (défaut: BULK_MAX_IN_FLIGHT) sont envoyés au SDK
+    en parallèle ; l'ordre des Transfer enregistrés et les compteurs finaux restent
+    identiques à une exécution séquentielle. Le mode d'exécution du Job choisit entre
+    un appel /transfers par ligne (INDIVIDUAL) et des lots /bulkQuotes + /bulkTransfers (BULK).
+
+    Chaque ligne est enregistrée (INITIATED) avant son envoi : un Job interrompu
+    peut être relancé, les lignes déjà enregistrées ne sont jamais renvoyées.
+
+    `claim_lost` (threading.Event, posé par worker.Heartbeat) signale que le Job a
+    été repris par un autre worker : l'envoi s'arrête alors sur ClaimLost.
     """
     try:
         job = BulkTransferJob.objects.get(id=job_id)
     except BulkTransferJob.DoesNotExist:
         return
 
-    job.status = 'PROCESSING'
-    job.save()
+    if job.status != 'PROCESSING':
+        job.status = 'PROCESSING'
+        job.started_at = timezone.now()
+        job.save(update_fields=['status', 'started_at'])
     
+    total_count = execute_rows(job, max_in_flight=max_in_flight, claim_lost=claim_lost)
+
+    # Mise à jour finale : compteurs recalculés sur l'ensemble des passages
+    refresh_counters(job)
+    job.total_transfers = total_count
+    job.status = 'COMPLETED'
+    job.finished_at = timezone.now()
+    job.progress_updated_at = job.finished_at
+    job.save(update_fields=['total_transfers', 'status', 'finished_at', 'progress_updated_at'])
+    # Reliquat de la réservation (lignes ignorées) rendu au solde disponible
+    release(job_reference(job.id))
+
+
+def execute_rows(job, first_line=None, last_line=None, max_in_flight=None, claim_lost=None):
+    """
+    Exécute les lignes du Job, ou la seule plage [first_line, last_line] (tranche,
+    voir bulk_transfers/chunks.py). Retourne le numéro de la dernière ligne lue.
+    Lève ClaimLost, avant tout nouvel envoi, dès que `claim_lost` est posé.
+    """
     sender_account = job.submitter
-    total_count = 0
-    completed_count = 0
-    
-    # TextIOWrapper pour lire le fichier uploadé (important pour gérer les fichiers sur le disque)
-    file_content = TextIOWrapper(job.file.file, encoding='utf-8')
-    reader = csv.DictReader(file_content)
-    
-    for row in reader:
-        total_count += 1
-        
+    last_read = 0
+    window = max(1, max_in_flight or MAX_IN_FLIGHT)
+    started = time.monotonic()
+    buffer = TransferBuffer(job)
+    lines = _line_range(first_line, last_line)
+
+    # Reprise : les lignes restées INITIATED (envoi interrompu) sont rapprochées avec le hub
+    recover_in_flight(job, first_line, last_line)
+    # Lignes rejetées par la validation préalable (bulk_transfers/validation.py)
+    rejected = rejected_lines(job)
+    # Lignes déjà enregistrées lors d'un passage précédent : jamais renvoyées au SDK
+    already_done = set(
+        Transfer.objects.filter(bulk_job=job, bulk_line__isnull=False, **lines).values_list('bulk_line', flat=True)
+    )
+    # Transferts enregistrés avant l'ajout de bulk_line : reconnus par leur home_transaction_id
+    legacy_done = set(
+        Transfer.objects.filter(bulk_job=job, bulk_line__isnull=True).values_list('home_transaction_id', flat=True)
+    )
+    # FSP des bénéficiaires résolus par la validation : transmis au SDK, sans nouvelle résolution
+    fsps = resolved_fsps(job, first_line, last_line)
+
+    def transfer_rows(rows):
+        nonlocal last_read
+        for line_number, row in rows:
+            last_read = line_number
+            if line_number in rejected or line_number in already_done:
+                continue
+            errors = row_errors(row)
+            if errors:
+                logger.warning("Job %s : ligne %s ignorée (%s).", job.id, line_number, '; '.join(errors))
+                continue
+            params = _transfer_params(row, job, line_number)
+            if params['home_transaction_id'] in legacy_done:
+                continue
+            params['receiver_fsp_id'] = params['receiver_fsp_id'] or fsps.get(line_number)
+            yield line_number, params
+
+    # Lecture en flux du CSV (voir csv_stream) : une seule passe, mémoire constante
+    with open_job_rows(job) as rows:
+        # Lignes numérotées à partir de 1 : la plage d'une tranche est une tranche de l'itérateur
+        rows = transfer_rows(islice(buffer.timer.timed_rows(rows), (first_line or 1) - 1, last_line))
+        if RATE_LIMITS:
+            # Débit limité par FSP bénéficiaire, devise et global (voir rate_limits.py)
+            rows = schedule(rows, lambda line_number, params: (params['receiver_fsp_id'], params['currency']))
+        if job.execution_mode == 'BULK':
+            outcomes = _dispatch_batched(
+                rows, sender_account.msisdn, window, buffer.checkpoint, timer=buffer.timer, claim_lost=claim_lost,
+            )
+        else:
+            outcomes = _dispatch_individual(
+                rows, sender_account.msisdn, window, buffer.checkpoint, timer=buffer.timer,
+                checkpoint_rows=buffer.flush_rows, claim_lost=claim_lost,
+            )
+
         try:
-            # --- MAPPAGE DIRECT DES COLONNES DU CSV ---
-            # Colonnes: type_id, valeur_id, devise, montant, nom_complet
-            receiver_id_type = row['type_id']
-            receiver_id_value = row['valeur_id'] # Le numéro d'identification réel (MSISDN, etc.)
-            amount = row['montant'] 
-            currency = row['devise'] 
-            note = f"Bulk: {row.get('nom_complet', 'N/A')} - Job {job.id}" 
-
-            # --- APPEL À LA FONCTION DE SERVICE CORRIGÉE ---
-            # La fonction execute_p2p_transfer_via_sdk doit utiliser la nouvelle signature
-            sdk_result = execute_p2p_transfer_via_sdk(
-                sender_msisdn=sender_account.msisdn,
-                receiver_id_type=receiver_id_type,
-                receiver_id_value=receiver_id_value,
-                amount=amount,
-                currency=currency,
-                note=note
+            for line_number, transfer_params, outcome in outcomes:
+                buffer.complete(line_number, outcome)
+        finally:
+            # Même sur exception (disjoncteur, ClaimLost…) : les résultats déjà reçus sont écrits
+            buffer.flush()
+    if METRICS_ENABLED:
+        BULK_EXECUTION_SECONDS.labels(job.execution_mode).observe(time.monotonic() - started)
+    return last_read
+
+
+def _line_range(first_line, last_line):
+    """Filtre Transfer sur une plage de lignes (aucun filtre pour le Job entier)."""
+    lines = {}
+    if first_line is not None:
+        lines['bulk_line__gte'] = first_line
+    if last_line is not None:
+        lines['bulk_line__lte'] = last_line
+    return lines
+
+
+def refresh_counters(job):
+    """Recalcule les compteurs du Job à partir des Transfer enregistrés."""
+    counts = Transfer.objects.filter(bulk_job=job).aggregate(
+        completed=Count('id', filter=Q(status='MOJALOOP_COMPLETED')),
+        failed=Count('id', filter=Q(status='FAILED')),
+    )
+    job.transfers_completed = counts['completed']
+    job.transfers_failed = counts['failed']
+    job.progress_updated_at = timezone.now()
+    job.save(update_fields=['transfers_completed', 'transfers_failed', 'progress_updated_at'])
+
+
+def recover_in_flight(job, first_line=None, last_line=None):
+    """
+    Rapproche les lignes laissées INITIATED par une exécution interrompue (crash,
+    redéploiement) : elles ont pu partir vers le hub sans que le résultat soit enregistré.
+
+    - transfert connu du hub (GET /transfers/{id}) : son état final est enregistré ;
+    - transfert inconnu du hub : la ligne est supprimée et sera renvoyée ;
+    - état impossible à établir (ligne enregistrée sans transferId par une version
+      antérieure, SDK muet) : la ligne passe en FAILED avec un message de
+      rapprochement, sans être renvoyée.
+    Seules les lignes en vol au moment de l'interruption (au plus la fenêtre
+    d'envoi) sont concernées ; pour une tranche, seules celles de sa plage.
+    """
+    pending = list(Transfer.objects.filter(bulk_job=job, status='INITIATED', **_line_range(first_line, last_line)))
+    if not pending:
+        return
+
+    resend = []
+    for transfer in pending:
+        state = get_transfer_state_via_sdk(transfer.transfer_id) if transfer.transfer_id else None
+        if state == 'NOT_FOUND':
+            resend.append(transfer.id)
+        elif state == 'COMPLETED':
+            apply_outcome(transfer, 'MOJALOOP_COMPLETED', state=state)
+        else:
+            apply_outcome(
+                transfer, 'FAILED', state=state,
+                error=f"Envoi interrompu, état non confirmé par le hub ({state or 'inconnu'}) : "
+                      f"à vérifier avec homeTransactionId {transfer.home_transaction_id}.",
             )
-            
-            # Enregistrement de la trace locale du transfert individuel
-            Transfer.objects.create(
-                sender=sender_account,
-                receiver_msisdn=receiver_id_value, 
-                amount=amount,
-                currency=currency, 
-                bulk_job=job,
-                transfer_id=sdk_result.get('transfer_id'),
-                home_transaction_id=sdk_result['home_transaction_id'],
-                status='MOJALOOP_COMPLETED' if sdk_result['success'] else 'FAILED',
-                sdk_response_data=sdk_result.get('data') or sdk_result
+
+    recovered = [transfer for transfer in pending if transfer.id not in resend]
+    with transaction.atomic():
+        Transfer.objects.filter(id__in=resend).delete()
+        Transfer.objects.bulk_update(recovered, RESULT_FIELDS)
+        settle(job_reference(job.id), recovered)
+    logger.info("Job %s : %d ligne(s) en vol rapprochée(s), %d à renvoyer.", job.id, len(pending), len(resend))
+
+
+def _transfer_params(row, job, line_number):
+    """
+    Paramètres de transfert d'une ligne du CSV déjà validée par row_errors.
+    Le home_transaction_id est dérivé de (Job, ligne) : une ligne rejouée garde
+    le même identifiant et ne peut pas être enregistrée deux fois.
+    """
+    # --- MAPPAGE DIRECT DES COLONNES DU CSV ---
+    # Colonnes: type_id, valeur_id, devise, montant, nom_complet (+ fsp_id optionnelle)
+    return {
+        'receiver_id_type': row['type_id'],
+        'receiver_id_value': row['valeur_id'], # Le numéro d'identification réel (MSISDN, etc.)
+        'amount': row['montant'],
+        'currency': row['devise'],
+        'note': f"Bulk: {row.get('nom_complet', 'N/A')} - Job {job.id}",
+        'receiver_fsp_id': (row.get('fsp_id') or '').strip() or None,
+        'home_transaction_id': bulk_home_transaction_id(job.id, line_number),
+    }
+
+
+def _call(fn, *args, **kwargs):
+    """Exécute un appel SDK en renvoyant l'exception au lieu de la lever."""
+    try:
+        return fn(*args, **kwargs)
+    except Exception as e:
+        return e
+
+
+def _sdk(fn, timer):
+    """Fonction SDK dont la durée est comptée dans l'étape sdk du Job (voir transfert/metrics.py)."""
+    return timer.timed_call(fn) if timer is not None else fn
+
+
+def _wait_for_sdk():
+    """
+    Suspend l'envoi des lignes tant que le disjoncteur SDK refuse les appels :
+    les lignes restantes ne sont pas consommées en échecs immédiats. Au-delà
+    de BULK_CIRCUIT_WAIT secondes, le Job est interrompu (FAILED).
+    """
+    if not sdk_client.breaker.wait_until_available(CIRCUIT_WAIT):
+        raise CircuitOpenError(f"SDK indisponible depuis plus de {CIRCUIT_WAIT:.0f}s, Job interrompu.")
+
+
+class _Requeue:
+    """
+    Lignes refusées par le client SDK sans avoir été envoyées (disjoncteur ouvert,
+    fenêtre adaptative saturée) : elles restent INITIATED, sans effet sur la
+    réservation, et sont renvoyées une fois le SDK disponible. Une ligne refusée
+    pendant plus de BULK_CIRCUIT_WAIT secondes interrompt le Job ; elle sera
+    reprise à la relance (recover_in_flight).
+    """
+
+    def __init__(self):
+        self.since = {}
+
+    def retry(self, line_number):
+        since = self.since.setdefault(line_number, time.monotonic())
+        if time.monotonic() - since > CIRCUIT_WAIT:
+            raise CircuitOpenError(f"SDK saturé depuis plus de {CIRCUIT_WAIT:.0f}s, Job interrompu.")
+
+    def done(self, line_number):
+        self.since.pop(line_number, None)
+
+
+def _dispatch_individual(rows, sender_msisdn, window, checkpoint, timer=None, checkpoint_rows=None, claim_lost=None):
+    """
+    Un appel /transfers par ligne. Fenêtre glissante de transferts en vol : les appels
+    SDK tournent dans le pool et les résultats sont rendus dès qu'ils arrivent, pour
+    qu'un FSP lent en tête de fenêtre ne bloque pas l'envoi des lignes suivantes
+    (les Transfer sont déjà enregistrés dans l'ordre du CSV par `checkpoint`).
+
+    Les lignes prêtes sont enregistrées par `checkpoint` par groupes de
+    `checkpoint_rows` (défaut: BULK_FLUSH_ROWS), en une seule écriture, puis
+    envoyées au fil des places libérées dans la fenêtre. Chaque ligne porte un
+    transferId fixé par avance et transmis au SDK : une ligne restée INITIATED
+    après une interruption est rapprochée par GET /transfers/{id} (recover_in_flight).
+    Les lignes refusées sans envoi par le client SDK sont renvoyées (voir _Requeue).
+    La réservation du worker (`claim_lost`) est vérifiée avant chaque envoi.
+    """
+    checkpoint_rows = max(1, checkpoint_rows or FLUSH_ROWS)
+    in_flight = {}
+    ready = []
+    retry = []
+    requeue = _Requeue()
+    rows = iter(rows)
+    exhausted = False
+    transfer = _sdk(execute_p2p_transfer_via_sdk, timer)
+
+    def submit(line_number, params):
+        future = executor.submit(_call, transfer, sender_msisdn=sender_msisdn, **params)
+        in_flight[future] = (line_number, params)
+
+    with ThreadPoolExecutor(max_workers=window, thread_name_prefix="bulk-sdk") as executor:
+        while True:
+            if retry:
+                # Déjà enregistrées (INITIATED) : renvoi sans nouveau checkpoint
+                _wait_for_sdk()
+                _check_claim(claim_lost)
+                for line_number, params in retry:
+                    submit(line_number, params)
+                retry = []
+
+            if not ready and not exhausted:
+                group, exhausted = _take_ready(rows, max(checkpoint_rows, window))
+                if group:
+                    _check_claim(claim_lost)
+                    ready = [
+                        (line_number, {**params, 'transfer_id': bulk_transfer_id(params['home_transaction_id'])})
+                        for line_number, params in group
+                    ]
+                    checkpoint([(line_number, params, params['transfer_id']) for line_number, params in ready])
+
+            free = window - len(in_flight)
+            if ready and free > 0:
+                _wait_for_sdk()
+                _check_claim(claim_lost)
+                for line_number, params in ready[:free]:
+                    submit(line_number, params)
+                ready = ready[free:]
+
+            if not in_flight:
+                if exhausted and not ready:
+                    return
+                continue
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                line_number, params = in_flight.pop(future)
+                outcome = future.result()
+                if is_not_sent(outcome):
+                    requeue.retry(line_number)
+                    retry.append((line_number, params))
+                    continue
+                requeue.done(line_number)
+                yield line_number, params, outcome
+
+
+def _take_ready(rows, count):
+    """
+    Jusqu'à `count` lignes de `rows`, sans attendre au-delà d'un marqueur None
+    (ordonnanceur à court de jetons). Retourne (lignes, itérateur épuisé).
+    """
+    group = []
+    while len(group) < count:
+        row = next(rows, _END)
+        if row is _END:
+            return group, True
+        if row is None:
+            break
+        group.append(row)
+    return group, False
+
+
+_END = object()
+
+
+def _dispatch_batched(rows, sender_msisdn, window, checkpoint, batch_size=None, timer=None, claim_lost=None):
+    """
+    Mode BULK : le CSV est lu par segments de `batch_size` lignes ; dans chaque segment
+    les lignes sont groupées par (FSP bénéficiaire, devise) et chaque groupe part en un
+    seul /bulkQuotes + /bulkTransfers. Sans colonne fsp_id ni FSP trouvé par la
+    validation, le FSP est résolu via lookup_party (cache des parties) ; les lignes
+    dont le FSP reste inconnu ne peuvent pas être groupées et passent par /transfers.
+    Les résultats sont rendus dans l'ordre du CSV. Chaque segment est enregistré par
+    `checkpoint` avant l'envoi ; chaque ligne y porte son transferId, fixé par
+    avance pour permettre le rapprochement après une interruption. Les lignes
+    refusées sans envoi par le client SDK sont renvoyées (voir _Requeue). La
+    réservation du worker (`claim_lost`) est vérifiée avant chaque envoi.
+    """
+    batch_size = batch_size or SDK_BULK_BATCH_SIZE
+    resolve = _sdk(lookup_party, timer)
+    transfer = _sdk(execute_p2p_transfer_via_sdk, timer)
+    bulk_transfer = _sdk(execute_bulk_transfer_via_sdk, timer)
+
+    with ThreadPoolExecutor(max_workers=window, thread_name_prefix="bulk-sdk") as executor:
+        for segment in _segments(rows, batch_size):
+            _wait_for_sdk()
+            lookups = {
+                index: executor.submit(_call, resolve, params['receiver_id_type'], params['receiver_id_value'])
+                for index, (line_number, params) in enumerate(segment)
+                if not params['receiver_fsp_id']
+            }
+            for index, future in lookups.items():
+                party = future.result()
+                if isinstance(party, dict) and party['found']:
+                    segment[index] = (segment[index][0], {**segment[index][1], 'receiver_fsp_id': party['fsp_id']})
+
+            groups = {}
+            individual = []
+            for index, (line_number, params) in enumerate(segment):
+                if params['receiver_fsp_id']:
+                    groups.setdefault((params['receiver_fsp_id'], params['currency']), []).append(index)
+                else:
+                    individual.append(index)
+
+            transfer_ids = [bulk_transfer_id(params['home_transaction_id']) for line_number, params in segment]
+            _check_claim(claim_lost)
+            checkpoint([(line_number, params, transfer_ids[index]) for index, (line_number, params) in enumerate(segment)])
+
+            outcomes = [None] * len(segment)
+            requeue = _Requeue()
+            while True:
+                _check_claim(claim_lost)
+                futures = []
+                for index in individual:
+                    future = executor.submit(
+                        _call, transfer, sender_msisdn=sender_msisdn, transfer_id=transfer_ids[index], **segment[index][1],
+                    )
+                    futures.append(([index], future))
+
+                for (fsp_id, currency), indexes in groups.items():
+                    future = executor.submit(
+                        _call, bulk_transfer,
+                        sender_msisdn=sender_msisdn,
+                        transfers=[{**segment[i][1], 'transfer_id': transfer_ids[i]} for i in indexes],
+                        currency=currency,
+                        receiver_fsp_id=fsp_id,
+                    )
+                    futures.append((indexes, future))
+
+                for indexes, future in futures:
+                    result = future.result()
+                    if isinstance(result, dict):
+                        result = [result]
+                    for position, index in enumerate(indexes):
+                        outcomes[index] = result if isinstance(result, Exception) else result[position]
+
+                # Lignes refusées sans envoi : renvoyées dans leurs groupes, une fois le SDK disponible
+                not_sent = {index for index, outcome in enumerate(outcomes) if is_not_sent(outcome)}
+                if not not_sent:
+                    break
+                for index in not_sent:
+                    requeue.retry(segment[index][0])
+                individual = [index for index in individual if index in not_sent]
+                groups = {
+                    key: [index for index in indexes if index in not_sent]
+                    for key, indexes in groups.items() if not_sent.intersection(indexes)
+                }
+                _wait_for_sdk()
+
+            for (line_number, params), outcome in zip(segment, outcomes):
+                yield line_number, params, outcome
+
+
+def _segments(rows, size):
+    """Segments de `size` lignes ; un marqueur None (ordonnanceur en attente) clôt le segment en cours."""
+    segment = []
+    for row in rows:
+        if row is None:
+            if segment:
+                yield segment
+                segment = []
+            continue
+        segment.append(row)
+        if len(segment) >= size:
+            yield segment
+            segment = []
+    if segment:
+        yield segment
+
+
+def _apply_outcome(transfer, line_number, outcome):
+    """Reporte sur le Transfer d'une ligne le résultat SDK (ou l'exception levée)."""
+    if isinstance(outcome, Exception):
+        logger.error("Erreur fatale de traitement de ligne %s pour Job %s : %s", line_number, transfer.bulk_job_id, outcome)
+        return apply_outcome(transfer, 'FAILED', error=f"Erreur interne : {outcome}")
+
+    sdk_result = outcome
+    transfer.transfer_id = sdk_result.get('transfer_id') or transfer.transfer_id
+    return apply_sdk_result(transfer, sdk_result)
+
+
+class TransferBuffer:
+    """
+    Journal d'exécution des Transfer d'un Job, en deux temps :
+
+    - checkpoint : avant leur envoi au SDK, les lignes sont insérées en statut
+      INITIATED (bulk_create), liées à leur numéro de ligne. Une ligne INITIATED
+      après une interruption est une ligne peut-être envoyée (voir recover_in_flight) ;
+    - complete : les résultats sont reportés en mémoire puis écrits par bulk_update,
+      dans une seule transaction, toutes les `flush_rows` lignes ou toutes les
+      `flush_seconds` secondes. Les compteurs du Job sont mis à jour dans la même
+      transaction : c'est ce qui alimente le suivi de progression (bulk_transfers/progress.py).
+      Les réponses brutes du SDK sont archivées à part (transfert.payloads). Le lot
+      est aussi réglé sur la réservation du Job (transfert.ledger), en dernier :
+      un seul UPDATE du compte expéditeur par lot.
+
+    Le temps des écritures et des étapes du Job (`timer`) est publié dans les
+    métriques à chaque lot (transfert/metrics.py).
+    """
+
+    def __init__(self, job, flush_rows=None, flush_seconds=None):
+        self.job = job
+        self.flush_rows = max(1, flush_rows or FLUSH_ROWS)
+        self.flush_seconds = flush_seconds if flush_seconds is not None else FLUSH_SECONDS
+        self.initiated = {}
+        self.pending = []
+        self.last_flush = time.monotonic()
+        self.timer = StageTimer()
+
+    def checkpoint(self, rows):
+        """Enregistre (INITIATED) les lignes [(numéro_ligne, paramètres, transfer_id)] sur le point de partir."""
+        started = time.monotonic()
+        transfers = [
+            Transfer(
+                sender=self.job.submitter,
+                receiver_msisdn=params['receiver_id_value'],
+                amount=params['amount'],
+                currency=params['currency'],
+                bulk_job=self.job,
+                bulk_line=line_number,
+                transfer_id=transfer_id,
+                home_transaction_id=params['home_transaction_id'],
+                status='INITIATED',
             )
-            
-            if sdk_result['success']:
-                completed_count += 1
-            
-        except KeyError as e:
-            print(f"Erreur: Colonne manquante dans le CSV ({e}). Ligne {total_count} ignorée.")
-        except Exception as e:
-            print(f"Erreur fatale de traitement de ligne {total_count} pour Job {job.id}: {e}")
-            
-    # Mise à jour finale
-    job.total_transfers = total_count
-    job.transfers_completed = completed_count
-    job.status = 'COMPLETED'
-    job.save()
\ No newline at end of file
+            for line_number, params, transfer_id in rows
+        ]
+        Transfer.objects.bulk_create(transfers)
+        if transfers and transfers[0].pk is None:
+            # Bases sans RETURNING : récupération des clés pour le bulk_update
+            ids = dict(
+                Transfer.objects.filter(bulk_job=self.job, bulk_line__in=[t.bulk_line for t in transfers])
+                .values_list('bulk_line', 'id')
+            )
+            for transfer in transfers:
+                transfer.pk = ids[transfer.bulk_line]
+        for transfer in transfers:
+            self.initiated[transfer.bulk_line] = transfer
+        self.timer.add('db_write', time.monotonic() - started)
+
+    def complete(self, line_number, outcome):
+        self.pending.append(_apply_outcome(self.initiated.pop(line_number), line_number, outcome))
+        if len(self.pending) >= self.flush_rows or time.monotonic() - self.last_flush >= self.flush_seconds:
+            self.flush()
+
+    def flush(self):
+        self.last_flush = time.monotonic()
+        if not self.pending:
+            self.timer.publish()
+            return
+        succeeded = sum(1 for transfer in self.pending if transfer.status == 'MOJALOOP_COMPLETED')
+
+        with transaction.atomic():
+            Transfer.objects.bulk_update(self.pending, RESULT_FIELDS)
+            archive(self.pending)
+            BulkTransferJob.objects.filter(id=self.job.id).update(
+                transfers_completed=F('transfers_completed') + succeeded,
+                transfers_failed=F('transfers_failed') + len(self.pending) - succeeded,
+                progress_updated_at=timezone.now(),
+            )
+            settle(job_reference(self.job.id), self.pending)
+        self.timer.add('db_write', time.monotonic() - self.last_flush)
+        self.timer.publish()
+        observe_bulk_rows(self.job.execution_mode, succeeded, len(self.pending) - succeeded)
+        self.pending = []
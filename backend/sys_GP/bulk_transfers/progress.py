@@ -0,0 +1,139 @@
+# bulk_transfers/progress.py
+"""
+Suivi de progression des Jobs de masse.
+
+La progression est lue directement sur les compteurs de BulkTransferJob,
+maintenus par process_bulk_file à chaque écriture de lot : aucune requête
+d'agrégation sur la table des transferts n'est nécessaire.
+"""
+import asyncio
+import json
+import os
+import time
+
+from asgiref.sync import sync_to_async
+from django.utils import timezone
+
+from .models import BulkTransferJob
+
+# Intervalle (secondes) entre deux lectures des compteurs par le flux SSE
+STREAM_INTERVAL = float(os.environ.get("BULK_PROGRESS_STREAM_INTERVAL", "1"))
+# Durée maximale d'une connexion SSE ; EventSource se reconnecte automatiquement
+STREAM_TIMEOUT = float(os.environ.get("BULK_PROGRESS_STREAM_TIMEOUT", "300"))
+# Commentaire keep-alive envoyé si rien n'a changé depuis ce délai
+STREAM_HEARTBEAT = 15
+
+TERMINAL_STATUSES = ('COMPLETED', 'FAILED', 'VALIDATION_FAILED')
+
+PROGRESS_FIELDS = (
+    'id', 'status', 'total_transfers', 'invalid_rows', 'transfers_completed',
+    'transfers_failed', 'started_at', 'finished_at', 'progress_updated_at',
+)
+
+
+def job_progress(job):
+    """Instantané de progression : compteurs, débit (lignes/s) et ETA (s)."""
+    to_process = max(0, job.total_transfers - job.invalid_rows)
+    processed = job.transfers_completed + job.transfers_failed
+
+    throughput = None
+    eta_seconds = None
+    if job.started_at and processed:
+        end = job.finished_at or job.progress_updated_at or timezone.now()
+        elapsed = (end - job.started_at).total_seconds()
+        if elapsed > 0:
+            throughput = round(processed / elapsed, 2)
+            if job.status not in TERMINAL_STATUSES:
+                eta_seconds = round(max(0, to_process - processed) / throughput, 1)
+
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "total": to_process,
+        "processed": processed,
+        "succeeded": job.transfers_completed,
+        "failed": job.transfers_failed,
+        "percent": round(100 * processed / to_process, 1) if to_process else (100.0 if job.status == 'COMPLETED' else 0.0),
+        "throughput": throughput,
+        "eta_seconds": eta_seconds,
+        "updated_at": job.progress_updated_at.isoformat() if job.progress_updated_at else None,
+    }
+
+
+def load_job(job_id):
+    return BulkTransferJob.objects.only(*PROGRESS_FIELDS).get(id=job_id)
+
+
+def progress_events(job_id, interval=STREAM_INTERVAL, timeout=STREAM_TIMEOUT):
+    """
+    Générateur Server-Sent Events : un premier événement `progress` complet,
+    puis uniquement les champs modifiés, jusqu'à la fin du Job (événement `end`)
+    ou l'expiration de la connexion. Version synchrone, pour un serveur WSGI :
+    la connexion y occupe un thread pendant toute sa durée.
+    """
+    stream = _ProgressStream(job_id, timeout)
+    while True:
+        yield from stream.step(_snapshot(job_id))
+        if stream.done:
+            return
+        time.sleep(interval)
+
+
+async def aprogress_events(job_id, interval=STREAM_INTERVAL, timeout=STREAM_TIMEOUT):
+    """Mêmes événements que progress_events, pour un serveur ASGI : l'attente entre deux lectures n'occupe aucun thread."""
+    stream = _ProgressStream(job_id, timeout)
+    while True:
+        for event in stream.step(await sync_to_async(_snapshot)(job_id)):
+            yield event
+        if stream.done:
+            return
+        await asyncio.sleep(interval)
+
+
+def _snapshot(job_id):
+    try:
+        return job_progress(load_job(job_id))
+    except BulkTransferJob.DoesNotExist:
+        return None
+
+
+class _ProgressStream:
+    """État d'un flux de progression : dernier instantané envoyé, keep-alive et expiration."""
+
+    def __init__(self, job_id, timeout):
+        self.job_id = job_id
+        self.timeout = timeout
+        self.started = self.last_sent = time.monotonic()
+        self.previous = None
+        self.done = False
+
+    def step(self, snapshot):
+        """Événements à envoyer pour un nouvel instantané (None : Job supprimé)."""
+        if snapshot is None:
+            self.done = True
+            return [_event('error', {"error": "Bulk job not found."})]
+
+        events = []
+        if self.previous is None:
+            events.append(_event('progress', snapshot))
+        else:
+            delta = {key: value for key, value in snapshot.items() if self.previous.get(key) != value}
+            if delta:
+                delta['job_id'] = self.job_id
+                events.append(_event('progress', delta))
+            elif time.monotonic() - self.last_sent >= STREAM_HEARTBEAT:
+                events.append(": keep-alive\n\n")
+        if events:
+            self.last_sent = time.monotonic()
+        self.previous = snapshot
+
+        if snapshot['status'] in TERMINAL_STATUSES:
+            events.append(_event('end', snapshot))
+            self.done = True
+        elif time.monotonic() - self.started >= self.timeout:
+            self.done = True
+        return events
+
+
+def _event(name, data):
+    return f"event: {name}\ndata: {json.dumps(data)}\n\n"
@@ -0,0 +1,245 @@
+# bulk_transfers/rate_limits.py
+"""
+Limitation de débit des transferts de masse par seaux à jetons.
+
+Les FSP bénéficiaires et le hub limitent le débit qu'ils acceptent ; envoyer un
+fichier aussi vite que possible se solde par des refus. Chaque ligne consomme
+un jeton dans chacun des seaux qui la concernent :
+
+  - global          : tous les transferts ;
+  - fsp:<fspId>     : transferts vers ce FSP bénéficiaire (fsp:* pour tout FSP) ;
+  - currency:<XXX>  : transferts dans cette devise (currency:* pour toute devise).
+
+Configuration (BULK_RATE_LIMITS) : `portée=débit[:capacité]`, séparés par des
+virgules, débit en transferts par seconde, capacité (rafale) égale au débit par
+défaut. Exemple : `global=200,fsp:*=50,fsp:lentfsp=5:10,currency:USD=20`.
+Sans configuration, aucune limite n'est appliquée.
+
+L'état des seaux est partagé par tous les workers via la base (RateLimitBucket,
+UPDATE conditionnel sur `version`), ou gardé en mémoire du processus
+(BULK_RATE_LIMIT_STORE=local, pour un worker unique).
+
+L'ordonnanceur (schedule) lit le fichier en avance, range les lignes par
+destination (FSP, devise) et sert les destinations à tour de rôle selon les
+jetons disponibles : un FSP bridé n'arrête pas le reste du fichier. En
+contrepartie, les lignes ne partent plus dans l'ordre du fichier : seul l'ordre
+des lignes d'une même destination est conservé.
+"""
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, deque, namedtuple
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import RateLimitBucket
+
+Limit = namedtuple('Limit', ['rate', 'burst'])
+
+
+def parse_limits(spec):
+    """'global=200,fsp:*=50,fsp:lentfsp=5:10' -> {'global': Limit(200, 200), ...}"""
+    limits = {}
+    for item in (spec or '').split(','):
+        if not item.strip():
+            continue
+        scope, _, value = item.partition('=')
+        rate, _, burst = value.partition(':')
+        rate = float(rate)
+        if rate <= 0:
+            raise ValueError(f"BULK_RATE_LIMITS : débit invalide pour {scope.strip()} ({value})")
+        limits[scope.strip()] = Limit(rate, float(burst) if burst else max(1.0, rate))
+    return limits
+
+
+# Limites configurées (vide : pas de limitation)
+RATE_LIMITS = parse_limits(os.environ.get("BULK_RATE_LIMITS", ""))
+# Stockage de l'état des seaux : database (partagé entre workers) ou local (processus)
+RATE_LIMIT_STORE = os.environ.get("BULK_RATE_LIMIT_STORE", "database").lower()
+# Lignes lues en avance et réparties par destination
+LOOKAHEAD = int(os.environ.get("BULK_RATE_LIMIT_LOOKAHEAD", "5000"))
+# Jetons demandés au plus par destination et par tour
+GRANT_SIZE = int(os.environ.get("BULK_RATE_LIMIT_GRANT", "32"))
+
+# Bornes de l'attente entre deux tours lorsqu'aucune destination n'a de jeton
+MIN_PAUSE = 0.01
+MAX_PAUSE = 1.0
+# Tentatives d'UPDATE conditionnel avant de céder le tour
+CAS_ATTEMPTS = 5
+
+UNKNOWN_FSP = None
+
+
+def bucket_limits(fsp_id, currency, limits):
+    """[(clé du seau, Limit)] qui s'appliquent à un transfert vers (fsp_id, currency)."""
+    buckets = []
+    if 'global' in limits:
+        buckets.append(('global', limits['global']))
+    if fsp_id is not UNKNOWN_FSP:
+        limit = limits.get(f'fsp:{fsp_id}') or limits.get('fsp:*')
+        if limit:
+            buckets.append((f'fsp:{fsp_id}', limit))
+    limit = limits.get(f'currency:{currency}') or limits.get('currency:*')
+    if limit:
+        buckets.append((f'currency:{currency}', limit))
+    return buckets
+
+
+def _refill(tokens, updated_at, limit, now):
+    elapsed = max(0.0, (now - updated_at).total_seconds())
+    return min(limit.burst, tokens + elapsed * limit.rate)
+
+
+def _grant(levels, buckets, wanted):
+    """Jetons accordables (tous les seaux à la fois) et, à défaut, attente avant le prochain jeton."""
+    granted = min([wanted] + [math.floor(levels[key]) for key, limit in buckets])
+    if granted > 0:
+        return granted, 0.0
+    return 0, max((1 - levels[key]) / limit.rate for key, limit in buckets if levels[key] < 1)
+
+
+class LocalBucketStore:
+    """Seaux en mémoire du processus, partagés par ses threads."""
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, buckets, wanted):
+        """Prélève jusqu'à `wanted` jetons dans chaque seau ; retourne (accordés, attente)."""
+        if not buckets:
+            return wanted, 0.0
+        now = timezone.now()
+        with self._lock:
+            levels = {}
+            for key, limit in buckets:
+                tokens, updated_at = self._buckets.get(key, (limit.burst, now))
+                levels[key] = _refill(tokens, updated_at, limit, now)
+            granted, wait = _grant(levels, buckets, wanted)
+            for key, limit in buckets:
+                self._buckets[key] = (levels[key] - granted, now)
+        return granted, wait
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class DatabaseBucketStore:
+    """
+    Seaux partagés par tous les workers. Le prélèvement est un UPDATE filtré sur la
+    version lue, pour chaque seau, dans une transaction : si un autre worker a
+    prélevé entre-temps, rien n'est écrit et le calcul est refait.
+    """
+
+    def take(self, buckets, wanted):
+        if not buckets:
+            return wanted, 0.0
+        keys = [key for key, limit in buckets]
+
+        for _ in range(CAS_ATTEMPTS):
+            now = timezone.now()
+            rows = {row.key: row for row in RateLimitBucket.objects.filter(key__in=keys)}
+            missing = [(key, limit) for key, limit in buckets if key not in rows]
+            if missing:
+                self._create(missing, now)
+                continue
+
+            levels = {key: _refill(rows[key].tokens, rows[key].updated_at, limit, now) for key, limit in buckets}
+            granted, wait = _grant(levels, buckets, wanted)
+            if not granted:
+                return 0, wait
+
+            with transaction.atomic():
+                taken = all(
+                    RateLimitBucket.objects.filter(key=key, version=rows[key].version).update(
+                        tokens=levels[key] - granted,
+                        updated_at=now,
+                        version=F('version') + 1,
+                    )
+                    for key in keys
+                )
+                if not taken:
+                    transaction.set_rollback(True)
+            if taken:
+                return granted, 0.0
+        return 0, MIN_PAUSE
+
+    def _create(self, buckets, now):
+        for key, limit in buckets:
+            try:
+                with transaction.atomic():
+                    RateLimitBucket.objects.create(key=key, tokens=limit.burst, updated_at=now)
+            except IntegrityError:
+                # Créé au même moment par un autre worker
+                pass
+
+    def clear(self):
+        RateLimitBucket.objects.all().delete()
+
+
+local_buckets = LocalBucketStore()
+
+
+def default_store():
+    return local_buckets if RATE_LIMIT_STORE == 'local' else DatabaseBucketStore()
+
+
+def schedule(rows, destination, limits=None, store=None, lookahead=None):
+    """
+    Réordonne les lignes [(numéro_ligne, paramètres)] selon les jetons disponibles.
+    `destination(numéro_ligne, paramètres)` retourne (FSP ou None, devise).
+
+    Les destinations sont servies à tour de rôle, jusqu'à GRANT_SIZE lignes chacune.
+    Quand aucune n'a de jeton, le générateur produit None avant d'attendre : le
+    consommateur envoie alors ce qu'il a déjà reçu au lieu de le garder en attente.
+    """
+    limits = RATE_LIMITS if limits is None else limits
+    store = store or default_store()
+    lookahead = max(1, lookahead or LOOKAHEAD)
+    rows = iter(rows)
+    exhausted = False
+    queues = OrderedDict()
+    buffered = 0
+    resume_at = 0.0
+
+    while True:
+        while not exhausted and buffered < lookahead:
+            row = next(rows, None)
+            if row is None:
+                exhausted = True
+                break
+            queues.setdefault(destination(*row), deque()).append(row)
+            buffered += 1
+        if not queues:
+            return
+
+        delay = resume_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+        waits = []
+        for target in list(queues):
+            queue = queues[target]
+            granted, wait = store.take(bucket_limits(*target, limits), min(len(queue), GRANT_SIZE))
+            if not granted:
+                waits.append(wait)
+                continue
+            buffered -= granted
+            for _ in range(granted):
+                yield queue.popleft()
+            if queue:
+                # Dernière servie : passe après les autres au prochain tour
+                queues.move_to_end(target)
+            else:
+                del queues[target]
+
+        if queues and len(waits) == len(queues):
+            # Aucune destination servie à ce tour : attente du prochain jeton
+            resume_at = time.monotonic() + min(MAX_PAUSE, max(MIN_PAUSE, min(waits)))
+            yield None
+        else:
+            resume_at = 0.0
@@ -1,3 +1,4 @@
+from django.db import IntegrityError
 from rest_framework import serializers
 from .models import BulkTransferJob
 from transfert.models import Account, Transfer
@@ -6,6 +7,8 @@ class BulkTransferUploadSerializer(serializers.Serializer):
     """Sérialiseur pour valider l'upload du fichier et l'expéditeur."""
     file = serializers.FileField()
     sender_msisdn = serializers.CharField(max_length=15)
+    execution_mode = serializers.ChoiceField(choices=BulkTransferJob.EXECUTION_MODES, required=False, default='INDIVIDUAL')
+    priority = serializers.ChoiceField(choices=BulkTransferJob.PRIORITIES, required=False, default='NORMAL')
 
     def validate_sender_msisdn(self, value):
         try:
@@ -16,18 +19,28 @@ class BulkTransferUploadSerializer(serializers.Serializer):
 
     def create(self, validated_data):
         sender = Account.objects.get(msisdn=validated_data['sender_msisdn'])
-        job = BulkTransferJob.objects.create(
+        job = BulkTransferJob(
             file=validated_data['file'],
             submitter=sender,
-            status='UPLOADED'
+            status='UPLOADED',
+            execution_mode=validated_data['execution_mode'],
+            priority=validated_data['priority'],
+            idempotency_key=validated_data.get('idempotency_key'),
+            file_sha256=validated_data.get('file_sha256', ''),
         )
+        try:
+            job.save()
+        except IntegrityError:
+            # Même clé d'idempotence enregistrée entre-temps : le fichier copié n'a plus de Job
+            job.file.delete(save=False)
+            raise
         return job
 
 class BulkTransferJobSerializer(serializers.ModelSerializer):
     """Sérialiseur pour afficher l'état du Job."""
     class Meta:
         model = BulkTransferJob
-        fields = '__all__'
+        exclude = ('row_index',)
 
 #
 class TransferDetailSerializer(serializers.ModelSerializer):
@@ -53,7 +66,5 @@ class TransferDetailSerializer(serializers.ModelSerializer):
     def get_message_erreur(self, obj):
         # Récupère l'erreur pertinente si le statut est 'FAILED' ou 'PROCESSING'
         if obj.status == 'FAILED' or obj.status == 'ERROR':
-            # Cherchez un champ d'erreur dans sdk_response_data ou utilisez un champ local si vous l'avez
-            error = obj.sdk_response_data.get('error') if obj.sdk_response_data else None
-            return error or "Compte/Destinataire invalide pour le DFSP cible."
+            return obj.error_message or "Compte/Destinataire invalide pour le DFSP cible."
         return "" # Pas de message d'erreur si la transaction a réussi
\ No newline at end of file
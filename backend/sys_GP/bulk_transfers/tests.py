@@ -1,3 +1,732 @@
-from django.test import TestCase
+import decimal
+import shutil
+import tempfile
+import threading
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.base import ContentFile
+from django.db.models import F
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from transfert import services
+from transfert.fake_sdk import FakeSdkBehaviour, FakeSdkServer
+from transfert.idempotency import bulk_home_transaction_id, bulk_transfer_id
+from transfert.models import Account, Transfer
+from . import chunks, csv_stream, exports, process_utils, rate_limits, validation, worker
+from .models import BulkRowVerdict, BulkTransferChunk, BulkTransferJob, RateLimitBucket
+
+
+def _rows(count, job_id=1):
+    return [
+        (line_number, {
+            'receiver_id_type': 'MSISDN',
+            'receiver_id_value': f"2299{line_number:07d}",
+            'amount': '10',
+            'currency': 'XOF',
+            'note': 'Bulk',
+            'receiver_fsp_id': None,
+            'home_transaction_id': bulk_home_transaction_id(job_id, line_number),
+        })
+        for line_number in range(1, count + 1)
+    ]
+
+
+def _sent(transfer_id=None, home_transaction_id=None, **kwargs):
+    return {"success": True, "transfer_id": transfer_id, "status": "COMPLETED",
+            "data": {"transferId": transfer_id, "currentState": "COMPLETED"},
+            "home_transaction_id": home_transaction_id}
+
+
+class DispatchIndividualTests(SimpleTestCase):
+
+    def _dispatch(self, rows, sdk, window=4, checkpoint_rows=50, claim_lost=None):
+        checkpoints = []
+        with mock.patch.object(process_utils, 'execute_p2p_transfer_via_sdk', side_effect=sdk) as transfer, \
+                mock.patch.object(process_utils, '_wait_for_sdk'):
+            outcomes = list(process_utils._dispatch_individual(
+                rows, '22990000000', window, checkpoints.append, checkpoint_rows=checkpoint_rows, claim_lost=claim_lost,
+            ))
+        return outcomes, checkpoints, transfer
+
+    def test_rows_are_checkpointed_in_batches(self):
+        outcomes, checkpoints, _ = self._dispatch(_rows(120), _sent)
+        self.assertEqual([len(batch) for batch in checkpoints], [50, 50, 20])
+        self.assertEqual(sorted(line_number for line_number, _, _ in outcomes), list(range(1, 121)))
+
+    def test_transfer_id_is_checkpointed_and_sent(self):
+        outcomes, checkpoints, transfer = self._dispatch(_rows(3), _sent)
+        checkpointed = {line_number: transfer_id for batch in checkpoints for line_number, _, transfer_id in batch}
+        for line_number, params in _rows(3):
+            self.assertEqual(checkpointed[line_number], bulk_transfer_id(params['home_transaction_id']))
+        sent = {call.kwargs['transfer_id'] for call in transfer.call_args_list}
+        self.assertEqual(sent, set(checkpointed.values()))
+
+    def test_unsent_rows_are_requeued_not_failed(self):
+        refused = set()
+
+        def sdk(**kwargs):
+            # Premier envoi de chaque ligne paire refusé par le client SDK (disjoncteur, fenêtre saturée)
+            key = kwargs['home_transaction_id']
+            if int(kwargs['receiver_id_value'][-1]) % 2 == 0 and key not in refused:
+                refused.add(key)
+                return services._not_sent_result("Concurrency limit reached", key)
+            return _sent(**kwargs)
+
+        outcomes, checkpoints, transfer = self._dispatch(_rows(10), sdk)
+        self.assertEqual(len(outcomes), 10)
+        self.assertTrue(all(outcome['success'] for _, _, outcome in outcomes))
+        self.assertEqual(transfer.call_count, 15)
+        # Les lignes renvoyées ne sont pas enregistrées une seconde fois
+        self.assertEqual(sum(len(batch) for batch in checkpoints), 10)
+
+    def test_rows_refused_too_long_interrupt_the_job(self):
+        sdk = lambda **kwargs: services._not_sent_result("Circuit open", kwargs['home_transaction_id'])
+        with mock.patch.object(process_utils, 'CIRCUIT_WAIT', 0), self.assertRaises(services.CircuitOpenError):
+            self._dispatch(_rows(2), sdk)
+
+    def test_lost_claim_stops_before_sending(self):
+        claim_lost = threading.Event()
+        claim_lost.set()
+        checkpoint = mock.Mock()
+        with mock.patch.object(process_utils, 'execute_p2p_transfer_via_sdk') as transfer:
+            self.assertRaises(process_utils.ClaimLost, list, process_utils._dispatch_individual(
+                _rows(5), '22990000000', 4, checkpoint, claim_lost=claim_lost,
+            ))
+        # Rien n'a été enregistré ni envoyé
+        checkpoint.assert_not_called()
+        transfer.assert_not_called()
+
+    def test_claim_lost_mid_job_stops_further_rows(self):
+        claim_lost = threading.Event()
+        checkpoints = []
+
+        def sdk(**kwargs):
+            # Le battement de cœur constate la reprise pendant le premier envoi
+            claim_lost.set()
+            return _sent(**kwargs)
+
+        with mock.patch.object(process_utils, 'execute_p2p_transfer_via_sdk', side_effect=sdk) as transfer, \
+                mock.patch.object(process_utils, '_wait_for_sdk'):
+            outcomes = process_utils._dispatch_individual(
+                _rows(5), '22990000000', 1, checkpoints.append, checkpoint_rows=1, claim_lost=claim_lost,
+            )
+            # Le résultat déjà reçu est remis avant l'arrêt
+            self.assertEqual(next(outcomes)[0], 1)
+            self.assertRaises(process_utils.ClaimLost, list, outcomes)
+        self.assertEqual(transfer.call_count, 1)
+        self.assertEqual(len(checkpoints), 1)
+
+
+
+class _FailSecondItem(FakeSdkBehaviour):
+    """Le deuxième transfert individuel reçu dans un lot est refusé par le FSP bénéficiaire."""
+
+    def __init__(self):
+        super().__init__()
+        self.items = 0
+
+    def item_fails(self, fsp_id):
+        self.items += 1
+        return self.items == 2
+
+
+class BulkModeTests(SimpleTestCase):
+    """Mode BULK (/bulkQuotes + /bulkTransfers) contre le substitut local du SDK."""
+
+    def setUp(self):
+        self.server = FakeSdkServer(_FailSecondItem()).start()
+        self.addCleanup(self.server.stop)
+        patcher = mock.patch.object(services, 'SIMULATION_MODE', False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        base_url = services.sdk_client.base_url
+        self.addCleanup(self._point_sdk_at, base_url)
+        self._point_sdk_at(self.server.url)
+
+    @staticmethod
+    def _point_sdk_at(base_url):
+        services.sdk_client.close()
+        services.sdk_client.base_url = base_url
+        services.sdk_client.breaker.reset()
+        services.party_cache.clear()
+
+    def test_bulk_transfer_reports_item_failures(self):
+        transfers = [
+            {**params, 'transfer_id': bulk_transfer_id(params['home_transaction_id'])} for _, params in _rows(3)
+        ]
+        results = services.execute_bulk_transfer_via_sdk('22990000000', transfers, 'XOF', 'payeefsp')
+
+        self.assertEqual([result['success'] for result in results], [True, False, True])
+        self.assertIn('Simulated payee error', results[1]['error'])
+        self.assertEqual([result['home_transaction_id'] for result in results],
+                         [transfer['home_transaction_id'] for transfer in transfers])
+        self.assertEqual(results[0]['transfer_id'], transfers[0]['transfer_id'])
+        self.assertEqual((self.server.calls['POST /bulkQuotes'], self.server.calls['POST /bulkTransfers']), (1, 1))
+
+    def test_dispatch_groups_rows_by_resolved_fsp(self):
+        checkpoints = []
+        outcomes = list(process_utils._dispatch_batched(_rows(4), '22990000000', 4, checkpoints.append))
+
+        # Résultats dans l'ordre du CSV ; seule la ligne refusée par le FSP échoue
+        self.assertEqual([line_number for line_number, _, _ in outcomes], [1, 2, 3, 4])
+        self.assertEqual([outcome['success'] for _, _, outcome in outcomes], [True, False, True, True])
+        self.assertEqual(sum(len(batch) for batch in checkpoints), 4)
+        # FSP résolu via /parties, puis un seul lot, sans /transfers individuel
+        self.assertEqual(self.server.calls['GET /parties'], 4)
+        self.assertEqual((self.server.calls['POST /bulkQuotes'], self.server.calls['POST /bulkTransfers']), (1, 1))
+        self.assertEqual(self.server.calls['POST /transfers'], 0)
+
+class RecoverInFlightTests(TestCase):
+
+    def setUp(self):
+        self.account = Account.objects.create(msisdn='22990000000', name='Payeur', balance=decimal.Decimal('1000'))
+        self.job = BulkTransferJob.objects.create(file='bulk_uploads/test.csv', submitter=self.account, status='PROCESSING')
+
+    def _initiated(self, line_number, transfer_id):
+        return Transfer.objects.create(
+            sender=self.account, receiver_msisdn='22991234567', amount=decimal.Decimal('10'), currency='XOF',
+            bulk_job=self.job, bulk_line=line_number, transfer_id=transfer_id, status='INITIATED',
+            home_transaction_id=bulk_home_transaction_id(self.job.id, line_number),
+        )
+
+    def test_in_flight_rows_are_reconciled_by_transfer_id(self):
+        states = {'t-completed': 'COMPLETED', 't-unknown': 'NOT_FOUND', 't-silent': None}
+        for line_number, transfer_id in enumerate(states, start=1):
+            self._initiated(line_number, transfer_id)
+        legacy = self._initiated(4, None)
+
+        with mock.patch.object(process_utils, 'get_transfer_state_via_sdk', side_effect=states.get) as get_state:
+            process_utils.recover_in_flight(self.job)
+
+        self.assertEqual(sorted(call.args[0] for call in get_state.call_args_list), sorted(states))
+        statuses = dict(Transfer.objects.filter(bulk_job=self.job).values_list('transfer_id', 'status'))
+        self.assertEqual(statuses['t-completed'], 'MOJALOOP_COMPLETED')
+        self.assertNotIn('t-unknown', statuses)
+        self.assertEqual(statuses['t-silent'], 'FAILED')
+        legacy.refresh_from_db()
+        self.assertEqual(legacy.status, 'FAILED')
+
+
+class ExecuteRowsTests(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        account = Account.objects.create(msisdn='22990000000', name='Payeur')
+        self.job = BulkTransferJob(submitter=account, status='PROCESSING', total_transfers=3)
+        content = "type_id,valeur_id,devise,montant,nom_complet\n" + "".join(
+            f"MSISDN,2299100000{n},XOF,10,N{n}\n" for n in range(1, 4)
+        )
+        self.job.file.save('test.csv', ContentFile(content.encode()), save=False)
+        self.job.save()
+
+    def test_received_outcomes_are_flushed_when_dispatch_fails(self):
+        def dispatch(rows, sender_msisdn, window, checkpoint, **kwargs):
+            rows = list(rows)
+            checkpoint([(line_number, params, None) for line_number, params in rows])
+            for line_number, params in rows[:2]:
+                yield line_number, params, _sent(home_transaction_id=params['home_transaction_id'])
+            raise services.CircuitOpenError("Circuit open")
+
+        with mock.patch.object(process_utils, '_dispatch_individual', side_effect=dispatch), \
+                mock.patch.object(process_utils, 'FLUSH_SECONDS', 3600), \
+                self.assertRaises(services.CircuitOpenError):
+            process_utils.execute_rows(self.job)
+
+        statuses = dict(Transfer.objects.filter(bulk_job=self.job).values_list('bulk_line', 'status'))
+        self.assertEqual(statuses, {1: 'MOJALOOP_COMPLETED', 2: 'MOJALOOP_COMPLETED', 3: 'INITIATED'})
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.transfers_completed, 2)
+
+    def test_fsp_resolved_by_validation_is_sent_without_new_lookup(self):
+        BulkRowVerdict.objects.create(job=self.job, line_number=2, verdict='ACCEPTED', receiver_fsp_id='payeefsp')
+        sdk = mock.Mock(side_effect=_sent)
+        with mock.patch.object(process_utils, 'execute_p2p_transfer_via_sdk', sdk):
+            process_utils.execute_rows(self.job)
+        # Transmis comme to.fspId : execute_p2p_transfer_via_sdk ne résout pas à nouveau
+        sent = {call.kwargs['receiver_id_value']: call.kwargs['receiver_fsp_id'] for call in sdk.call_args_list}
+        self.assertEqual(sent, {'22991000001': None, '22991000002': 'payeefsp', '22991000003': None})
+
+
+class BulkStatusTests(TestCase):
+
+    def test_pending_counts_rows_awaiting_their_result(self):
+        account = Account.objects.create(msisdn='22990000000', name='Payeur')
+        job = BulkTransferJob.objects.create(file='bulk_uploads/test.csv', submitter=account, status='PROCESSING', total_transfers=3)
+        for line_number, status in enumerate(('MOJALOOP_COMPLETED', 'FAILED', 'INITIATED'), start=1):
+            Transfer.objects.create(sender=account, receiver_msisdn='22991234567', amount=10, bulk_job=job,
+                                    bulk_line=line_number, status=status)
+
+        response = self.client.get(f'/api/v1/bulk/status/{job.id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [response.json()[key] for key in ('reussi_count', 'echoue_count', 'en_attente_count')], [1, 1, 1],
+        )
+
+
+class ValidationTests(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        resolve = mock.patch.object(validation, 'lookup_party', return_value={
+            "found": True, "fsp_id": "payeefsp", "name": None, "error": None,
+        })
+        resolve.start()
+        self.addCleanup(resolve.stop)
+        self.account = Account.objects.create(msisdn='22990000000', name='Payeur', balance=decimal.Decimal('1000'))
+
+    def _job(self, *lines):
+        job = BulkTransferJob(submitter=self.account)
+        content = "type_id,valeur_id,devise,montant,nom_complet\n" + "".join(f"{line}\n" for line in lines)
+        job.file.save('test.csv', ContentFile(content.encode()), save=False)
+        job.save()
+        return job
+
+    def test_accepted_rows_are_reserved(self):
+        job = self._job("MSISDN,22991000001,XOF,100,A", "MSISDN,22991000002,XOF,50.50,B")
+        self.assertTrue(validation.validate_bulk_file(job.id))
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.reserved, decimal.Decimal('150.50'))
+
+    def test_mixed_currency_file_is_rejected_before_reserving(self):
+        job = self._job("MSISDN,22991000001,XOF,100,A", "MSISDN,22991000002,USD,100,B")
+        self.assertFalse(validation.validate_bulk_file(job.id))
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'VALIDATION_FAILED')
+        self.assertIn('plusieurs devises', job.error_message)
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.reserved, 0)
+
+    def test_file_in_another_currency_than_the_ledger_is_rejected(self):
+        job = self._job("MSISDN,22991000001,USD,100,A")
+        with mock.patch.object(validation, 'LEDGER_CURRENCY', 'XOF'):
+            self.assertFalse(validation.validate_bulk_file(job.id))
+        job.refresh_from_db()
+        self.assertIn('XOF', job.error_message)
+
+    def test_verdicts_are_written_in_batches(self):
+        lines = [f"MSISDN,2299100000{n},XOF,10,N{n}" for n in range(5)]
+        job = self._job(*lines, "MSISDN,22991000000,XOF,10,N0", "EMAIL,x,XOF,10.001,X")
+        with mock.patch.object(validation, 'VERDICT_BATCH_SIZE', 2), \
+                mock.patch.object(validation, 'VALIDATION_STRICT', False), \
+                mock.patch.object(validation.BulkRowVerdict.objects, 'bulk_create',
+                                  wraps=validation.BulkRowVerdict.objects.bulk_create) as bulk_create:
+            self.assertTrue(validation.validate_bulk_file(job.id))
+        self.assertEqual([len(call.args[0]) for call in bulk_create.call_args_list], [2, 2, 3])
+        rejected = dict(job.verdicts.filter(verdict='REJECTED').values_list('line_number', 'errors'))
+        self.assertEqual(rejected, {
+            6: ["Ligne en double (identique à la ligne 1)"],
+            7: ["Montant avec plus de 2 décimales : 10.001"],
+        })
+        job.refresh_from_db()
+        self.assertEqual((job.total_transfers, job.invalid_rows), (7, 2))
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.reserved, decimal.Decimal('50'))
+
+    def test_duplicate_key_has_a_fixed_size(self):
+        key = validation._row_key(('MSISDN', '22991000001'), 'XOF', decimal.Decimal('10'))
+        self.assertEqual(len(key), 16)
+        # Même montant, autre écriture : même ligne
+        self.assertEqual(key, validation._row_key(('MSISDN', '22991000001'), 'XOF', decimal.Decimal('10.00')))
+        self.assertNotEqual(key, validation._row_key(('MSISDN', '22991000002'), 'XOF', decimal.Decimal('10')))
+
+    def test_insufficient_balance_fails_validation(self):
+        job = self._job("MSISDN,22991000001,XOF,600,A", "MSISDN,22991000002,XOF,600,B")
+        self.assertFalse(validation.validate_bulk_file(job.id))
+        job.refresh_from_db()
+        self.assertIn('Solde insuffisant', job.error_message)
+
+
+class UploadIdempotencyTests(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        Account.objects.create(msisdn='22990000000', name='Payeur')
+
+    def _upload(self, content, key=None):
+        headers = {'HTTP_IDEMPOTENCY_KEY': key} if key is not None else {}
+        return self.client.post('/api/v1/bulk/upload/', {
+            'file': ContentFile(content.encode(), name='paie.csv'),
+            'sender_msisdn': '22990000000',
+        }, **headers)
+
+    def test_same_key_returns_the_queued_job(self):
+        content = "type_id,valeur_id,devise,montant,nom_complet\nMSISDN,22991000001,XOF,100,A\n"
+        first = self._upload(content, key='paie-2026-10')
+        second = self._upload(content, key='paie-2026-10')
+        self.assertEqual(first.status_code, 202)
+        self.assertEqual(second.status_code, 202)
+        self.assertEqual(second.json()['job_id'], first.json()['job_id'])
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(BulkTransferJob.objects.count(), 1)
+
+    def test_replay_returns_the_stored_summary_without_reading_the_file(self):
+        content = "type_id,valeur_id,devise,montant,nom_complet\nMSISDN,22991000001,XOF,100,A\n"
+        first = self._upload(content, key='paie-2026-10')
+        # La validation met ensuite à jour les compteurs du Job : le rejeu n'en dépend pas
+        BulkTransferJob.objects.update(total_transfers=7, invalid_rows=5)
+        with mock.patch('bulk_transfers.views.open_job_rows') as open_rows:
+            second = self._upload(content, key='paie-2026-10')
+        open_rows.assert_not_called()
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual((second.json()['valid_rows'], second.json()['total_amount']), (1, 100.0))
+
+    def test_same_key_with_another_file_is_refused(self):
+        self._upload("type_id,valeur_id,devise,montant,nom_complet\nMSISDN,22991000001,XOF,100,A\n", key='paie')
+        response = self._upload("type_id,valeur_id,devise,montant,nom_complet\nMSISDN,22991000001,XOF,200,A\n", key='paie')
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(BulkTransferJob.objects.count(), 1)
+
+    def test_upload_without_key_is_not_deduplicated(self):
+        content = "type_id,valeur_id,devise,montant,nom_complet\nMSISDN,22991000001,XOF,100,A\n"
+        self._upload(content)
+        self._upload(content)
+        self.assertEqual(BulkTransferJob.objects.count(), 2)
+
+
+class ProgressStreamTests(TestCase):
+
+    def setUp(self):
+        self.job = BulkTransferJob.objects.create(file='bulk_uploads/test.csv', status='COMPLETED',
+                                                  total_transfers=2, transfers_completed=2)
+
+    def test_sync_stream_under_wsgi(self):
+        response = self.client.get(f'/api/v1/bulk/progress/{self.job.id}/stream/')
+        self.assertFalse(response.is_async)
+        body = b''.join(response.streaming_content).decode()
+        self.assertIn('event: progress', body)
+        self.assertIn('event: end', body)
+
+    async def test_async_stream_under_asgi(self):
+        response = await self.async_client.get(f'/api/v1/bulk/progress/{self.job.id}/stream/')
+        self.assertTrue(response.is_async)
+        body = ''.join([chunk.decode() async for chunk in response.streaming_content])
+        self.assertIn('event: end', body)
+
+
+class RecipientsPageTests(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        Account.objects.create(msisdn='22990000000', name='Payeur')
+
+    def test_pages_are_read_from_the_row_index(self):
+        lines = [f'MSISDN,2299100{n:04d},XOF,{n + 1},"Nom\n{n}"' if n % 4 == 0 else f"MSISDN,2299100{n:04d},XOF,{n + 1},Nom {n}"
+                 for n in range(10)]
+        content = "\ufefftype_id,valeur_id,devise,montant,nom_complet\r\n" + "\r\n".join(lines) + "\r\n"
+        with mock.patch.object(csv_stream, 'ROW_INDEX_STEP', 3):
+            response = self.client.post('/api/v1/bulk/upload/', {
+                'file': ContentFile(content.encode(), name='paie.csv'), 'sender_msisdn': '22990000000',
+            })
+            job = BulkTransferJob.objects.get(id=response.json()['job_id'])
+            self.assertEqual(len(job.row_index), 4)
+
+            expected = [csv_stream.recipient(row) for _, row in csv_stream.iter_csv_rows(job.file.open('rb'))]
+            job.file.close()
+            for offset, limit in ((0, 10), (2, 3), (3, 3), (4, 5), (9, 5), (12, 2)):
+                page = self.client.get(f'/api/v1/bulk/recipients/{job.id}/?offset={offset}&limit={limit}').json()
+                self.assertEqual(page['recipients'], expected[offset:offset + limit], (offset, limit))
+        self.assertEqual(expected[4]['fullName'], 'Nom\n4')
+
+
+class XlsxExportTests(TestCase):
+
+    def test_report_is_streamed_as_a_readable_workbook(self):
+        from io import BytesIO
+        from openpyxl import load_workbook
+
+        account = Account.objects.create(msisdn='22990000000', name='Payeur')
+        job = BulkTransferJob.objects.create(file='bulk_uploads/test.csv', submitter=account, status='COMPLETED', total_transfers=2)
+        Transfer.objects.create(sender=account, receiver_msisdn='22991234567', amount='12.50', bulk_job=job, bulk_line=1,
+                                status='MOJALOOP_COMPLETED', note='Prime <juin> & co', home_transaction_id='ht-1')
+        Transfer.objects.create(sender=account, receiver_msisdn='22991234568', amount='3', bulk_job=job, bulk_line=2,
+                                status='FAILED', error_message='Refus\x07 du FSP', home_transaction_id='ht-2')
+
+        response = self.client.get(f'/api/v1/bulk/export/xlsx/{job.id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        sheet = load_workbook(BytesIO(b''.join(response.streaming_content)))[f"Job {job.id}"]
+        rows = list(sheet.iter_rows(values_only=True))
+        self.assertEqual(list(rows[0]), exports.REPORT_HEADER)
+        self.assertEqual(rows[1][:5], ('22991234567', 12.5, 'USD', 'Prime <juin> & co', 'MOJALOOP_COMPLETED'))
+        self.assertEqual(rows[2][1], 3)
+        self.assertEqual(rows[2][5], 'Refus du FSP')
+
+
+class WorkerClaimTests(TestCase):
+
+    def setUp(self):
+        self.account = Account.objects.create(msisdn='22990000000', name='Payeur')
+
+    def _job(self, **fields):
+        return BulkTransferJob.objects.create(file='bulk_uploads/test.csv', submitter=self.account, **fields)
+
+    def _stale(self):
+        return timezone.now() - timedelta(seconds=worker.STALE_AFTER + 1)
+
+    def test_highest_priority_job_is_claimed_first(self):
+        low = self._job(priority='LOW')
+        high = self._job(priority='HIGH')
+        self.assertEqual(worker.claim_next_job('a'), high.id)
+        self.assertEqual(worker.claim_next_job('b'), low.id)
+        self.assertIsNone(worker.claim_next_job('c'))
+        high.refresh_from_db()
+        self.assertEqual((high.status, high.claimed_by), ('VALIDATING', 'a'))
+
+    def test_live_job_is_not_reclaimed(self):
+        job = self._job(status='PROCESSING', claimed_by='a', heartbeat_at=timezone.now())
+        self.assertIsNone(worker.claim_next_job('b'))
+        job.refresh_from_db()
+        self.assertEqual(job.claimed_by, 'a')
+
+    def test_stale_job_is_reclaimed_and_old_worker_fenced(self):
+        job = self._job(status='PROCESSING', claimed_by='a', heartbeat_at=self._stale())
+        self.assertEqual(worker.claim_next_job('b'), job.id)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.claimed_by), ('PROCESSING', 'b'))
+
+        old = worker.Heartbeat(job.id, 'a')
+        self.assertFalse(old.beat())
+        self.assertTrue(old.lost.is_set())
+        new = worker.Heartbeat(job.id, 'b')
+        self.assertTrue(new.beat())
+        self.assertFalse(new.lost.is_set())
+
+    def test_lost_claim_leaves_job_to_new_owner(self):
+        job = self._job(status='PROCESSING', claimed_by='b', total_transfers=2)
+        with mock.patch.object(worker, 'process_bulk_file', side_effect=process_utils.ClaimLost()):
+            worker.run_job(job.id, claim_lost=threading.Event())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.error_message), ('PROCESSING', ''))
+
+    def test_stale_chunk_is_reclaimed_and_old_worker_fenced(self):
+        job = self._job(status='PROCESSING', total_transfers=20)
+        chunk = BulkTransferChunk.objects.create(job=job, sequence=0, first_line=1, last_line=10,
+                                                 status='PROCESSING', claimed_by='a', heartbeat_at=self._stale())
+        self.assertEqual(worker.claim_next_chunk('b'), chunk.id)
+        old = worker.Heartbeat(chunk.id, 'a', model=BulkTransferChunk)
+        self.assertFalse(old.beat())
+        self.assertTrue(old.lost.is_set())
+
+    def test_chunks_are_claimed_in_sequence_once(self):
+        job = self._job(status='VALIDATING', total_transfers=25)
+        self.assertTrue(chunks.partition_job(job.id, chunk_rows=10))
+        first = worker.claim_next_chunk('a')
+        second = worker.claim_next_chunk('b')
+        third = worker.claim_next_chunk('c')
+        self.assertIsNone(worker.claim_next_chunk('d'))
+        sequences = [BulkTransferChunk.objects.get(id=chunk_id).sequence for chunk_id in (first, second, third)]
+        self.assertEqual(sequences, [0, 1, 2])
+
+
+class FairShareTests(TestCase):
+    """Partage pondéré des workers entre expéditeurs (claim_next_chunk)."""
+
+    def _job(self, msisdn, priority, chunk_count=40):
+        account = Account.objects.create(msisdn=msisdn, name=msisdn)
+        job = BulkTransferJob.objects.create(file='bulk_uploads/test.csv', submitter=account, status='PROCESSING',
+                                             priority=priority, total_transfers=chunk_count)
+        BulkTransferChunk.objects.bulk_create([
+            BulkTransferChunk(job=job, sequence=n, first_line=n + 1, last_line=n + 1) for n in range(chunk_count)
+        ])
+        return job
+
+    def _claims(self, count):
+        claimed = [worker.claim_next_chunk(f'w{n}') for n in range(count)]
+        return [BulkTransferChunk.objects.get(id=chunk_id).job.priority for chunk_id in claimed]
+
+    def test_workers_are_shared_in_proportion_to_priority_weights(self):
+        self._job('22990000001', 'HIGH')
+        self._job('22990000002', 'LOW')
+        with mock.patch.object(worker, 'PRIORITY_WEIGHTS', {'HIGH': 10, 'NORMAL': 3, 'LOW': 1}):
+            priorities = self._claims(33)
+        # Tranches en cours gardées : 10 pour 1, à une tranche près
+        self.assertEqual((priorities.count('HIGH'), priorities.count('LOW')), (30, 3))
+
+    def test_low_priority_is_not_starved(self):
+        self._job('22990000001', 'HIGH')
+        self._job('22990000002', 'LOW')
+        with mock.patch.object(worker, 'PRIORITY_WEIGHTS', {'HIGH': 10, 'NORMAL': 3, 'LOW': 1}):
+            priorities = self._claims(2)
+        # Un expéditeur sans tranche en cours passe avant celui qui en a déjà
+        self.assertEqual(priorities, ['HIGH', 'LOW'])
+
+    def test_finished_chunks_free_their_share(self):
+        high = self._job('22990000001', 'HIGH')
+        self._job('22990000002', 'LOW')
+        with mock.patch.object(worker, 'PRIORITY_WEIGHTS', {'HIGH': 10, 'NORMAL': 3, 'LOW': 1}):
+            self._claims(11)
+            BulkTransferChunk.objects.filter(job=high, status='PROCESSING').update(status='COMPLETED')
+            # HIGH n'a plus de tranche en cours : il repasse devant LOW
+            self.assertEqual(self._claims(1), ['HIGH'])
+
+class PartitionTests(TestCase):
+
+    def setUp(self):
+        account = Account.objects.create(msisdn='22990000000', name='Payeur')
+        self.job = BulkTransferJob.objects.create(file='bulk_uploads/test.csv', submitter=account,
+                                                  status='VALIDATING', total_transfers=25)
+
+    def _close_all(self, status='COMPLETED'):
+        for chunk in BulkTransferChunk.objects.filter(job=self.job):
+            chunk.status = status
+            chunk.transfers_completed = chunk.last_line - chunk.first_line + 1
+            chunk.save()
+
+    def test_small_job_is_not_partitioned(self):
+        self.assertFalse(chunks.partition_job(self.job.id, chunk_rows=25))
+        self.assertFalse(BulkTransferChunk.objects.filter(job=self.job).exists())
+
+    def test_job_is_split_into_line_ranges(self):
+        self.assertTrue(chunks.partition_job(self.job.id, chunk_rows=10))
+        ranges = list(BulkTransferChunk.objects.filter(job=self.job).order_by('sequence')
+                      .values_list('first_line', 'last_line', 'status'))
+        self.assertEqual(ranges, [(1, 10, 'PENDING'), (11, 20, 'PENDING'), (21, 25, 'PENDING')])
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, 'PROCESSING')
+
+    def test_job_is_closed_once_all_chunks_are_done(self):
+        chunks.partition_job(self.job.id, chunk_rows=10)
+        self.assertFalse(chunks.finalize_job(self.job.id))
+        self._close_all()
+        self.assertTrue(chunks.finalize_job(self.job.id))
+        # Une seule clôture, même si plusieurs workers finissent en même temps
+        self.assertFalse(chunks.finalize_job(self.job.id))
+        self.job.refresh_from_db()
+        self.assertEqual((self.job.status, self.job.transfers_completed), ('COMPLETED', 25))
+
+    def test_failed_chunk_fails_job_and_is_retried(self):
+        chunks.partition_job(self.job.id, chunk_rows=10)
+        self._close_all()
+        BulkTransferChunk.objects.filter(job=self.job, sequence=1).update(status='FAILED')
+        self.assertTrue(chunks.finalize_job(self.job.id))
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, 'FAILED')
+
+        # Relance : seule la tranche en échec repart
+        self.assertTrue(chunks.partition_job(self.job.id, chunk_rows=10))
+        pending = BulkTransferChunk.objects.filter(job=self.job, status='PENDING').values_list('sequence', flat=True)
+        self.assertEqual(list(pending), [1])
+
+
+class _Clock:
+    """Horloge figée de rate_limits (timezone.now), avancée à la main."""
+
+    def __init__(self):
+        self.current = timezone.now()
+
+    def now(self):
+        return self.current
+
+    def advance(self, seconds):
+        self.current += timedelta(seconds=seconds)
+
+
+class TokenBucketTests(TestCase):
+
+    limits = {'global': rate_limits.Limit(rate=2.0, burst=4.0), 'fsp:*': rate_limits.Limit(rate=1.0, burst=2.0)}
+
+    def setUp(self):
+        self.clock = _Clock()
+        patcher = mock.patch.object(rate_limits, 'timezone', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _check_refill(self, store):
+        buckets = rate_limits.bucket_limits('payeefsp', 'XOF', self.limits)
+        self.assertEqual([key for key, _ in buckets], ['global', 'fsp:payeefsp'])
+        # Capacité du seau le plus petit, puis attente du prochain jeton
+        self.assertEqual(store.take(buckets, 5), (2, 0.0))
+        granted, wait = store.take(buckets, 5)
+        self.assertEqual(granted, 0)
+        self.assertAlmostEqual(wait, 1.0)
+        self.clock.advance(0.5)
+        granted, wait = store.take(buckets, 5)
+        self.assertEqual(granted, 0)
+        self.assertAlmostEqual(wait, 0.5)
+        # Remplissage au débit, plafonné à la capacité
+        self.clock.advance(0.5)
+        self.assertEqual(store.take(buckets, 5), (1, 0.0))
+        self.clock.advance(60)
+        self.assertEqual(store.take(buckets, 5), (2, 0.0))
+
+    def test_local_store_refills_at_the_configured_rate(self):
+        self._check_refill(rate_limits.LocalBucketStore())
+
+    def test_database_store_refills_at_the_configured_rate(self):
+        self._check_refill(rate_limits.DatabaseBucketStore())
+
+    def test_concurrent_take_is_retried_without_double_spending(self):
+        store = rate_limits.DatabaseBucketStore()
+        buckets = rate_limits.bucket_limits('payeefsp', 'XOF', self.limits)
+        store.take(buckets, 1)
+        real_grant = rate_limits._grant
+
+        def concurrent_take(levels, buckets, wanted):
+            # Un autre worker prélève dans le seau du FSP entre la lecture et l'UPDATE
+            if concurrent_take.first:
+                concurrent_take.first = False
+                RateLimitBucket.objects.filter(key='fsp:payeefsp').update(
+                    tokens=F('tokens') - 1, version=F('version') + 1,
+                )
+            return real_grant(levels, buckets, wanted)
+        concurrent_take.first = True
+
+        with mock.patch.object(rate_limits, '_grant', side_effect=concurrent_take):
+            granted, wait = store.take(buckets, 1)
+
+        # Premier UPDATE annulé en entier (seau global compris), second calcul sur l'état relu
+        self.assertEqual(granted, 0)
+        self.assertAlmostEqual(wait, 1.0)
+        state = {row.key: (row.tokens, row.version) for row in RateLimitBucket.objects.all()}
+        self.assertEqual(state, {'global': (3.0, 1), 'fsp:payeefsp': (0.0, 2)})
+
+
+class ScheduleTests(SimpleTestCase):
+
+    @staticmethod
+    def _rows(*fsps):
+        return [(line_number, {'receiver_fsp_id': fsp, 'currency': 'XOF'}) for line_number, fsp in enumerate(fsps, start=1)]
+
+    @staticmethod
+    def _destination(line_number, params):
+        return params['receiver_fsp_id'], params['currency']
+
+    def test_destinations_are_served_in_turn(self):
+        rows = self._rows(*['a'] * 4, *['b'] * 4)
+        with mock.patch.object(rate_limits, 'GRANT_SIZE', 2):
+            served = list(rate_limits.schedule(rows, self._destination, limits={}, store=rate_limits.LocalBucketStore()))
+        self.assertEqual([params['receiver_fsp_id'] for _, params in served], ['a', 'a', 'b', 'b', 'a', 'a', 'b', 'b'])
+
+    def test_throttled_fsp_does_not_hold_back_the_others(self):
+        class Store:
+            def take(self, buckets, wanted):
+                # FSP « lent » à court de jetons
+                if any(key == 'fsp:lent' for key, limit in buckets):
+                    return 0, 0.5
+                return wanted, 0.0
+
+        rows = self._rows('lent', 'lent', 'rapide', 'rapide')
+        limits = {'fsp:*': rate_limits.Limit(rate=1.0, burst=1.0)}
+        with mock.patch.object(rate_limits.time, 'sleep'):
+            served = rate_limits.schedule(rows, self._destination, limits=limits, store=Store())
+            first = [next(served) for _ in range(3)]
+        # Lignes du FSP rapide envoyées avant celles du FSP lent, puis None : plus aucun jeton
+        self.assertEqual([row and row[0] for row in first], [3, 4, None])
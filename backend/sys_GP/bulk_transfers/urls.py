@@ -1,9 +1,15 @@
 from django.urls import path
-from .views import BulkTransferUploadAPIView, BulkTransferStatusAPIView, ExportBulkTransferCSV
+from .views import BulkProgressAPIView, BulkProgressStreamView, BulkRecipientsAPIView, BulkResumeAPIView, BulkTransferUploadAPIView, BulkTransferStatusAPIView, BulkValidationAPIView, ExportBulkTransferCSV, ExportBulkTransferXLSX
 
 urlpatterns = [
     path('bulk/upload/', BulkTransferUploadAPIView.as_view(), name='bulk-upload'),
     path('bulk/status/<int:job_id>/', BulkTransferStatusAPIView.as_view(), name='bulk-status'),
+    path('bulk/progress/<int:job_id>/', BulkProgressAPIView.as_view(), name='bulk-progress'),
+    path('bulk/progress/<int:job_id>/stream/', BulkProgressStreamView.as_view(), name='bulk-progress-stream'),
+    path('bulk/recipients/<int:job_id>/', BulkRecipientsAPIView.as_view(), name='bulk-recipients'),
+    path('bulk/validation/<int:job_id>/', BulkValidationAPIView.as_view(), name='bulk-validation'),
+    path('bulk/resume/<int:job_id>/', BulkResumeAPIView.as_view(), name='bulk-resume'),
 
     path('bulk/export/csv/<int:job_id>/', ExportBulkTransferCSV.as_view(), name='bulk-export-csv'),
+    path('bulk/export/xlsx/<int:job_id>/', ExportBulkTransferXLSX.as_view(), name='bulk-export-xlsx'),
 ]
\ No newline at end of file
@@ -0,0 +1,262 @@
+# bulk_transfers/validation.py
+"""
+Validation préalable (phase VALIDATING) des fichiers de transferts de masse.
+
+Exécutée par le worker avant tout mouvement de fonds :
+  1. contrôle du schéma, des types d'identifiant, des montants, des devises
+     et des lignes en double, sur tout le fichier, en un seul passage ;
+  2. résolution concurrente de chaque bénéficiaire distinct via /parties
+     (transfert.services.lookup_party, quel que soit MOJALOOP_PARTY_RESOLUTION) ;
+     le FSP trouvé est transmis au SDK à l'exécution (to.fspId), sans nouvelle résolution ;
+  3. enregistrement d'un verdict par ligne (BulkRowVerdict) ;
+  4. réservation, sur le compte du soumetteur, du total des lignes acceptées
+     (transfert.ledger) : un fichier que le solde ne couvre pas échoue ici, de
+     même qu'un fichier en plusieurs devises (ou dans une autre devise que
+     LEDGER_CURRENCY), que le grand livre mono-devise ne peut pas réserver.
+
+En mode strict (défaut), une seule ligne rejetée fait échouer le Job
+(VALIDATION_FAILED) : l'utilisateur corrige son fichier avant qu'aucun
+transfert ne parte. Sinon, les lignes rejetées sont simplement ignorées.
+"""
+import csv
+import decimal
+import hashlib
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from io import TextIOWrapper
+
+from django.db.models import Sum
+from django.utils import timezone
+
+from transfert.ledger import LEDGER_CURRENCY, LEDGER_ENABLED, InsufficientFunds, job_reference, reserve
+from transfert.models import Transfer
+from transfert.services import lookup_party
+from .csv_stream import REQUIRED_COLUMNS, parse_amount, row_errors
+from .models import BulkRowVerdict, BulkTransferJob
+
+# Un Job dont au moins une ligne est rejetée échoue en validation (false : lignes ignorées)
+VALIDATION_STRICT = os.environ.get("BULK_VALIDATION_STRICT", "true").lower() == "true"
+# Nombre de résolutions /parties simultanées pendant la validation
+VALIDATION_CONCURRENCY = int(os.environ.get("BULK_VALIDATION_CONCURRENCY", os.environ.get("BULK_MAX_IN_FLIGHT", "32")))
+# Devises acceptées, séparées par des virgules (vide : tout code ISO 4217 à 3 lettres)
+ALLOWED_CURRENCIES = {c.strip().upper() for c in os.environ.get("BULK_ALLOWED_CURRENCIES", "").split(',') if c.strip()}
+
+VERDICT_BATCH_SIZE = 1000
+
+# Types d'identifiant de partie Mojaloop (PartyIdType)
+PARTY_ID_TYPES = ('MSISDN', 'EMAIL', 'PERSONAL_ID', 'BUSINESS', 'DEVICE', 'ACCOUNT_ID', 'IBAN', 'ALIAS')
+
+CURRENCY_PATTERN = re.compile(r'^[A-Z]{3}$')
+# Transfer.amount : 12 chiffres dont 2 décimales
+MAX_AMOUNT = decimal.Decimal('9999999999.99')
+
+
+def validate_bulk_file(job_id):
+    """
+    Valide le fichier du Job et enregistre les verdicts par ligne.
+    Retourne True si le Job peut être exécuté, False s'il est passé en VALIDATION_FAILED.
+
+    Le fichier est lu en flux et les verdicts sont écrits par lots au fil de la
+    lecture. Restent en mémoire les totaux, l'index des bénéficiaires distincts et,
+    pour la détection des doublons, une empreinte de taille fixe par ligne valide
+    distincte (voir _row_key) : mémoire proportionnelle au nombre de lignes, mais
+    indépendante de la taille de leur contenu.
+    """
+    job = BulkTransferJob.objects.get(id=job_id)
+    if job.status != 'VALIDATING':
+        job.status = 'VALIDATING'
+        job.save(update_fields=['status'])
+    # Verdicts d'une validation précédente interrompue
+    BulkRowVerdict.objects.filter(job=job).delete()
+
+    with job.file.open('rb') as binary_file:
+        text = TextIOWrapper(binary_file, encoding='utf-8-sig', newline='')
+        try:
+            reader = csv.DictReader(text)
+            missing = [column for column in REQUIRED_COLUMNS if column not in (reader.fieldnames or [])]
+            if missing:
+                return _fail(job, f"Colonnes manquantes dans l'en-tête : {', '.join(missing)}.")
+            totals = _check_rows(job, enumerate(reader, start=1))
+        finally:
+            text.detach()
+
+    rejected = totals['rejected']
+    job.total_transfers = totals['rows']
+    job.invalid_rows = rejected
+    job.validated_at = timezone.now()
+    job.save(update_fields=['total_transfers', 'invalid_rows', 'validated_at'])
+
+    if rejected == totals['rows']:
+        return _fail(job, "Aucune ligne valide dans le fichier.")
+    if rejected and VALIDATION_STRICT:
+        return _fail(job, f"{rejected} ligne(s) rejetée(s) par la validation ; corrigez le fichier et soumettez-le à nouveau.")
+    error = _currency_error(totals['currencies'])
+    if error:
+        return _fail(job, error)
+    return _reserve_funds(job, totals['accepted_amount'])
+
+
+def _currency_error(currencies):
+    """
+    Le grand livre tient les soldes dans une seule devise, sans conversion : les
+    montants d'un Job ne sont additionnés pour la réservation que s'ils sont tous
+    dans la même devise (celle du grand livre si LEDGER_CURRENCY est renseignée).
+    """
+    if not LEDGER_ENABLED:
+        return None
+    if len(currencies) > 1:
+        return (f"Fichier en plusieurs devises ({', '.join(sorted(currencies))}) : "
+                "soumettez un fichier par devise.")
+    if LEDGER_CURRENCY and currencies and currencies != {LEDGER_CURRENCY}:
+        return f"Devise {next(iter(currencies))} différente de celle du compte ({LEDGER_CURRENCY})."
+    return None
+
+
+def _reserve_funds(job, accepted_amount):
+    """
+    Réserve en une fois le montant des lignes acceptées qui restent à envoyer
+    (un Job relancé ne réserve pas les lignes déjà réglées).
+    """
+    settled = Transfer.objects.filter(
+        bulk_job=job,
+        status__in=('MOJALOOP_COMPLETED', 'FAILED'),
+        bulk_line__in=BulkRowVerdict.objects.filter(job=job, verdict='ACCEPTED').values('line_number'),
+    ).aggregate(total=Sum('amount'))['total'] or decimal.Decimal(0)
+    needed = accepted_amount - settled
+    try:
+        reserve(job.submitter, needed, job_reference(job.id))
+    except InsufficientFunds:
+        return _fail(job, f"Solde insuffisant : le fichier requiert {needed}, supérieur au solde disponible du compte {job.submitter.msisdn}.")
+    return True
+
+
+def _row_key(payee, currency, amount):
+    """Empreinte (16 octets) d'une ligne pour la détection des doublons : bénéficiaire, devise, montant."""
+    fields = (*payee, currency, format(amount.normalize(), 'f'))
+    return hashlib.blake2b('\x1f'.join(fields).encode(), digest_size=16).digest()
+
+
+def _check_rows(job, rows):
+    """
+    Contrôles locaux ligne à ligne. Chaque nouveau bénéficiaire valide est soumis
+    à la résolution /parties dès sa première occurrence, pendant que la lecture continue.
+    Les lignes lues sont gardées jusqu'à ce qu'un lot complet les suive (résolutions
+    du lot en cours pendant la lecture du suivant), puis leurs verdicts sont écrits.
+    Retourne les totaux : lignes, lignes rejetées, montant et devises des lignes acceptées.
+    """
+    totals = {'rows': 0, 'rejected': 0, 'accepted_amount': decimal.Decimal(0), 'currencies': set()}
+    lookups = {}
+    seen = {}
+    pending = []
+
+    with ThreadPoolExecutor(max_workers=max(1, VALIDATION_CONCURRENCY), thread_name_prefix="bulk-validate") as executor:
+        for line_number, row in rows:
+            errors = row_checks(row)
+            payee = ((row.get('type_id') or '').strip(), (row.get('valeur_id') or '').strip())
+            currency = (row.get('devise') or '').strip()
+            amount = None
+
+            if not errors:
+                amount = parse_amount(row['montant'])
+                first_line = seen.setdefault(_row_key(payee, currency, amount), line_number)
+                if first_line != line_number:
+                    errors.append(f"Ligne en double (identique à la ligne {first_line})")
+
+            if not errors and payee not in lookups:
+                lookups[payee] = executor.submit(_resolve, *payee)
+            pending.append((line_number, payee, currency, amount, errors))
+            if len(pending) >= 2 * VERDICT_BATCH_SIZE:
+                _write_verdicts(job, pending[:VERDICT_BATCH_SIZE], lookups, totals)
+                del pending[:VERDICT_BATCH_SIZE]
+        _write_verdicts(job, pending, lookups, totals)
+    return totals
+
+
+def _write_verdicts(job, checked, lookups, totals):
+    """Verdicts d'un lot de lignes contrôlées (attend leurs résolutions), écrits en une fois."""
+    verdicts = []
+    for line_number, payee, currency, amount, errors in checked:
+        fsp_id = None
+        if not errors:
+            party = lookups[payee].result()
+            if isinstance(party, dict):
+                if party['found']:
+                    fsp_id = party['fsp_id']
+                else:
+                    errors = [f"Bénéficiaire inconnu : {party['error']}"]
+        if errors:
+            totals['rejected'] += 1
+        else:
+            totals['accepted_amount'] += amount
+            totals['currencies'].add(currency)
+        verdicts.append(BulkRowVerdict(
+            job=job,
+            line_number=line_number,
+            verdict='REJECTED' if errors else 'ACCEPTED',
+            errors=errors,
+            receiver_fsp_id=fsp_id,
+        ))
+    totals['rows'] += len(verdicts)
+    BulkRowVerdict.objects.bulk_create(verdicts)
+
+
+def _resolve(id_type, id_value):
+    try:
+        return lookup_party(id_type, id_value)
+    except Exception:
+        return None
+
+
+def row_checks(row):
+    """
+    Erreurs de contenu d'une ligne : celles de csv_stream.row_errors (colonnes
+    obligatoires, montant), plus le type d'identifiant, la précision et le plafond
+    du montant et la devise.
+    """
+    errors = row_errors(row)
+
+    id_type = (row.get('type_id') or '').strip()
+    if id_type and id_type not in PARTY_ID_TYPES:
+        errors.append(f"Type d'identifiant invalide : {id_type}")
+
+    amount = parse_amount(row.get('montant') or '')
+    if amount is not None:
+        raw_amount = row['montant'].strip()
+        if amount.normalize().as_tuple().exponent < -2:
+            errors.append(f"Montant avec plus de 2 décimales : {raw_amount}")
+        elif amount > MAX_AMOUNT:
+            errors.append(f"Montant trop élevé : {raw_amount}")
+
+    currency = (row.get('devise') or '').strip()
+    if currency and not CURRENCY_PATTERN.match(currency):
+        errors.append(f"Devise invalide : {currency}")
+    elif currency and ALLOWED_CURRENCIES and currency not in ALLOWED_CURRENCIES:
+        errors.append(f"Devise non acceptée : {currency}")
+
+    return errors
+
+
+def rejected_lines(job):
+    """Numéros des lignes rejetées par la validation du Job (ensemble vide si non validé)."""
+    return set(
+        BulkRowVerdict.objects.filter(job=job, verdict='REJECTED').values_list('line_number', flat=True)
+    )
+
+
+def resolved_fsps(job, first_line=None, last_line=None):
+    """{numéro_ligne: FSP du bénéficiaire} résolus par la validation, sur une plage de lignes."""
+    verdicts = BulkRowVerdict.objects.filter(job=job, verdict='ACCEPTED', receiver_fsp_id__isnull=False)
+    if first_line is not None:
+        verdicts = verdicts.filter(line_number__gte=first_line)
+    if last_line is not None:
+        verdicts = verdicts.filter(line_number__lte=last_line)
+    return dict(verdicts.values_list('line_number', 'receiver_fsp_id'))
+
+
+def _fail(job, message):
+    job.status = 'VALIDATION_FAILED'
+    job.error_message = message
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'error_message', 'finished_at'])
+    return False
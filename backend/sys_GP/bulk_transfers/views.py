@@ -1,64 +1,237 @@
+import hashlib
+
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from .models import BulkTransferJob
-from .process_utils import process_bulk_file 
+from .chunks import chunk_summary
+from .csv_stream import job_page, open_job_rows, recipient, summarize_rows
+from .exports import iter_csv, iter_csv_gzip, iter_xlsx
+from .models import BulkRowVerdict, BulkTransferJob
+from .progress import aprogress_events, job_progress, load_job, progress_events
 from .serializers import BulkTransferUploadSerializer, BulkTransferJobSerializer, TransferDetailSerializer
+from .worker import stale_jobs
+from transfert.idempotency import IDEMPOTENCY_HEADER, MAX_KEY_LENGTH, REPLAY_HEADERS, bulk_upload_key
 from transfert.models import Transfer 
-from django.db.models import Q # Pour filtrer les statuts
-from django.http import HttpResponse
-import csv
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Q # Pour filtrer les statuts
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.views import View
 
 class BulkTransferUploadAPIView(APIView):
     
     def post(self, request, *args, **kwargs):
         serializer = BulkTransferUploadSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        # Idempotence : un upload rejoué avec la même clé retrouve le Job déjà en file
+        idempotency_key, error = _upload_idempotency_key(request.headers, data['sender_msisdn'])
+        if error:
+            return Response(*error)
+        file_sha256 = _file_sha256(data['file'])
+        if idempotency_key:
+            existing = BulkTransferJob.objects.filter(idempotency_key=idempotency_key).first()
+            if existing is not None:
+                return _upload_replay(existing, file_sha256)
 
         # 1. Crée le Job et enregistre le fichier
-        job = serializer.save()
+        try:
+            with transaction.atomic():
+                job = serializer.save(idempotency_key=idempotency_key, file_sha256=file_sha256)
+        except IntegrityError:
+            # Même clé soumise au même instant par une autre requête
+            return _upload_replay(BulkTransferJob.objects.get(idempotency_key=idempotency_key), file_sha256)
         
-        # 2. Déclenche le traitement (simulation synchrone pour le moment)
+        # 2. Résumé du CSV en un seul passage, à mémoire constante.
+        # L'exécution elle-même est confiée aux workers (manage.py run_bulk_workers) :
+        # le Job reste en statut UPLOADED jusqu'à sa réservation par un worker.
+        # Les positions relevées au passage servent à paginer les bénéficiaires
+        row_index = []
+        with open_job_rows(job, index=row_index) as rows:
+            summary = summarize_rows(rows)
+
+        job.total_transfers = summary['total_rows']
+        job.total_amount = summary['total_amount']
+        job.invalid_rows = summary['invalid_rows']
+        job.row_index = row_index
+        job.upload_summary = _summary_fields(summary)
+        job.save(update_fields=['total_transfers', 'total_amount', 'invalid_rows', 'row_index', 'upload_summary'])
+
+        # 3. Réponse immédiate : le Job est en file. La liste des bénéficiaires
+        # est disponible, paginée, sur url_recipients.
+        return Response(_upload_body(job, job.upload_summary), status=status.HTTP_202_ACCEPTED)
+
+
+def _upload_idempotency_key(headers, sender_msisdn):
+    """Clé d'idempotence du Job dérivée de l'en-tête Idempotency-Key (None sans en-tête). Retourne (clé, erreur)."""
+    key = headers.get(IDEMPOTENCY_HEADER)
+    if key is None:
+        return None, None
+    key = key.strip()
+    if not key or len(key) > MAX_KEY_LENGTH:
+        return None, ({"error": f"{IDEMPOTENCY_HEADER} invalide (1 à {MAX_KEY_LENGTH} caractères)."}, status.HTTP_400_BAD_REQUEST)
+    return bulk_upload_key(sender_msisdn, key), None
+
+
+def _file_sha256(uploaded_file):
+    digest = hashlib.sha256()
+    for chunk in uploaded_file.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _upload_replay(job, file_sha256):
+    """Réponse à un upload rejoué : le Job existant, ou 422 si la clé a servi pour un autre fichier."""
+    if job.file_sha256 != file_sha256:
+        return Response(
+            {"error": f"{IDEMPOTENCY_HEADER} déjà utilisée pour un autre fichier.", "job_id": job.id},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    summary = job.upload_summary
+    if summary is None:
+        # Job antérieur au stockage du résumé, ou résumé pas encore écrit par l'upload concurrent
+        with open_job_rows(job) as rows:
+            summary = _summary_fields(summarize_rows(rows))
+    return Response(_upload_body(job, summary), status=status.HTTP_202_ACCEPTED, headers=REPLAY_HEADERS)
+
+
+def _summary_fields(summary):
+    """Champs de la réponse d'upload issus du résumé du fichier (stockés sur Job.upload_summary)."""
+    return {
+        "total_transfers": summary['total_rows'],
+        "valid_rows": summary['valid_rows'],
+        "invalid_rows": summary['invalid_rows'],
+        "total_amount": float(summary['total_amount']),
+        "amount_by_currency": {currency: float(amount) for currency, amount in summary['amount_by_currency'].items()},
+    }
+
+
+def _upload_body(job, summary_fields):
+    return {
+        "message": "Bulk transfer job queued.",
+        "job_id": job.id,
+        "status": job.status,
+        "priority": job.priority,
+        **summary_fields,
+        "url_status": reverse('bulk-status', kwargs={'job_id': job.id}),
+        "url_recipients": reverse('bulk-recipients', kwargs={'job_id': job.id}),
+        "url_validation": reverse('bulk-validation', kwargs={'job_id': job.id}),
+        "url_progress_stream": reverse('bulk-progress-stream', kwargs={'job_id': job.id}),
+    }
+
+
+class BulkRecipientsAPIView(APIView):
+    """
+    Liste paginée (offset/limit) des bénéficiaires du fichier d'un Job. Chaque page
+    est lue à partir de l'index des positions relevé à l'upload (csv_stream.job_page).
+    """
+
+    DEFAULT_LIMIT = 100
+    MAX_LIMIT = 1000
+
+    def get(self, request, job_id):
+        try:
+            job = BulkTransferJob.objects.get(id=job_id)
+        except BulkTransferJob.DoesNotExist:
+            return Response({"error": "Bulk job not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            offset = max(0, int(request.query_params.get('offset', 0)))
+            limit = min(self.MAX_LIMIT, max(1, int(request.query_params.get('limit', self.DEFAULT_LIMIT))))
+        except ValueError:
+            return Response({"error": "offset and limit must be integers."}, status=status.HTTP_400_BAD_REQUEST)
+
+        page_rows = job_page(job, offset, limit)
+
+        next_offset = offset + limit if offset + limit < job.total_transfers else None
+        return Response({
+            "job_id": job.id,
+            "count": job.total_transfers,
+            "offset": offset,
+            "limit": limit,
+            "next_offset": next_offset,
+            "recipients": [recipient(row) for _, row in page_rows],
+        }, status=status.HTTP_200_OK)
+
+
+class BulkValidationAPIView(APIView):
+    """
+    Résultat de la validation préalable d'un Job : verdict par ligne, paginé
+    (offset/limit), filtrable par verdict (`?verdict=REJECTED`).
+    """
+
+    DEFAULT_LIMIT = 100
+    MAX_LIMIT = 1000
+
+    def get(self, request, job_id):
+        try:
+            job = BulkTransferJob.objects.get(id=job_id)
+        except BulkTransferJob.DoesNotExist:
+            return Response({"error": "Bulk job not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            offset = max(0, int(request.query_params.get('offset', 0)))
+            limit = min(self.MAX_LIMIT, max(1, int(request.query_params.get('limit', self.DEFAULT_LIMIT))))
+        except ValueError:
+            return Response({"error": "offset and limit must be integers."}, status=status.HTTP_400_BAD_REQUEST)
+
+        verdicts = BulkRowVerdict.objects.filter(job=job).order_by('line_number')
+        verdict_filter = request.query_params.get('verdict')
+        if verdict_filter:
+            verdicts = verdicts.filter(verdict=verdict_filter)
+
+        rows = list(verdicts.values('line_number', 'verdict', 'errors', 'receiver_fsp_id')[offset:offset + limit + 1])
+        next_offset = offset + limit if len(rows) > limit else None
+
+        return Response({
+            "job_id": job.id,
+            "statut_job": job.status,
+            "validated_at": job.validated_at,
+            "total_rows": job.total_transfers,
+            "rejected_rows": job.invalid_rows if job.validated_at else None,
+            "message": job.error_message if job.status == 'VALIDATION_FAILED' else None,
+            "offset": offset,
+            "limit": limit,
+            "next_offset": next_offset,
+            "rows": rows[:limit],
+        }, status=status.HTTP_200_OK)
+
+
+class BulkResumeAPIView(APIView):
+    """
+    Remet en file un Job interrompu : Job FAILED, ou Job en cours dont le worker
+    ne donne plus signe de vie. Les lignes déjà enregistrées ne sont pas renvoyées.
+    """
+
+    def post(self, request, job_id):
         try:
-            # On lit le CSV AVANT traitement pour extraire la liste des bénéficiaires
-            file_obj = job.file.open('r')
-            import csv
-            reader = csv.DictReader(file_obj)
-            recipients = []
-            total_amount = 0
-            for row in reader:
-                try:
-                    recipients.append({
-                        'phoneNumber': row.get('valeur_id', ''),
-                        'fullName': row.get('nom_complet', ''),
-                        'amount': float(row.get('montant', 0)),
-                        'currency': row.get('devise', 'XOF'),
-                    })
-                    total_amount += float(row.get('montant', 0) or 0)
-                except Exception:
-                    pass
-            file_obj.close()
-
-            process_bulk_file(job.id)
-            job.refresh_from_db() # Recharge le statut après l'exécution
-        except Exception as e:
-            job.status = 'FAILED'
-            job.save()
+            job = BulkTransferJob.objects.get(id=job_id)
+        except BulkTransferJob.DoesNotExist:
+            return Response({"error": "Bulk job not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        resumable = BulkTransferJob.objects.filter(id=job.id, status='FAILED') | stale_jobs().filter(id=job.id)
+        requeued = resumable.update(
+            status='UPLOADED',
+            error_message='',
+            finished_at=None,
+            claimed_by=None,
+            heartbeat_at=None,
+        )
+        if not requeued:
             return Response({
-                "message": "Bulk transfer job failed during processing.",
-                "error": str(e),
-                "job_id": job.id,
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+                "error": f"Job non reprenable dans le statut {job.status}.",
+                "statut_job": job.status,
+            }, status=status.HTTP_409_CONFLICT)
 
-        # 3. Réponse enrichie
         return Response({
-            "message": "Bulk transfer job initiated and completed (synchronous mode).",
+            "message": "Bulk transfer job requeued.",
             "job_id": job.id,
-            "status": job.status,
-            "total_processed": job.total_transfers,
-            "total_amount": total_amount,
-            "recipients": recipients,
-            "url_status": f"/api/v1/bulk/status/{job.id}"
+            "status": 'UPLOADED',
+            "transfers_recorded": Transfer.objects.filter(bulk_job=job).count(),
+            "url_status": reverse('bulk-status', kwargs={'job_id': job.id}),
+            "url_progress_stream": reverse('bulk-progress-stream', kwargs={'job_id': job.id}),
         }, status=status.HTTP_202_ACCEPTED)
 
 
@@ -73,24 +246,20 @@ class BulkTransferStatusAPIView(APIView):
         # 1. Calcul des agrégations
         total_count = job.total_transfers
         
-        # Filtre basé sur les statuts réels dans la DB (MOJALOOP_COMPLETED, FAILED, PROCESSING)
-        successful_count = Transfer.objects.filter(
-            bulk_job=job, 
-            status='MOJALOOP_COMPLETED'
-        ).count()
-        
-        failed_count = Transfer.objects.filter(
-            bulk_job=job, 
-            status='FAILED'
-        ).count()
-        
-        pending_count = Transfer.objects.filter(
-            bulk_job=job,
-            status='PROCESSING' # ou tout statut 'en attente' défini
-        ).count()
+        # Une seule requête d'agrégation conditionnelle, servie par l'index (bulk_job, status)
+        # Statuts écrits par les workers : MOJALOOP_COMPLETED, FAILED, et INITIATED pour
+        # une ligne enregistrée dont le résultat n'est pas encore connu (voir process_utils)
+        counts = Transfer.objects.filter(bulk_job=job).aggregate(
+            successful=Count('id', filter=Q(status='MOJALOOP_COMPLETED')),
+            failed=Count('id', filter=Q(status='FAILED')),
+            pending=Count('id', filter=Q(status='INITIATED')),
+        )
+        successful_count = counts['successful']
+        failed_count = counts['failed']
+        pending_count = counts['pending']
 
         # 2. Récupération des 10 dernières transactions pour l'affichage du tableau
-        # Ordonner par date et prendre les 10 premières (ou les dernières)
+        # Ordonner par date et prendre les 10 premières (ou les dernières) — index (bulk_job, created_at)
         recent_transfers = Transfer.objects.filter(bulk_job=job).order_by('-created_at')[:10]
         details_data = TransferDetailSerializer(recent_transfers, many=True).data
         
@@ -98,52 +267,106 @@ class BulkTransferStatusAPIView(APIView):
         report_data = {
             "job_id": job.id,
             "statut_job": job.status,
-            "message_execution": f"Exécution terminée avec succès partiel : {successful_count} réussis, {failed_count} en échec.",
+            "priorite": job.priority,
+            "message_execution": _execution_message(job, successful_count, failed_count),
             "total_transfers": total_count,
             "reussi_count": successful_count,
             "echoue_count": failed_count,
             "en_attente_count": pending_count,
+            "progression": job_progress(job),
+            # Tranches d'un Job exécuté par plusieurs workers (vide sinon)
+            "tranches": chunk_summary(job),
             "tableau_details": details_data
         }
         
         return Response(report_data, status=status.HTTP_200_OK)
     
 
+class BulkProgressAPIView(APIView):
+    """Progression d'un Job (compteurs, débit, ETA), lue sur une seule ligne."""
+
+    def get(self, request, job_id):
+        try:
+            job = load_job(job_id)
+        except BulkTransferJob.DoesNotExist:
+            return Response({"error": "Bulk job not found."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(job_progress(job), status=status.HTTP_200_OK)
+
+
+class BulkProgressStreamView(View):
+    """
+    Flux Server-Sent Events de la progression d'un Job : le client reçoit
+    les changements au lieu d'interroger /bulk/status/ en boucle.
+    Vue Django simple : la négociation de contenu DRF refuserait text/event-stream.
+
+    Servi en ASGI (Procfile), le flux est un générateur asynchrone : une connexion
+    ouverte n'occupe aucun thread. En WSGI, il occupe un thread du serveur jusqu'à
+    BULK_PROGRESS_STREAM_TIMEOUT secondes (voir docs/backend/installation.md).
+    """
+
+    def get(self, request, job_id):
+        if not BulkTransferJob.objects.filter(id=job_id).exists():
+            return HttpResponse(status=status.HTTP_404_NOT_FOUND)
+        events = aprogress_events(job_id) if isinstance(request, ASGIRequest) else progress_events(job_id)
+        response = StreamingHttpResponse(events, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # Désactive la mise en tampon des proxies (nginx)
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
+def _execution_message(job, successful_count, failed_count):
+    """Message lisible correspondant à l'état réel du Job."""
+    if job.status == 'UPLOADED':
+        return "Job en file d'attente, en attente d'un worker."
+    if job.status == 'VALIDATING':
+        return "Validation du fichier et résolution des bénéficiaires en cours."
+    if job.status == 'VALIDATION_FAILED':
+        return f"Fichier rejeté par la validation : {job.error_message}"
+    if job.status == 'PROCESSING':
+        return f"Exécution en cours : {successful_count} réussis, {failed_count} en échec."
+    if job.status == 'FAILED':
+        return f"Exécution interrompue : {job.error_message or 'erreur inconnue'}."
+    return f"Exécution terminée : {successful_count} réussis, {failed_count} en échec."
+
+
 class ExportBulkTransferCSV(APIView):
-    
+    """
+    Rapport CSV d'un Job, envoyé en flux (mémoire constante quelle que soit la taille du Job).
+    `?compression=gzip` : rapport compressé à la volée (.csv.gz).
+    """
+
     def get(self, request, job_id):
         try:
             job = BulkTransferJob.objects.get(id=job_id)
         except BulkTransferJob.DoesNotExist:
             return Response({"error": "Bulk job not found."}, status=status.HTTP_404_NOT_FOUND)
 
-        # 1. Définition de la réponse HTTP
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = f'attachment; filename="Transfert_{job_id}_report.csv"'
+        compression = request.query_params.get('compression')
+        if compression not in (None, '', 'gzip'):
+            return Response({"error": "Compression non supportée (valeur acceptée : gzip)."}, status=status.HTTP_400_BAD_REQUEST)
 
-        # 2. Récupération de toutes les transactions du Job
-        transfers = Transfer.objects.filter(bulk_job=job).order_by('created_at')
+        if compression == 'gzip':
+            response = StreamingHttpResponse(iter_csv_gzip(job), content_type='application/gzip')
+            response['Content-Disposition'] = f'attachment; filename="Transfert_{job_id}_report.csv.gz"'
+        else:
+            response = StreamingHttpResponse(iter_csv(job), content_type='text/csv')
+            response['Content-Disposition'] = f'attachment; filename="Transfert_{job_id}_report.csv"'
+        return response
 
-        # 3. Création du writer CSV
-        writer = csv.writer(response)
-        
-        # En-têtes (Assurez-vous qu'elles correspondent aux noms du CSV du rapport)
-        writer.writerow(['Bénéficiaire', 'Montant', 'Devise', 'Référence', 'Statut', 'Message erreur', 'Horodatage', 'ID transaction'])
-        
-        # 4. Écriture des données
-        for transfer in transfers:
-            # Note: Vous devriez passer par le sérialiseur pour formater les champs
-            # Pour l'exemple, nous utilisons les champs bruts du modèle
-            row = [
-                transfer.receiver_msisdn,
-                str(transfer.amount),
-                transfer.currency,
-                transfer.note or 'N/A', # Utiliser note comme référence temporaire
-                transfer.status,
-                transfer.sdk_response_data.get('error', '') if transfer.sdk_response_data else '',
-                transfer.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-                transfer.home_transaction_id,
-            ]
-            writer.writerow(row)
-
-        return response
\ No newline at end of file
+
+class ExportBulkTransferXLSX(APIView):
+    """Rapport XLSX d'un Job, envoyé en flux (mémoire constante, sans fichier temporaire)."""
+
+    def get(self, request, job_id):
+        try:
+            job = BulkTransferJob.objects.get(id=job_id)
+        except BulkTransferJob.DoesNotExist:
+            return Response({"error": "Bulk job not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        response = StreamingHttpResponse(
+            iter_xlsx(job),
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        )
+        response['Content-Disposition'] = f'attachment; filename="Transfert_{job_id}_report.xlsx"'
+        return response
@@ -0,0 +1,326 @@
+# bulk_transfers/worker.py
+"""
+File d'attente des Jobs de masse, adossée à la base de données.
+
+Un Job en statut UPLOADED est "en file". Chaque worker réserve le plus ancien
+Job disponible par un UPDATE conditionnel sur le statut, le valide
+(validate_bulk_file, phase VALIDATING) puis l'exécute via process_bulk_file. Plusieurs processus workers peuvent tourner en parallèle :
+un Job n'est jamais réservé deux fois.
+
+Un Job volumineux est découpé en tranches après validation (voir chunks.py) :
+quand aucun Job n'attend, les workers réservent les tranches en attente de la
+même façon, ce qui répartit un seul Job sur plusieurs processus ou machines.
+
+Ordonnancement : les Jobs en file sont pris par priorité (HIGH, NORMAL, LOW)
+puis par ancienneté. Les tranches sont partagées entre expéditeurs (Account) en
+round-robin pondéré : un worker libre sert l'expéditeur qui occupe le moins de
+workers rapporté au poids de sa priorité. Les tranches de Jobs concurrents sont
+ainsi entrelacées, et un petit Job urgent n'attend que la fin d'une tranche.
+
+Pendant l'exécution, le worker met à jour heartbeat_at. Un Job (ou une tranche)
+VALIDATING ou PROCESSING dont le battement est plus ancien que BULK_STALE_AFTER
+(worker mort, redéploiement) est de nouveau réservable : il reprend là où il
+s'était arrêté. Si l'ancien worker n'était que suspendu, son prochain battement
+constate que la réservation lui a échappé : il cesse d'envoyer des lignes
+(ClaimLost) sans toucher au statut du Job, désormais aux mains du repreneur.
+"""
+import logging
+import os
+import socket
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.db import close_old_connections, connection
+from django.db.models import Case, Count, IntegerField, Min, Value, When
+from django.utils import timezone
+
+from transfert.ledger import job_reference, release
+from .chunks import fail_chunk, partition_job, partitioned_jobs, process_chunk
+from .models import BulkTransferChunk, BulkTransferJob
+from .process_utils import ClaimLost, process_bulk_file
+from .validation import validate_bulk_file
+
+logger = logging.getLogger(__name__)
+
+# Intervalle (secondes) entre deux interrogations de la file lorsqu'elle est vide
+POLL_INTERVAL = float(os.environ.get("BULK_WORKER_POLL_INTERVAL", "2"))
+
+# Nombre de candidats examinés à chaque tentative de réservation
+CLAIM_BATCH = 10
+
+# Intervalle (secondes) entre deux battements de cœur d'un Job en cours
+HEARTBEAT_INTERVAL = float(os.environ.get("BULK_HEARTBEAT_INTERVAL", "10"))
+# Délai (secondes) sans battement au-delà duquel un Job en cours est considéré abandonné
+STALE_AFTER = float(os.environ.get("BULK_STALE_AFTER", "120"))
+
+
+def _priority_weights(spec):
+    """'HIGH=10,NORMAL=3,LOW=1' -> {'HIGH': 10, 'NORMAL': 3, 'LOW': 1}"""
+    weights = {}
+    for item in spec.split(','):
+        priority, _, weight = item.partition('=')
+        if priority.strip():
+            weights[priority.strip().upper()] = max(1, int(weight))
+    return weights
+
+
+# Poids de chaque classe de priorité dans le partage des workers entre expéditeurs
+PRIORITY_WEIGHTS = _priority_weights(os.environ.get("BULK_PRIORITY_WEIGHTS", "HIGH=10,NORMAL=3,LOW=1"))
+
+
+def _weight(priority):
+    return PRIORITY_WEIGHTS.get(priority, 1)
+
+
+def _priority_rank(field='priority'):
+    """Expression d'ordre : les priorités les plus lourdes d'abord."""
+    return Case(
+        *[When(**{field: priority}, then=Value(-weight)) for priority, weight in PRIORITY_WEIGHTS.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def claim_next_job(worker_id):
+    """
+    Réserve le Job UPLOADED le plus prioritaire (puis le plus ancien) pour
+    `worker_id` et retourne son id (ou None si la file est vide).
+
+    Le passage UPLOADED -> VALIDATING est un UPDATE filtré sur le statut :
+    si deux workers visent le même Job, un seul obtient une ligne modifiée.
+    Cela fonctionne sous SQLite comme sous PostgreSQL, sans verrou long.
+    """
+    candidates = list(
+        BulkTransferJob.objects.filter(status='UPLOADED')
+        .order_by(_priority_rank(), 'created_at', 'id')
+        .values_list('id', flat=True)[:CLAIM_BATCH]
+    )
+    for job_id in candidates:
+        now = timezone.now()
+        claimed = BulkTransferJob.objects.filter(id=job_id, status='UPLOADED').update(
+            status='VALIDATING',
+            claimed_by=worker_id,
+            started_at=now,
+            heartbeat_at=now,
+        )
+        if claimed:
+            return job_id
+    return reclaim_stale_job(worker_id)
+
+
+def stale_jobs():
+    """
+    Jobs en cours dont le worker ne donne plus signe de vie. Un Job découpé en
+    tranches n'a plus de worker attitré : ce sont ses tranches qui sont reprises.
+    """
+    cutoff = timezone.now() - timedelta(seconds=STALE_AFTER)
+    return BulkTransferJob.objects.filter(
+        ~partitioned_jobs(), status__in=('VALIDATING', 'PROCESSING'), heartbeat_at__lt=cutoff,
+    )
+
+
+def reclaim_stale_job(worker_id):
+    """
+    Reprend le plus ancien Job abandonné. L'UPDATE est filtré sur le battement lu :
+    si deux workers tentent la reprise, un seul l'obtient.
+    """
+    candidates = list(stale_jobs().order_by('heartbeat_at', 'id').values_list('id', 'heartbeat_at', 'claimed_by')[:CLAIM_BATCH])
+    for job_id, heartbeat_at, previous_worker in candidates:
+        claimed = BulkTransferJob.objects.filter(id=job_id, heartbeat_at=heartbeat_at).update(
+            claimed_by=worker_id,
+            heartbeat_at=timezone.now(),
+        )
+        if claimed:
+            logger.warning("Job %s abandonné par %s, repris par %s", job_id, previous_worker, worker_id)
+            return job_id
+    return None
+
+
+def claim_next_chunk(worker_id):
+    """
+    Réserve la prochaine tranche d'un Job en cours et retourne son id (ou None).
+    Même UPDATE conditionnel que pour les Jobs : PENDING -> PROCESSING.
+
+    Partage équitable pondéré : les Jobs ayant des tranches en attente sont classés
+    par (tranches en cours de leur expéditeur / poids de leur priorité), puis par
+    priorité et ancienneté. Un expéditeur sans tranche en cours passe donc avant
+    celui qui occupe déjà des workers, quelle que soit la taille de son Job.
+    """
+    jobs = list(
+        BulkTransferChunk.objects.filter(status='PENDING', job__status='PROCESSING')
+        .values('job_id', 'job__submitter_id', 'job__priority')
+        .annotate(next_sequence=Min('sequence'))
+    )
+    running = Counter(dict(
+        BulkTransferChunk.objects.filter(status='PROCESSING', job__status='PROCESSING')
+        .values('job__submitter_id')
+        .annotate(chunks=Count('id'))
+        .values_list('job__submitter_id', 'chunks')
+    ))
+    jobs.sort(key=lambda job: (
+        running[job['job__submitter_id']] / _weight(job['job__priority']),
+        -_weight(job['job__priority']),
+        job['job_id'],
+    ))
+
+    for job in jobs[:CLAIM_BATCH]:
+        chunk_id = (
+            BulkTransferChunk.objects.filter(job_id=job['job_id'], status='PENDING')
+            .order_by('sequence').values_list('id', flat=True).first()
+        )
+        if chunk_id is None:
+            continue
+        now = timezone.now()
+        claimed = BulkTransferChunk.objects.filter(id=chunk_id, status='PENDING').update(
+            status='PROCESSING',
+            claimed_by=worker_id,
+            started_at=now,
+            heartbeat_at=now,
+        )
+        if claimed:
+            return chunk_id
+    return reclaim_stale_chunk(worker_id)
+
+
+def reclaim_stale_chunk(worker_id):
+    """Reprend la plus ancienne tranche abandonnée (voir reclaim_stale_job)."""
+    cutoff = timezone.now() - timedelta(seconds=STALE_AFTER)
+    candidates = list(
+        BulkTransferChunk.objects.filter(status='PROCESSING', heartbeat_at__lt=cutoff)
+        .order_by('heartbeat_at', 'id')
+        .values_list('id', 'heartbeat_at', 'claimed_by')[:CLAIM_BATCH]
+    )
+    for chunk_id, heartbeat_at, previous_worker in candidates:
+        claimed = BulkTransferChunk.objects.filter(id=chunk_id, heartbeat_at=heartbeat_at).update(
+            claimed_by=worker_id,
+            heartbeat_at=timezone.now(),
+        )
+        if claimed:
+            logger.warning("Tranche %s abandonnée par %s, reprise par %s", chunk_id, previous_worker, worker_id)
+            return chunk_id
+    return None
+
+
+class Heartbeat:
+    """
+    Thread qui signale, tant que le Job (ou la tranche) s'exécute, que son worker est vivant.
+    `lost` est posé dès qu'un battement ne trouve plus la réservation du worker
+    (Job repris par un autre) : l'exécution en cours doit alors s'arrêter.
+    """
+
+    def __init__(self, object_id, worker_id, model=BulkTransferJob, interval=HEARTBEAT_INTERVAL):
+        self.object_id = object_id
+        self.worker_id = worker_id
+        self.model = model
+        self.interval = interval
+        self.lost = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"bulk-heartbeat-{object_id}", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def beat(self):
+        """Un battement ; retourne False (et pose `lost`) si la réservation a été reprise."""
+        # Filtré sur claimed_by : un worker dont le Job a été repris cesse de battre
+        beaten = self.model.objects.filter(id=self.object_id, claimed_by=self.worker_id).update(
+            heartbeat_at=timezone.now()
+        )
+        if not beaten:
+            logger.warning("%s %s : réservation de %s reprise par un autre worker, arrêt de l'envoi",
+                           self.model.__name__, self.object_id, self.worker_id)
+            self.lost.set()
+        return bool(beaten)
+
+    def _run(self):
+        try:
+            while not self._stop.wait(self.interval):
+                if not self.beat():
+                    return
+        finally:
+            connection.close()
+
+
+def run_job(job_id, claim_lost=None):
+    """
+    Valide puis exécute un Job réservé ; un Job rejeté par la validation s'arrête
+    en VALIDATION_FAILED. Un Job repris en PROCESSING (déjà validé) continue
+    directement son exécution. Un Job volumineux est seulement découpé en
+    tranches, exécutées ensuite par run_chunk. Toute exception non gérée le passe
+    en FAILED, sauf ClaimLost : le Job appartient alors à un autre worker.
+    """
+    try:
+        job_status = BulkTransferJob.objects.filter(id=job_id).values_list('status', flat=True).first()
+        if job_status == 'PROCESSING' or validate_bulk_file(job_id):
+            if not partition_job(job_id):
+                process_bulk_file(job_id, claim_lost=claim_lost)
+    except ClaimLost:
+        logger.warning("Job %s : exécution abandonnée au worker qui l'a repris", job_id)
+    except Exception as e:
+        logger.exception("Job %s en échec", job_id)
+        BulkTransferJob.objects.filter(id=job_id).update(
+            status='FAILED',
+            error_message=str(e),
+            finished_at=timezone.now(),
+        )
+        # Fonds rendus au compte ; une relance repasse par la validation et réserve à nouveau
+        release(job_reference(job_id))
+
+
+def run_chunk(chunk_id, claim_lost=None):
+    """Exécute une tranche réservée ; une exception (hors ClaimLost) la passe en FAILED."""
+    try:
+        process_chunk(chunk_id, claim_lost=claim_lost)
+    except ClaimLost:
+        logger.warning("Tranche %s : exécution abandonnée au worker qui l'a reprise", chunk_id)
+    except Exception as e:
+        logger.exception("Tranche %s en échec", chunk_id)
+        fail_chunk(chunk_id, str(e))
+
+
+def run_worker(worker_id=None, poll_interval=POLL_INTERVAL, once=False, should_stop=None):
+    """
+    Boucle principale d'un worker : réserve et exécute les Jobs un par un,
+    puis, quand aucun Job n'attend, les tranches des Jobs découpés. Les Jobs
+    passent d'abord : un petit Job n'attend pas la fin d'un fichier de 500 000 lignes.
+
+    `once=True` vide la file puis rend la main (utile en cron ou en test).
+    `should_stop` est un callable optionnel consulté entre deux Jobs pour un
+    arrêt propre (SIGTERM).
+    """
+    worker_id = worker_id or default_worker_id()
+    logger.info("Worker %s démarré", worker_id)
+
+    while not (should_stop and should_stop()):
+        # Évite de réutiliser une connexion DB expirée entre deux Jobs
+        close_old_connections()
+        job_id = claim_next_job(worker_id)
+        if job_id is not None:
+            logger.info("Worker %s : exécution du Job %s", worker_id, job_id)
+            with Heartbeat(job_id, worker_id) as heartbeat:
+                run_job(job_id, claim_lost=heartbeat.lost)
+            continue
+
+        chunk_id = claim_next_chunk(worker_id)
+        if chunk_id is not None:
+            logger.info("Worker %s : exécution de la tranche %s", worker_id, chunk_id)
+            with Heartbeat(chunk_id, worker_id, model=BulkTransferChunk) as heartbeat:
+                run_chunk(chunk_id, claim_lost=heartbeat.lost)
+            continue
+
+        if once:
+            break
+        time.sleep(poll_interval)
+
+    logger.info("Worker %s arrêté", worker_id)
@@ -1,5 +1,10 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class TransfertConfig(AppConfig):
     name = 'transfert'
+
+    def ready(self):
+        from .db import configure_sqlite
+        connection_created.connect(configure_sqlite, dispatch_uid='transfert.configure_sqlite')
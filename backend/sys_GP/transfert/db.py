@@ -0,0 +1,24 @@
+# transfert/db.py
+"""
+Réglages des connexions SQLite (développement).
+
+SQLite en mode rollback bloque toute lecture pendant une écriture : les vues de
+statut et de liste attendent la fin de chaque lot d'écriture des workers de
+masse. En mode WAL, les lecteurs voient le dernier état validé sans attendre ;
+seules les écritures restent sérialisées. synchronous=NORMAL est sûr en WAL
+(pas de corruption, au pire perte des dernières transactions sur coupure).
+"""
+import os
+
+# false : journal SQLite par défaut (rollback)
+SQLITE_WAL = os.environ.get("SQLITE_WAL", "true").lower() == "true"
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    """Récepteur de connection_created : active WAL sur chaque nouvelle connexion SQLite."""
+    if connection.vendor != 'sqlite' or not SQLITE_WAL:
+        return
+    with connection.cursor() as cursor:
+        # Sans effet sur une base en mémoire (tests), qui reste en journal 'memory'
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
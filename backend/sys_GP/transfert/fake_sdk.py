@@ -0,0 +1,251 @@
+# transfert/fake_sdk.py
+"""
+Substitut local du SDK Scheme Adapter : banc d'essai hors ligne (commande
+benchmark) et mode simulation (transfert/simulation.py).
+
+Un serveur HTTP dans le processus (thread) répond aux appels utilisés par
+transfert/services.py : GET /parties/{type}/{id}, POST /transfers,
+POST /bulkQuotes, POST /bulkTransfers et GET /transfers/{id}. Les réponses
+ont la forme de celles du SDK.
+
+Le comportement (latence, échecs, timeouts, 429) est délégué à un objet
+interchangeable qui fournit :
+  - decide(method, endpoint, fsp_id) -> (délai en secondes, issue), l'issue
+    étant 'ok', 'error', 'timeout' ou 'rate_limited' ;
+  - item_fails(fsp_id) -> bool, pour chaque transfert d'un lot ;
+  - party_fsp(id_type, id_value) -> FSP du bénéficiaire, ou None s'il est inconnu ;
+  - timeout_hold : durée pendant laquelle une requête en timeout reste sans réponse.
+
+Les appels passent par le vrai client (pool de connexions, relances,
+disjoncteur) : seul le hub est simulé.
+"""
+import json
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+
+# Transferts dont le hub garde la trace pour GET /transfers/{id} : les plus anciens
+# sont oubliés au-delà, le substitut pouvant tourner aussi longtemps que le processus
+TRANSFER_HISTORY = 100_000
+
+
+class FakeSdkBehaviour:
+    """
+    Comportement simple du substitut : chaque appel attend `latency` ± `jitter`
+    secondes (tirage uniforme), et une part `error_rate` des transferts échoue
+    (500 sur /transfers, erreur individuelle dans un lot).
+    """
+
+    timeout_hold = 0.0
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def delay(self):
+        with self._lock:
+            jitter = self._random.uniform(-self.jitter, self.jitter) if self.jitter else 0.0
+        return max(0.0, self.latency + jitter)
+
+    def fails(self):
+        if not self.error_rate:
+            return False
+        with self._lock:
+            return self._random.random() < self.error_rate
+
+    def decide(self, method, endpoint, fsp_id):
+        return self.delay(), 'error' if method == 'POST' and endpoint == '/transfers' and self.fails() else 'ok'
+
+    def item_fails(self, fsp_id):
+        return self.fails()
+
+    def party_fsp(self, id_type, id_value):
+        return 'payeefsp'
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive : le pool du client est réellement utilisé
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        parts = [unquote(part) for part in self.path.split('?', 1)[0].strip('/').split('/')]
+        endpoint = f"/{parts[0]}"
+        self.server.count(f"GET {endpoint}")
+        behaviour = self.server.behaviour
+
+        fsp_id = behaviour.party_fsp(parts[1], parts[2]) if parts[0] == 'parties' and len(parts) == 3 else None
+        if not self._settle('GET', endpoint, fsp_id):
+            return
+
+        if parts[0] == 'parties' and len(parts) == 3:
+            if fsp_id is None:
+                return self._send(404, {"errorInformation": {"errorCode": "3204", "errorDescription": "Party not found"}})
+            return self._send(200, {
+                "party": {"partyIdInfo": {"partyIdType": parts[1], "partyIdentifier": parts[2], "fspId": fsp_id},
+                          "name": "Bénéficiaire"},
+                "currentState": "COMPLETED",
+            })
+        if parts[0] == 'transfers' and len(parts) == 2:
+            if self.server.knows(parts[1]):
+                return self._send(200, {"transferId": parts[1], "currentState": "COMPLETED"})
+            return self._send(404, {"errorInformation": {"errorCode": "3208", "errorDescription": "Transfer not found"}})
+        self._send(404, {})
+
+    def do_POST(self):
+        self.server.count(f"POST {self.path}")
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+        behaviour = self.server.behaviour
+        if not self._settle('POST', self.path, self._payee_fsp(body)):
+            return
+
+        if self.path == '/transfers':
+            transfer_id = body.get('transferId') or str(uuid.uuid4())
+            self.server.remember(transfer_id)
+            return self._send(200, {"transferId": transfer_id, "homeTransactionId": body.get('homeTransactionId'),
+                                    "currentState": "COMPLETED"})
+
+        if self.path == '/bulkQuotes':
+            return self._send(200, {
+                "bulkQuoteId": body.get('bulkQuoteId'),
+                "currentState": "COMPLETED",
+                "individualQuoteResults": [
+                    {"quoteId": quote['quoteId'], "ilpPacket": "ilp-packet", "condition": "condition"}
+                    for quote in body.get('individualQuotes', [])
+                ],
+            })
+
+        if self.path == '/bulkTransfers':
+            results = []
+            for transfer in body.get('individualTransfers', []):
+                if behaviour.item_fails(self._payee_fsp(transfer)):
+                    results.append({"transferId": transfer['transferId'], "lastError": {"mojaloopError": {
+                        "errorInformation": {"errorCode": "5000", "errorDescription": "Simulated payee error"}}}})
+                    continue
+                self.server.remember(transfer['transferId'])
+                results.append({"transferId": transfer['transferId'], "fulfilment": "fulfilment"})
+            return self._send(200, {"bulkTransferId": body.get('bulkTransferId'), "currentState": "COMPLETED",
+                                    "individualTransferResults": results})
+
+        self._send(404, {})
+
+    def _settle(self, method, endpoint, fsp_id):
+        """Applique délai et issue de la requête ; retourne False si une réponse d'erreur a été envoyée."""
+        behaviour = self.server.behaviour
+        delay, outcome = behaviour.decide(method, endpoint, fsp_id)
+        if outcome == 'rate_limited':
+            # Refus immédiat, comme un hub qui protège sa capacité (2003 : service indisponible)
+            self._send(429, {"errorInformation": {"errorCode": "2003", "errorDescription": "Too many requests"}},
+                       headers={'Retry-After': '1'})
+            return False
+        if outcome == 'timeout':
+            # Aucune réponse avant le timeout de lecture du client
+            time.sleep(behaviour.timeout_hold)
+            self._send(504, {"errorInformation": {"errorCode": "2004", "errorDescription": "Server timed out"}})
+            return False
+        time.sleep(delay)
+        if outcome == 'error':
+            self._send(500, {"errorInformation": {"errorCode": "2001", "errorDescription": "Simulated hub error"}})
+            return False
+        return True
+
+    def _payee_fsp(self, item):
+        """FSP du bénéficiaire d'un transfert : to.fspId s'il est fourni, sinon celui de sa partie."""
+        payee = item.get('to') or (item.get('individualQuotes') or item.get('individualTransfers') or [{}])[0].get('to') or {}
+        if payee.get('fspId'):
+            return payee['fspId']
+        if payee.get('idValue'):
+            return self.server.behaviour.party_fsp(payee.get('idType'), payee['idValue'])
+        return None
+
+    def _send(self, status_code, payload, headers=None):
+        content = json.dumps(payload).encode()
+        try:
+            self.send_response(status_code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(content)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(content)
+        except (BrokenPipeError, ConnectionResetError):
+            # Client parti (timeout de lecture) : la réponse n'a plus de destinataire
+            self.close_connection = True
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # File d'attente de connexions assez longue pour des centaines de clients simultanés
+    request_queue_size = 1024
+
+    def count(self, point):
+        with self.lock:
+            self.calls[point] += 1
+
+    def remember(self, transfer_id):
+        with self.lock:
+            self.transfers[transfer_id] = None
+            self.transfers.move_to_end(transfer_id)
+            while len(self.transfers) > self.transfer_history:
+                self.transfers.popitem(last=False)
+
+    def knows(self, transfer_id):
+        with self.lock:
+            return transfer_id in self.transfers
+
+    def handle_error(self, request, client_address):
+        # Client parti pendant un timeout simulé : cas attendu, pas une erreur du substitut
+        if not isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            super().handle_error(request, client_address)
+
+
+class FakeSdkServer:
+    """
+    Serveur substitut du SDK, démarré sur un port libre de 127.0.0.1 :
+
+        with FakeSdkServer(FakeSdkBehaviour(latency=0.05)) as server:
+            configure_sdk(server.url)
+    """
+
+    def __init__(self, behaviour=None, host='127.0.0.1', port=0, transfer_history=TRANSFER_HISTORY):
+        self._server = _Server((host, port), _Handler)
+        self._server.behaviour = behaviour or FakeSdkBehaviour()
+        self._server.calls = Counter()
+        self._server.lock = threading.Lock()
+        self._server.transfers = OrderedDict()
+        self._server.transfer_history = transfer_history
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def calls(self):
+        """Nombre d'appels reçus par point d'appel ('POST /transfers', 'GET /parties', ...)."""
+        return self._server.calls
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-sdk", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
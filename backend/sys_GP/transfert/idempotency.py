@@ -0,0 +1,99 @@
+# transfert/idempotency.py
+"""
+Idempotence des soumissions de transferts.
+
+Chaque transfert est identifié par son home_transaction_id, unique en base
+(index unique sur Transfer.home_transaction_id). Lorsqu'il est dérivé de façon
+déterministe d'une clé d'idempotence (P2P) ou de la position d'une ligne dans
+un Job (bulk), une nouvelle soumission retrouve le transfert déjà enregistré
+au lieu d'en créer un second : le SDK n'est pas rappelé.
+
+L'upload d'un fichier de masse suit le même principe : la clé d'idempotence
+fournie donne BulkTransferJob.idempotency_key (unique), et un second upload
+avec la même clé retrouve le Job existant au lieu d'en mettre un autre en file.
+"""
+import decimal
+import os
+import threading
+import uuid
+from collections import OrderedDict
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+# En-tête signalant une réponse rejouée depuis un transfert (ou un Job) déjà enregistré
+REPLAY_HEADERS = {'Idempotent-Replayed': 'true'}
+
+# Espace de noms des identifiants dérivés (uuid5) ; ne jamais le modifier en production
+NAMESPACE = uuid.UUID(os.environ.get("TRANSFER_IDEMPOTENCY_NAMESPACE", "7f1c2e0a-5b7d-4d0e-9a51-3c2f8e6b9d14"))
+
+# Réponses P2P déjà rendues, gardées en mémoire pour servir les rejeux sans requête DB
+REPLAY_CACHE_SIZE = int(os.environ.get("TRANSFER_IDEMPOTENCY_CACHE_SIZE", "10000"))
+
+
+def p2p_home_transaction_id(sender_msisdn, idempotency_key):
+    """home_transaction_id d'un transfert P2P soumis avec une clé d'idempotence."""
+    return str(uuid.uuid5(NAMESPACE, f"p2p:{sender_msisdn}:{idempotency_key}"))
+
+
+def p2p_transfer_id(home_transaction_id):
+    """
+    transferId fixé par avance pour un transfert P2P : un renvoi (429 du hub, rejeu)
+    réutilise le même identifiant et ne peut pas créer un second transfert.
+    """
+    return str(uuid.uuid5(NAMESPACE, f"p2p-transfer:{home_transaction_id}"))
+
+
+def bulk_upload_key(sender_msisdn, idempotency_key):
+    """Identifiant du Job créé par un upload de fichier soumis avec une clé d'idempotence."""
+    return str(uuid.uuid5(NAMESPACE, f"bulk-upload:{sender_msisdn}:{idempotency_key}"))
+
+
+def bulk_home_transaction_id(job_id, line_number):
+    """home_transaction_id de la ligne `line_number` du fichier d'un Job."""
+    return str(uuid.uuid5(NAMESPACE, f"bulk:{job_id}:{line_number}"))
+
+
+def bulk_transfer_id(home_transaction_id):
+    """transferId fixé par avance pour une ligne envoyée dans un lot /bulkTransfers."""
+    return str(uuid.uuid5(NAMESPACE, f"transfer:{home_transaction_id}"))
+
+
+class ReplayCache:
+    """
+    Cache LRU home_transaction_id -> (empreinte, corps, statut HTTP) des réponses
+    définitives ; l'empreinte permet de détecter une clé réutilisée pour un autre transfert.
+    """
+
+    def __init__(self, maxsize=REPLAY_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, home_transaction_id):
+        with self._lock:
+            entry = self._entries.get(home_transaction_id)
+            if entry is not None:
+                self._entries.move_to_end(home_transaction_id)
+            return entry
+
+    def set(self, home_transaction_id, fingerprint, body, http_status):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[home_transaction_id] = (fingerprint, body, http_status)
+            self._entries.move_to_end(home_transaction_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def fingerprint(receiver_msisdn, amount, currency):
+    """Empreinte des champs qui doivent être identiques d'une soumission à l'autre."""
+    return (str(receiver_msisdn), format(decimal.Decimal(str(amount)).normalize(), 'f'), str(currency))
+
+
+replay_cache = ReplayCache()
@@ -0,0 +1,212 @@
+# transfert/ledger.py
+"""
+Grand livre des comptes expéditeurs.
+
+Chaque transfert passe par trois temps :
+  1. reserve : avant l'appel SDK, le montant est réservé (Account.reserved) si le
+     solde disponible (balance - reserved) le permet ;
+  2. settle : une fois le résultat connu, le montant d'un transfert réussi est
+     débité (balance et reserved diminuent), celui d'un échec est libéré ;
+  3. release : à la clôture, le reliquat d'une réservation est libéré.
+Chaque mouvement ajoute des écritures (LedgerEntry) au journal, jamais modifiées.
+
+Concurrence : le solde n'est jamais lu puis réécrit. Chaque mouvement est un
+UPDATE unique en expressions F(), conditionné au solde disponible pour une
+réservation : aucune mise à jour n'est perdue, quel que soit le nombre de
+requêtes P2P et de workers qui débitent le même compte. L'UPDATE du compte est
+la dernière instruction de sa transaction, pour que le verrou de ligne du compte
+(compte de paie très sollicité) ne soit tenu que jusqu'au COMMIT qui suit.
+Un Job de masse réserve son total en une fois puis règle ses transferts par lot
+d'écriture (bulk_transfers/process_utils.TransferBuffer) : un UPDATE du compte
+par lot, jamais par ligne.
+
+Comme Account.balance, le grand livre est tenu dans une seule devise : les
+montants sont additionnés tels quels, sans conversion. Un Job de masse n'est
+donc réservé que si toutes ses lignes sont dans la même devise, celle du grand
+livre si LEDGER_CURRENCY est renseignée (bulk_transfers/validation.py).
+"""
+import decimal
+import os
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Account, LedgerEntry, Reservation
+
+# false : ni contrôle ni mouvement de solde (démonstration avec des comptes fictifs)
+LEDGER_ENABLED = os.environ.get("LEDGER_ENABLED", "true").lower() == "true"
+# Devise des soldes des comptes (vide : non contrôlée, seule l'unicité de devise d'un Job l'est)
+LEDGER_CURRENCY = os.environ.get("LEDGER_CURRENCY", "").strip().upper()
+
+CENT = decimal.Decimal('0.01')
+ZERO = decimal.Decimal('0.00')
+
+# Tentatives d'ajustement d'une réservation modifiée en parallèle
+ADJUST_ATTEMPTS = 3
+
+
+class InsufficientFunds(Exception):
+    """Le solde disponible du compte ne couvre pas la réservation demandée."""
+
+    code = 'INSUFFICIENT_FUNDS'
+
+    def __init__(self, account, amount):
+        self.account = account
+        self.amount = amount
+        super().__init__(f"Solde insuffisant : {amount} requis sur le compte {account.msisdn}.")
+
+
+def job_reference(job_id):
+    """Référence de la réservation d'un Job de masse."""
+    return f"bulk:{job_id}"
+
+
+def reserve(account, amount, reference):
+    """
+    Réserve `amount` sur le compte pour `reference`.
+
+    Une réservation existante est ajustée pour que son encours (montant ni débité
+    ni libéré) soit égal à `amount` : un Job repris ne réserve que ce qui lui reste
+    à envoyer. Lève InsufficientFunds si le solde disponible ne suffit pas.
+    """
+    if not LEDGER_ENABLED:
+        return None
+    amount = _amount(amount)
+
+    reservation = Reservation.objects.filter(reference=reference).first()
+    if reservation is None:
+        try:
+            with transaction.atomic():
+                reservation = Reservation.objects.create(account=account, reference=reference, amount=amount)
+                _reserve_on_account(account, reference, amount)
+            return reservation
+        except IntegrityError:
+            # Même référence réservée au même instant par un autre processus
+            reservation = Reservation.objects.get(reference=reference)
+    return _adjust(reservation, amount)
+
+
+def settle(reference, transfers):
+    """
+    Impute des transferts terminés sur leur réservation : les réussis sont débités,
+    les échoués libérés. La réservation est close quand plus rien n'est en cours.
+    Sans réservation (transfert antérieur au grand livre), rien n'est fait.
+    """
+    if not LEDGER_ENABLED or not transfers:
+        return
+    reservation = Reservation.objects.filter(reference=reference).values('id', 'account_id').first()
+    if reservation is None:
+        return
+
+    entries = []
+    debit = freed = ZERO
+    for transfer in transfers:
+        amount = _amount(transfer.amount)
+        if transfer.status == 'MOJALOOP_COMPLETED':
+            debit += amount
+            entries.append(LedgerEntry(account_id=reservation['account_id'], kind='COMMIT', amount=amount, reference=reference, transfer_id=transfer.pk))
+        elif transfer.status == 'FAILED':
+            freed += amount
+            entries.append(LedgerEntry(account_id=reservation['account_id'], kind='RELEASE', amount=amount, reference=reference, transfer_id=transfer.pk))
+    if not entries:
+        return
+
+    with transaction.atomic():
+        LedgerEntry.objects.bulk_create(entries)
+        Reservation.objects.filter(id=reservation['id']).update(
+            committed=F('committed') + debit,
+            released=F('released') + freed,
+        )
+        Reservation.objects.filter(
+            id=reservation['id'], status='OPEN', amount__lte=F('committed') + F('released'),
+        ).update(status='CLOSED', closed_at=timezone.now())
+        # En dernier : le verrou du compte n'est tenu que jusqu'au COMMIT
+        Account.objects.filter(id=reservation['account_id']).update(
+            balance=F('balance') - debit,
+            reserved=F('reserved') - debit - freed,
+        )
+
+
+def release(reference):
+    """Clôt la réservation `reference` en libérant son reliquat."""
+    if not LEDGER_ENABLED:
+        return
+    for _ in range(ADJUST_ATTEMPTS):
+        reservation = Reservation.objects.filter(reference=reference, status='OPEN').first()
+        if reservation is None:
+            return
+        remaining = max(ZERO, reservation.amount - reservation.committed - reservation.released)
+        with transaction.atomic():
+            closed = _versioned(reservation).update(
+                released=F('released') + remaining,
+                status='CLOSED',
+                closed_at=timezone.now(),
+            )
+            if closed and remaining:
+                LedgerEntry.objects.create(account_id=reservation.account_id, kind='RELEASE', amount=remaining, reference=reference)
+                Account.objects.filter(id=reservation.account_id).update(reserved=F('reserved') - remaining)
+        if closed:
+            return
+
+
+def available_balance(account):
+    """Solde disponible : solde moins les réservations en cours."""
+    return account.balance - account.reserved
+
+
+def _adjust(reservation, amount):
+    """Amène l'encours d'une réservation (éventuellement close) à `amount`."""
+    for _ in range(ADJUST_ATTEMPTS):
+        outstanding = reservation.amount - reservation.committed - reservation.released
+        if reservation.status == 'CLOSED':
+            outstanding = ZERO
+        delta = amount - outstanding
+        if not delta and (reservation.status == 'OPEN' or not amount):
+            return reservation
+
+        with transaction.atomic():
+            fields = {'status': 'OPEN', 'closed_at': None}
+            if reservation.status == 'CLOSED':
+                # Réouverture : l'ancien reliquat a déjà été libéré à la clôture
+                fields['amount'] = F('committed') + F('released') + amount
+            elif delta > 0:
+                fields['amount'] = F('amount') + delta
+            else:
+                fields['released'] = F('released') - delta
+            updated = _versioned(reservation).update(**fields)
+            if updated:
+                if delta > 0:
+                    _reserve_on_account(reservation.account, reservation.reference, delta)
+                elif delta < 0:
+                    LedgerEntry.objects.create(account_id=reservation.account_id, kind='RELEASE', amount=-delta, reference=reservation.reference)
+                    Account.objects.filter(id=reservation.account_id).update(reserved=F('reserved') + delta)
+        reservation.refresh_from_db()
+        if updated:
+            return reservation
+    raise RuntimeError(f"Réservation {reservation.reference} modifiée en parallèle, ajustement abandonné.")
+
+
+def _reserve_on_account(account, reference, amount):
+    """Écriture RESERVE puis UPDATE conditionnel du compte ; à appeler dans une transaction."""
+    LedgerEntry.objects.create(account_id=account.id, kind='RESERVE', amount=amount, reference=reference)
+    reserved = Account.objects.filter(id=account.id, balance__gte=F('reserved') + amount).update(
+        reserved=F('reserved') + amount,
+    )
+    if not reserved:
+        raise InsufficientFunds(account, amount)
+
+
+def _versioned(reservation):
+    """Réservation dans l'état lu : un UPDATE filtré ainsi échoue si elle a changé entre-temps."""
+    return Reservation.objects.filter(
+        id=reservation.id,
+        status=reservation.status,
+        amount=reservation.amount,
+        committed=reservation.committed,
+        released=reservation.released,
+    )
+
+
+def _amount(value):
+    return decimal.Decimal(str(value)).quantize(CENT)
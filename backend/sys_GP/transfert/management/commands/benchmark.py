@@ -0,0 +1,256 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from decimal import Decimal
+
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import override_settings, setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+
+from bulk_transfers.models import BulkTransferJob
+from bulk_transfers.process_utils import process_bulk_file
+from bulk_transfers.validation import validate_bulk_file
+from transfert.fake_sdk import FakeSdkBehaviour, FakeSdkServer
+from transfert.models import Account
+from transfert.services import configure_sdk
+
+SCENARIOS = ('p2p', 'bulk', 'status', 'export', 'list')
+
+SENDER_MSISDN = '22990000001'
+# Solde maximal de Account.balance : le grand livre ne refuse aucun transfert du banc
+SENDER_BALANCE = Decimal('9999999999.99')
+
+
+class Command(BaseCommand):
+    help = (
+        "Banc d'essai hors ligne : P2P, exécution d'un Job de masse, statut, export et liste des "
+        "transferts, contre un substitut local du SDK. Affiche débit, p50 et p99 par scénario."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scenarios', default=','.join(SCENARIOS),
+            help=f"Scénarios à exécuter, séparés par des virgules ({', '.join(SCENARIOS)}).",
+        )
+        parser.add_argument('--rows', type=int, default=1000, help="Lignes du fichier de masse (1000, 100000, 1000000...).")
+        parser.add_argument('--requests', type=int, default=1000, help="Requêtes HTTP par scénario P2P, statut et liste.")
+        parser.add_argument('--export-requests', type=int, default=5, help="Exports CSV du Job de masse.")
+        parser.add_argument('--clients', type=int, default=8, help="Clients HTTP simultanés.")
+        parser.add_argument('--execution-mode', choices=('INDIVIDUAL', 'BULK'), default='INDIVIDUAL',
+                            help="Mode d'exécution du Job de masse.")
+        parser.add_argument('--max-in-flight', type=int, default=None, help="Fenêtre d'envoi du Job (défaut: BULK_MAX_IN_FLIGHT).")
+        parser.add_argument('--latency', type=float, default=0.02, help="Latence du SDK simulé (secondes).")
+        parser.add_argument('--jitter', type=float, default=0.01, help="Gigue uniforme autour de la latence (secondes).")
+        parser.add_argument('--error-rate', type=float, default=0.0, help="Part des transferts en échec (0 à 1).")
+        parser.add_argument('--seed', type=int, default=1, help="Graine des tirages (latence, erreurs).")
+        parser.add_argument('--current-database', action='store_true',
+                            help="Utilise la base courante au lieu d'une base dédiée (tests automatisés).")
+        parser.add_argument('--output', help="Fichier JSON où enregistrer les résultats.")
+        parser.add_argument('--baseline', help="Résultats JSON de référence : échec en cas de régression.")
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help="Régression tolérée face à la référence (0.2 : débit -20 %%, p99 +20 %%).")
+
+    def handle(self, *args, **options):
+        scenarios = [name.strip() for name in options['scenarios'].split(',') if name.strip()]
+        unknown = [name for name in scenarios if name not in SCENARIOS]
+        if unknown:
+            raise CommandError(f"Scénario(s) inconnu(s) : {', '.join(unknown)}")
+
+        behaviour = FakeSdkBehaviour(options['latency'], options['jitter'], options['error_rate'], seed=options['seed'])
+        results = {}
+
+        with tempfile.TemporaryDirectory(prefix="sgp-benchmark-") as workdir, \
+                override_settings(MEDIA_ROOT=workdir), FakeSdkServer(behaviour) as sdk:
+            configure_sdk(sdk.url)
+            old_databases = None if options['current_database'] else _setup_benchmark_databases(workdir)
+            try:
+                bench = Bench(options)
+                for name in SCENARIOS:
+                    if name in scenarios:
+                        results[name] = getattr(bench, name)()
+                        self.stdout.write(_format(name, results[name]))
+            finally:
+                if old_databases is not None:
+                    teardown_databases(old_databases, verbosity=0)
+                    teardown_test_environment()
+
+        report = {
+            "parameters": {key: options[key] for key in (
+                'rows', 'requests', 'clients', 'execution_mode', 'latency', 'jitter', 'error_rate')},
+            "results": results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2)
+            self.stdout.write(f"Résultats enregistrés dans {options['output']}")
+        if options['baseline']:
+            self._compare(results, options['baseline'], options['tolerance'])
+
+    def _compare(self, results, baseline_path, tolerance):
+        with open(baseline_path) as baseline_file:
+            baseline = json.load(baseline_file).get('results', {})
+        regressions = []
+        for name, result in results.items():
+            reference = baseline.get(name)
+            if not reference:
+                continue
+            if result['throughput'] < reference['throughput'] * (1 - tolerance):
+                regressions.append(f"{name} : débit {result['throughput']}/s, référence {reference['throughput']}/s")
+            if reference.get('p99') and result.get('p99') and result['p99'] > reference['p99'] * (1 + tolerance):
+                regressions.append(f"{name} : p99 {result['p99']}s, référence {reference['p99']}s")
+        if regressions:
+            raise CommandError("Régression de performance :\n  " + "\n  ".join(regressions))
+        self.stdout.write(self.style.SUCCESS(f"Aucune régression face à {baseline_path}"))
+
+
+class Bench:
+    """Scénarios du banc ; les scénarios statut et export réutilisent le Job du scénario bulk."""
+
+    def __init__(self, options):
+        self.options = options
+        self.clients = max(1, options['clients'])
+        self.sender, _ = Account.objects.update_or_create(
+            msisdn=SENDER_MSISDN, defaults={'name': 'Banc d\'essai', 'balance': SENDER_BALANCE, 'reserved': 0},
+        )
+        self.job = None
+
+    def p2p(self):
+        def request(client, index):
+            return client.post('/api/v1/transfers/p2p/', {
+                'sender_msisdn': SENDER_MSISDN,
+                'receiver_msisdn': f"2299{index:07d}",
+                'amount': '100.00',
+                'currency': 'XOF',
+            }, content_type='application/json')
+        return _run_clients(request, self.options['requests'], self.clients, ok_statuses=(201,))
+
+    def bulk(self):
+        job = self._bulk_job()
+        started = time.monotonic()
+        if not validate_bulk_file(job.id):
+            job.refresh_from_db()
+            raise CommandError(f"Validation du Job de banc en échec : {job.error_message}")
+        validated = time.monotonic()
+        process_bulk_file(job.id, max_in_flight=self.options['max_in_flight'])
+        finished = time.monotonic()
+
+        job.refresh_from_db()
+        rows = job.total_transfers
+        return {
+            "rows": rows,
+            "succeeded": job.transfers_completed,
+            "failed": job.transfers_failed,
+            "validation_seconds": round(validated - started, 3),
+            "execution_seconds": round(finished - validated, 3),
+            "throughput": round(rows / max(finished - validated, 1e-9), 1),
+        }
+
+    def status(self):
+        job = self._bulk_job()
+        return _run_clients(lambda client, index: client.get(f'/api/v1/bulk/status/{job.id}/'),
+                            self.options['requests'], self.clients)
+
+    def export(self):
+        job = self._bulk_job()
+
+        def request(client, index):
+            response = client.get(f'/api/v1/bulk/export/csv/{job.id}/')
+            if response.streaming:
+                # Consommation complète du flux : le coût de l'export est dans l'itération
+                for _ in response.streaming_content:
+                    pass
+            return response
+        return _run_clients(request, self.options['export_requests'], min(self.clients, self.options['export_requests']))
+
+    def list(self):
+        return _run_clients(
+            lambda client, index: client.get('/api/v1/transfers/', {'sender_msisdn': SENDER_MSISDN, 'limit': 50}),
+            self.options['requests'], self.clients,
+        )
+
+    def _bulk_job(self):
+        """Job de masse du banc, créé au premier besoin (fichier de --rows lignes)."""
+        if self.job is None:
+            lines = ["type_id,valeur_id,devise,montant,nom_complet\n"]
+            lines.extend(f"MSISDN,2298{line:07d},XOF,{100 + line % 900}.00,Bénéficiaire {line}\n"
+                         for line in range(1, self.options['rows'] + 1))
+            self.job = BulkTransferJob(submitter=self.sender, execution_mode=self.options['execution_mode'])
+            self.job.file.save('benchmark.csv', ContentFile(''.join(lines).encode()), save=False)
+            self.job.save()
+        return self.job
+
+
+def _run_clients(request, total, clients, ok_statuses=(200,)):
+    """
+    Envoie `total` requêtes réparties sur `clients` threads (un Client Django
+    chacun, middlewares et vues DRF compris) ; retourne débit et percentiles.
+    """
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    counter = iter(range(total))
+
+    def client_loop():
+        client = Client()
+        local = []
+        try:
+            while True:
+                with lock:
+                    index = next(counter, None)
+                if index is None:
+                    break
+                started = time.monotonic()
+                response = request(client, index)
+                local.append(time.monotonic() - started)
+                if response.status_code not in ok_statuses:
+                    with lock:
+                        errors.append(response.status_code)
+        finally:
+            connections.close_all()
+            with lock:
+                latencies.extend(local)
+
+    threads = [threading.Thread(target=client_loop) for _ in range(max(1, clients))]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "seconds": round(elapsed, 3),
+        "throughput": round(len(latencies) / max(elapsed, 1e-9), 1),
+        "p50": _percentile(latencies, 0.50),
+        "p99": _percentile(latencies, 0.99),
+    }
+
+
+def _percentile(ordered, fraction):
+    if not ordered:
+        return None
+    return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))], 4)
+
+
+def _setup_benchmark_databases(workdir):
+    """
+    Base dédiée au banc, détruite à la fin. En SQLite, une base fichier plutôt
+    qu'en mémoire : les clients simultanés ont chacun leur connexion.
+    """
+    setup_test_environment()
+    if connection.vendor == 'sqlite':
+        for alias in connections:
+            connections[alias].settings_dict['TEST']['NAME'] = os.path.join(workdir, f"{alias}.sqlite3")
+    return setup_databases(verbosity=0, interactive=False)
+
+
+def _format(name, result):
+    details = ", ".join(f"{key}={value}" for key, value in result.items())
+    return f"[{name}] {details}"
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from transfert.payloads import SDK_PAYLOAD_RETENTION_DAYS, purge_expired
+
+
+class Command(BaseCommand):
+    help = "Supprime les réponses brutes du SDK archivées (TransferPayload) au-delà de la durée de conservation."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=SDK_PAYLOAD_RETENTION_DAYS,
+            help="Durée de conservation en jours (défaut: SDK_PAYLOAD_RETENTION_DAYS ; 0 : aucune suppression).",
+        )
+
+    def handle(self, *args, **options):
+        deleted = purge_expired(options['days'])
+        self.stdout.write(f"{deleted} réponse(s) SDK supprimée(s).")
@@ -0,0 +1,256 @@
+# transfert/metrics.py
+"""
+Métriques Prometheus de l'application, exposées sur /metrics.
+
+Instrumentation des chemins chauds :
+  - appels SDK (SdkClient, AsyncSdkClient) : latence par point d'appel, issue
+    et statut HTTP, nombre de relances ;
+  - transferts P2P (execute_p2p_transfer_via_sdk) : durée de bout en bout par issue ;
+  - exécution des Jobs de masse (bulk_transfers/process_utils.py) : lignes
+    traitées (débit en lignes/s via rate()), temps passé par étape
+    (lecture du CSV, appels SDK, écritures en base) ;
+  - vues HTTP (MetricsMiddleware) : latence par vue, méthode et statut.
+
+Coût : une observation est un incrément sous verrou, sans E/S ; les étapes des
+Jobs de masse sont cumulées localement puis publiées par lot d'écriture.
+Les libellés ne portent jamais d'identifiant (MSISDN, Job, transfert) : le
+nombre de séries reste fixe.
+
+Plusieurs processus (gunicorn, BULK_WORKER_PROCESSES) : avec
+PROMETHEUS_MULTIPROC_DIR (répertoire partagé, vidé au démarrage), /metrics
+agrège les valeurs de tous les processus de la machine, workers de masse compris.
+
+Accès : /metrics ne répond qu'aux adresses de METRICS_ALLOWED_IPS (boucle locale
+par défaut) ; les autres reçoivent 403.
+"""
+import functools
+import ipaddress
+import os
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.http import HttpResponse
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess,
+)
+
+# false : aucune mesure n'est enregistrée et /metrics répond 404
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "true").lower() == "true"
+
+
+def _allowed_networks(spec):
+    """'127.0.0.1,10.0.0.0/8' -> réseaux autorisés ; '*' -> None (toute adresse)."""
+    if spec.strip() == '*':
+        return None
+    return [ipaddress.ip_network(item.strip(), strict=False) for item in spec.split(',') if item.strip()]
+
+
+# Clients autorisés à lire /metrics : IP ou réseaux CIDR séparés par des virgules, '*' pour tous.
+# Comparé à REMOTE_ADDR : derrière un proxy, c'est l'adresse du proxy.
+METRICS_ALLOWED_NETWORKS = _allowed_networks(os.environ.get("METRICS_ALLOWED_IPS", "127.0.0.1,::1"))
+
+# Bornes des histogrammes de latence (secondes), du cache local au timeout SDK
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+SDK_REQUEST_SECONDS = Histogram(
+    'sgp_sdk_request_seconds', "Latence des appels au SDK Mojaloop.",
+    ['method', 'endpoint', 'outcome', 'status'], buckets=LATENCY_BUCKETS,
+)
+SDK_RETRIES = Counter(
+    'sgp_sdk_retries_total', "Relances d'appels au SDK (erreur réseau ou statut 5xx).",
+    ['method', 'endpoint'],
+)
+P2P_TRANSFER_SECONDS = Histogram(
+    'sgp_p2p_transfer_seconds', "Durée d'un transfert individuel (résolution du bénéficiaire et /transfers).",
+    ['outcome'], buckets=LATENCY_BUCKETS,
+)
+BULK_ROWS = Counter(
+    'sgp_bulk_rows_total', "Lignes de Jobs de masse traitées.",
+    ['execution_mode', 'outcome'],
+)
+BULK_STAGE_SECONDS = Counter(
+    'sgp_bulk_stage_seconds_total', "Temps cumulé des Jobs de masse par étape (parse, sdk, db_write) ; sdk somme les appels parallèles.",
+    ['stage'],
+)
+BULK_EXECUTION_SECONDS = Histogram(
+    'sgp_bulk_execution_seconds', "Durée d'exécution d'un Job de masse ou d'une tranche.",
+    ['execution_mode'], buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600, 7200),
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    'sgp_http_request_seconds', "Latence des requêtes HTTP par vue.",
+    ['view', 'method', 'status'], buckets=LATENCY_BUCKETS,
+)
+
+
+def endpoint(path):
+    """Point d'appel SDK sans identifiant : '/parties/MSISDN/229...' -> '/parties'."""
+    return '/' + path.lstrip('/').split('/', 1)[0].split('?', 1)[0]
+
+
+def observe_sdk_request(method, path, started, status=None, retries=0):
+    """Enregistre un appel SDK ; `status` None signifie qu'aucune réponse n'a été reçue."""
+    if not METRICS_ENABLED:
+        return
+    point = endpoint(path)
+    if status is None:
+        outcome, status = 'error', 'none'
+    else:
+        outcome = 'success' if status < 400 else 'client_error' if status < 500 else 'server_error'
+    SDK_REQUEST_SECONDS.labels(method, point, outcome, str(status)).observe(time.monotonic() - started)
+    if retries:
+        SDK_RETRIES.labels(method, point).inc(retries)
+
+
+def _observe_transfer(started, result):
+    if METRICS_ENABLED:
+        P2P_TRANSFER_SECONDS.labels('success' if result.get('success') else 'failure').observe(time.monotonic() - started)
+
+
+def timed_transfer(fn):
+    """Décorateur : durée et issue d'une fonction de transfert (synchrone ou coroutine)."""
+    if iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def async_wrapper(*args, **kwargs):
+            started = time.monotonic()
+            result = await fn(*args, **kwargs)
+            _observe_transfer(started, result)
+            return result
+        return async_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        started = time.monotonic()
+        result = fn(*args, **kwargs)
+        _observe_transfer(started, result)
+        return result
+    return wrapper
+
+
+class StageTimer:
+    """
+    Temps par étape d'un Job de masse, cumulé en mémoire et publié par publish()
+    (à chaque lot d'écriture) : un seul incrément de compteur par étape et par lot.
+    Partagé par les threads d'envoi du Job.
+    """
+
+    STAGES = ('parse', 'sdk', 'db_write')
+
+    def __init__(self):
+        self.elapsed = dict.fromkeys(self.STAGES, 0.0)
+        self._lock = threading.Lock()
+
+    def add(self, stage, seconds):
+        with self._lock:
+            self.elapsed[stage] += seconds
+
+    def timed_rows(self, rows):
+        """Itère sur `rows` en comptant le temps de lecture comme étape parse."""
+        rows = iter(rows)
+        while True:
+            started = time.monotonic()
+            row = next(rows, _END)
+            self.add('parse', time.monotonic() - started)
+            if row is _END:
+                return
+            yield row
+
+    def timed_call(self, fn):
+        """Enveloppe un appel SDK pour en compter la durée comme étape sdk."""
+        def call(*args, **kwargs):
+            started = time.monotonic()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.add('sdk', time.monotonic() - started)
+        return call
+
+    def publish(self):
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            elapsed, self.elapsed = self.elapsed, dict.fromkeys(self.STAGES, 0.0)
+        for stage, seconds in elapsed.items():
+            if seconds:
+                BULK_STAGE_SECONDS.labels(stage).inc(seconds)
+
+
+_END = object()
+
+
+def observe_bulk_rows(execution_mode, succeeded, failed):
+    if METRICS_ENABLED:
+        if succeeded:
+            BULK_ROWS.labels(execution_mode, 'success').inc(succeeded)
+        if failed:
+            BULK_ROWS.labels(execution_mode, 'failure').inc(failed)
+
+
+def registry():
+    """Registre à exposer : agrégat multi-processus si PROMETHEUS_MULTIPROC_DIR est défini."""
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        collector_registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(collector_registry)
+        return collector_registry
+    return REGISTRY
+
+
+def metrics_allowed(remote_addr):
+    """Le client `remote_addr` peut-il lire /metrics ?"""
+    if METRICS_ALLOWED_NETWORKS is None:
+        return True
+    try:
+        address = ipaddress.ip_address(remote_addr or '')
+    except ValueError:
+        return False
+    return any(address in network for network in METRICS_ALLOWED_NETWORKS)
+
+
+def metrics_view(request):
+    """GET /metrics : format texte Prometheus, réservé aux adresses de METRICS_ALLOWED_IPS."""
+    if not METRICS_ENABLED:
+        return HttpResponse(status=404)
+    if not metrics_allowed(request.META.get('REMOTE_ADDR')):
+        return HttpResponse(status=403)
+    return HttpResponse(generate_latest(registry()), content_type=CONTENT_TYPE_LATEST)
+
+
+class MetricsMiddleware:
+    """
+    Mesure la latence de chaque requête, étiquetée par nom de route (jamais par
+    URL brute). Compatible WSGI et ASGI : les vues asynchrones ne repassent pas
+    par un thread pour la mesure.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        started = time.monotonic()
+        response = self.get_response(request)
+        self._observe(request, response, started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.monotonic()
+        response = await self.get_response(request)
+        self._observe(request, response, started)
+        return response
+
+    def _observe(self, request, response, started):
+        if not METRICS_ENABLED:
+            return
+        match = getattr(request, 'resolver_match', None)
+        view = (match.url_name or match.view_name) if match else 'unmatched'
+        if view == 'metrics':
+            return
+        HTTP_REQUEST_SECONDS.labels(view, request.method, str(response.status_code)).observe(time.monotonic() - started)
+
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-18 08:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transfert', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transfer',
+            index=models.Index(fields=['bulk_job', 'status'], name='transfer_job_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transfer',
+            index=models.Index(fields=['bulk_job', 'created_at'], name='transfer_job_created_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-18 08:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transfert', '0002_transfer_job_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transfer',
+            index=models.Index(fields=['-created_at', '-id'], name='transfer_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transfer',
+            index=models.Index(fields=['sender', '-created_at', '-id'], name='transfer_sender_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transfer',
+            index=models.Index(fields=['status', '-created_at', '-id'], name='transfer_status_created_idx'),
+        ),
+    ]
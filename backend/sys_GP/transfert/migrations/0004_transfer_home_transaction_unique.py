@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 08:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transfert', '0003_transfer_list_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='transfer',
+            name='home_transaction_id',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+    ]
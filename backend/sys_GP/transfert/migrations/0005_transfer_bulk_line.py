@@ -0,0 +1,22 @@
+# Generated by Django 4.2.7 on 2026-10-18 08:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transfert', '0004_transfer_home_transaction_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transfer',
+            name='bulk_line',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='transfer',
+            constraint=models.UniqueConstraint(fields=('bulk_job', 'bulk_line'), name='transfer_job_line_uniq'),
+        ),
+    ]
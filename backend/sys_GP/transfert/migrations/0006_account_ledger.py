@@ -0,0 +1,48 @@
+# Generated by Django 4.2.7 on 2026-10-18 08:48
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transfert', '0005_transfer_bulk_line'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='account',
+            name='reserved',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.CreateModel(
+            name='Reservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reference', models.CharField(max_length=100, unique=True)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('committed', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('released', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('status', models.CharField(choices=[('OPEN', 'Open'), ('CLOSED', 'Closed')], default='OPEN', max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('closed_at', models.DateTimeField(blank=True, null=True)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='transfert.account')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('RESERVE', 'Funds reserved'), ('COMMIT', 'Reserved funds debited'), ('RELEASE', 'Reserved funds released')], max_length=10)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('reference', models.CharField(max_length=100)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='ledger_entries', to='transfert.account')),
+                ('transfer', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ledger_entries', to='transfert.transfer')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['account', 'created_at'], name='ledger_account_created_idx'), models.Index(fields=['reference'], name='ledger_reference_idx')],
+            },
+        ),
+    ]
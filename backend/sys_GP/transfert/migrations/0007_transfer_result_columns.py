@@ -0,0 +1,106 @@
+# Generated by Django 4.2.7 on 2026-10-18 09:05
+
+import json
+import zlib
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+BATCH_SIZE = 2000
+
+
+def _is_hub_response(data):
+    # Les résultats locaux (échec SDK, erreur interne) portent 'success' ou 'error'
+    return 'success' not in data and 'error' not in data
+
+
+def split_sdk_response_data(apps, schema_editor):
+    """sdk_response_data -> colonnes typées + réponse brute compressée dans TransferPayload."""
+    Transfer = apps.get_model('transfert', 'Transfer')
+    TransferPayload = apps.get_model('transfert', 'TransferPayload')
+    transfers = Transfer.objects.filter(sdk_response_data__isnull=False).only(
+        'id', 'status', 'sdk_response_data').order_by('id')
+    last_id = 0
+    while True:
+        batch = list(transfers.filter(id__gt=last_id)[:BATCH_SIZE])
+        if not batch:
+            return
+        payloads = []
+        for transfer in batch:
+            data = transfer.sdk_response_data if isinstance(transfer.sdk_response_data, dict) else {}
+            transfer.current_state = data.get('currentState')
+            transfer.error_code = str(data.get('code') or '')[:32]
+            transfer.error_message = str(data.get('error') or '') if transfer.status == 'FAILED' else ''
+            if data and _is_hub_response(data):
+                payloads.append(TransferPayload(
+                    transfer_id=transfer.id,
+                    data=zlib.compress(json.dumps(data, separators=(',', ':')).encode()),
+                ))
+        Transfer.objects.bulk_update(batch, ['current_state', 'error_code', 'error_message'])
+        TransferPayload.objects.bulk_create(payloads)
+        last_id = batch[-1].id
+
+
+def merge_sdk_response_data(apps, schema_editor):
+    """Inverse : reconstitue sdk_response_data à partir des colonnes et de l'archive."""
+    Transfer = apps.get_model('transfert', 'Transfer')
+    TransferPayload = apps.get_model('transfert', 'TransferPayload')
+    transfers = Transfer.objects.exclude(status='INITIATED').order_by('id')
+    last_id = 0
+    while True:
+        batch = list(transfers.filter(id__gt=last_id)[:BATCH_SIZE])
+        if not batch:
+            return
+        payloads = dict(TransferPayload.objects.filter(transfer_id__in=[t.id for t in batch]).values_list('transfer_id', 'data'))
+        for transfer in batch:
+            if transfer.id in payloads:
+                transfer.sdk_response_data = json.loads(zlib.decompress(bytes(payloads[transfer.id])))
+            elif transfer.error_message:
+                transfer.sdk_response_data = {"success": False, "error": transfer.error_message, "code": transfer.error_code or None}
+            else:
+                transfer.sdk_response_data = {"transferId": transfer.transfer_id, "currentState": transfer.current_state}
+        Transfer.objects.bulk_update(batch, ['sdk_response_data'])
+        last_id = batch[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transfert', '0006_account_ledger'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transfer',
+            name='completed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='transfer',
+            name='current_state',
+            field=models.CharField(blank=True, max_length=32, null=True),
+        ),
+        migrations.AddField(
+            model_name='transfer',
+            name='error_code',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+        migrations.AddField(
+            model_name='transfer',
+            name='error_message',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.CreateModel(
+            name='TransferPayload',
+            fields=[
+                ('transfer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='payload', serialize=False, to='transfert.transfer')),
+                ('data', models.BinaryField()),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+        migrations.RunPython(split_sdk_response_data, merge_sdk_response_data),
+        migrations.RemoveField(
+            model_name='transfer',
+            name='sdk_response_data',
+        ),
+    ]
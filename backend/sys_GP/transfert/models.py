@@ -6,6 +6,8 @@ class Account(models.Model):
     msisdn = models.CharField(max_length=15, unique=True)
     name = models.CharField(max_length=100)
     balance = models.DecimalField(max_digits=12, decimal_places=2, default=1000.00) # Solde local (pour l'affichage/la validation simulée)
+    # Montant réservé pour des transferts en cours ; disponible = balance - reserved (voir transfert/ledger.py)
+    reserved = models.DecimalField(max_digits=14, decimal_places=2, default=0)
 
     def __str__(self):
         return f"{self.name} ({self.msisdn})"
@@ -39,16 +41,101 @@ class Transfer(models.Model):
     # `transfer_id`: identifiant renvoyé par le SDK pour le transfert (peut être non-UUID)
     transfer_id = models.CharField(max_length=128, null=True, blank=True)
     # `home_transaction_id`: identifiant de la transaction côté hub/SDK (peut être non-UUID)
-    home_transaction_id = models.CharField(max_length=64, null=True, blank=True)
+    # Unique : clé d'idempotence des soumissions (voir transfert/idempotency.py)
+    home_transaction_id = models.CharField(max_length=64, null=True, blank=True, unique=True)
     # Devise du transfert (ex: 'USD', 'XOF')
     currency = models.CharField(max_length=10, default='USD')
 
-    # Réponse brute du SDK pour le débogage
-    sdk_response_data = models.JSONField(null=True, blank=True)
+    # Résultat du transfert, lu par les listes, rapports et exports. La réponse brute
+    # du SDK est archivée à part, compressée (TransferPayload, voir transfert/payloads.py)
+    current_state = models.CharField(max_length=32, null=True, blank=True)  # currentState du hub
+    error_code = models.CharField(max_length=32, blank=True, default='')
+    error_message = models.TextField(blank=True, default='')
+    completed_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     note = models.CharField(max_length=255, default='Transfert P2P', blank=True)
     # Lien vers le Job de masse (voir section 3)
     bulk_job = models.ForeignKey('bulk_transfers.BulkTransferJob', on_delete=models.SET_NULL, null=True, blank=True)
+    # Numéro de la ligne du fichier du Job (point de reprise, voir bulk_transfers/process_utils.py)
+    bulk_line = models.IntegerField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            # Une ligne de fichier ne donne jamais lieu à deux transferts
+            models.UniqueConstraint(fields=['bulk_job', 'bulk_line'], name='transfer_job_line_uniq'),
+        ]
+        indexes = [
+            # Rapport de Job : comptage par statut et derniers transferts
+            models.Index(fields=['bulk_job', 'status'], name='transfer_job_status_idx'),
+            models.Index(fields=['bulk_job', 'created_at'], name='transfer_job_created_idx'),
+            # Liste paginée par curseur (created_at, id), globale ou filtrée
+            models.Index(fields=['-created_at', '-id'], name='transfer_created_idx'),
+            models.Index(fields=['sender', '-created_at', '-id'], name='transfer_sender_created_idx'),
+            models.Index(fields=['status', '-created_at', '-id'], name='transfer_status_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"Transfert {self.id} ({self.status}) de {self.sender.msisdn} vers {self.receiver_msisdn}"
+
+
+class TransferPayload(models.Model):
+    """
+    Réponse brute du SDK pour un Transfer (débogage, litiges), JSON compressé zlib.
+    Hors de la table Transfer : les requêtes courantes ne la lisent jamais.
+    Purgée au-delà de SDK_PAYLOAD_RETENTION_DAYS (commande purge_sdk_payloads).
+    """
+    transfer = models.OneToOneField(Transfer, on_delete=models.CASCADE, primary_key=True, related_name='payload')
+    data = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"Réponse SDK du transfert {self.transfer_id}"
+
+
+class Reservation(models.Model):
+    """
+    Fonds réservés sur un Account avant l'envoi au SDK, puis débités (transferts
+    réussis) ou libérés (échecs, reliquat). Une par transfert P2P, une par Job de masse.
+    """
+    STATUSES = (
+        ('OPEN', 'Open'),
+        ('CLOSED', 'Closed'),
+    )
+
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='reservations')
+    # home_transaction_id (P2P) ou "bulk:<id du Job>"
+    reference = models.CharField(max_length=100, unique=True)
+    amount = models.DecimalField(max_digits=14, decimal_places=2)
+    committed = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    released = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    status = models.CharField(max_length=10, choices=STATUSES, default='OPEN')
+    created_at = models.DateTimeField(auto_now_add=True)
+    closed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Réservation {self.reference} ({self.status}) : {self.amount}"
+
+
+class LedgerEntry(models.Model):
+    """Écriture du journal des mouvements d'un Account. Jamais modifiée ni supprimée."""
+    KINDS = (
+        ('RESERVE', 'Funds reserved'),
+        ('COMMIT', 'Reserved funds debited'),
+        ('RELEASE', 'Reserved funds released'),
+    )
+
+    account = models.ForeignKey(Account, on_delete=models.PROTECT, related_name='ledger_entries')
+    kind = models.CharField(max_length=10, choices=KINDS)
+    amount = models.DecimalField(max_digits=14, decimal_places=2)
+    reference = models.CharField(max_length=100)
+    transfer = models.ForeignKey(Transfer, on_delete=models.SET_NULL, null=True, blank=True, related_name='ledger_entries')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['account', 'created_at'], name='ledger_account_created_idx'),
+            models.Index(fields=['reference'], name='ledger_reference_idx'),
+        ]
 
     def __str__(self):
-        return f"Transfert {self.id} ({self.status}) de {self.sender.msisdn} vers {self.receiver_msisdn}"
\ No newline at end of file
+        return f"{self.kind} {self.amount} ({self.reference})"
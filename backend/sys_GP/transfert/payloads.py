@@ -0,0 +1,97 @@
+# transfert/payloads.py
+"""
+Résultat d'un transfert : colonnes typées sur Transfer, réponse brute archivée.
+
+Les champs lus par les listes, rapports et exports (état du hub, code et
+message d'erreur, date de fin) sont des colonnes de Transfer. La réponse brute
+du SDK n'y est plus : elle est archivée compressée dans TransferPayload, écrite
+dans la même transaction que le résultat et purgée après
+SDK_PAYLOAD_RETENTION_DAYS jours. Seules les réponses du hub sont archivées ;
+un échec sans réponse (erreur réseau, refus local) n'a que son message.
+"""
+import json
+import os
+import zlib
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .models import TransferPayload
+
+# false : la réponse brute du SDK n'est pas conservée
+SDK_PAYLOAD_ARCHIVE = os.environ.get("SDK_PAYLOAD_ARCHIVE", "true").lower() == "true"
+# Durée de conservation des réponses brutes (jours) ; 0 : sans limite
+SDK_PAYLOAD_RETENTION_DAYS = int(os.environ.get("SDK_PAYLOAD_RETENTION_DAYS", "30"))
+
+# Lignes supprimées par DELETE lors d'une purge : pas de transaction géante
+PURGE_BATCH = 10000
+
+# Colonnes écrites avec le résultat d'un transfert
+RESULT_FIELDS = ['transfer_id', 'status', 'current_state', 'error_code', 'error_message', 'completed_at']
+
+
+def apply_outcome(transfer, status, error='', code='', state=None, payload=None):
+    """
+    Reporte un résultat sur le Transfer (sans l'enregistrer). `payload`, la réponse
+    brute du hub, est gardée sur l'instance jusqu'à archive().
+    """
+    transfer.status = status
+    transfer.current_state = state
+    transfer.error_code = code or ''
+    transfer.error_message = error or ''
+    transfer.completed_at = timezone.now()
+    transfer.sdk_payload = payload
+    return transfer
+
+
+def apply_sdk_result(transfer, sdk_result):
+    """Reporte un résultat de transfert du SDK (dict success/status/data/error/code de transfert/services.py)."""
+    data = sdk_result.get('data')
+    if sdk_result['success']:
+        return apply_outcome(transfer, 'MOJALOOP_COMPLETED', state=sdk_result.get('status'), payload=data)
+    return apply_outcome(
+        transfer, 'FAILED', error=sdk_result.get('error'), code=sdk_result.get('code'),
+        state=(data or {}).get('currentState'), payload=data,
+    )
+
+
+def pack(data):
+    return zlib.compress(json.dumps(data, separators=(',', ':')).encode())
+
+
+def unpack(blob):
+    return json.loads(zlib.decompress(bytes(blob)))
+
+
+def archive(transfers):
+    """Archive les réponses brutes en attente sur `transfers` (à appeler dans la transaction du résultat)."""
+    if not SDK_PAYLOAD_ARCHIVE:
+        return
+    payloads = []
+    for transfer in transfers:
+        payload = getattr(transfer, 'sdk_payload', None)
+        if payload:
+            payloads.append(TransferPayload(transfer_id=transfer.pk, data=pack(payload)))
+        transfer.sdk_payload = None
+    # Une ligne déjà archivée (reprise d'un Job) garde sa première réponse
+    TransferPayload.objects.bulk_create(payloads, ignore_conflicts=True)
+
+
+def sdk_payload(transfer):
+    """Réponse brute du SDK archivée pour `transfer`, ou None."""
+    blob = TransferPayload.objects.filter(transfer_id=transfer.pk).values_list('data', flat=True).first()
+    return unpack(blob) if blob is not None else None
+
+
+def purge_expired(retention_days=None):
+    """Supprime les réponses brutes plus anciennes que la rétention ; retourne le nombre supprimé."""
+    retention_days = SDK_PAYLOAD_RETENTION_DAYS if retention_days is None else retention_days
+    if retention_days <= 0:
+        return 0
+    expired = TransferPayload.objects.filter(created_at__lt=timezone.now() - timedelta(days=retention_days))
+    deleted = 0
+    while True:
+        ids = list(expired.values_list('pk', flat=True)[:PURGE_BATCH])
+        if not ids:
+            return deleted
+        deleted += TransferPayload.objects.filter(pk__in=ids).delete()[0]
@@ -1,48 +1,487 @@
 # transfers/services.py (Version Corrigée)
 
+import asyncio
+import httpx
 import requests
 from requests.adapters import HTTPAdapter
+from urllib3.exceptions import MaxRetryError
 from urllib3.util.retry import Retry
+import atexit
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import quote
 import uuid
+import weakref
 import json
 import decimal
+import logging
 import os
 
+from . import metrics
+from .simulation import SIMULATION_SCENARIO, simulated_hub_url
+
+logger = logging.getLogger(__name__)
+
 # L'URL de votre SDK Scheme Adapter
 SDK_URL = os.environ.get("MOJALOOP_SDK_URL", "http://localhost:4001")
 
 # Mode simulation : si True, simule un succès sans appeler le SDK
-# SIMULATION_MODE=true  → simulation (pas de SDK)
+# SIMULATION_MODE=true  → simulation (pas de SDK) ; avec SIMULATION_SCENARIO, les
+#                         clients SDK visent un hub simulé dans le processus (transfert/simulation.py)
 # SIMULATION_MODE=false → utilise vraiment Mojaloop SDK
 SIMULATION_MODE = os.environ.get("SIMULATION_MODE", "true").lower() == "true"
 
+# Pool de connexions HTTP vers le SDK (partagé par les vues P2P et les workers bulk)
+# MOJALOOP_SDK_POOL_MAXSIZE doit couvrir BULK_MAX_IN_FLIGHT + le trafic P2P du processus.
+SDK_POOL_CONNECTIONS = int(os.environ.get("MOJALOOP_SDK_POOL_CONNECTIONS", "4"))
+SDK_POOL_MAXSIZE = int(os.environ.get("MOJALOOP_SDK_POOL_MAXSIZE", "64"))
+SDK_CONNECT_TIMEOUT = float(os.environ.get("MOJALOOP_SDK_CONNECT_TIMEOUT", "5"))
+SDK_READ_TIMEOUT = float(os.environ.get("MOJALOOP_SDK_READ_TIMEOUT", "30"))
+
+# Disjoncteur : ouverture si le taux d'échec des SDK_BREAKER_WINDOW derniers appels
+# dépasse SDK_BREAKER_FAILURE_RATE (au moins SDK_BREAKER_MIN_CALLS appels observés)
+SDK_BREAKER_WINDOW = int(os.environ.get("MOJALOOP_SDK_BREAKER_WINDOW", "20"))
+SDK_BREAKER_MIN_CALLS = int(os.environ.get("MOJALOOP_SDK_BREAKER_MIN_CALLS", "10"))
+SDK_BREAKER_FAILURE_RATE = float(os.environ.get("MOJALOOP_SDK_BREAKER_FAILURE_RATE", "0.5"))
+SDK_BREAKER_COOLDOWN = float(os.environ.get("MOJALOOP_SDK_BREAKER_COOLDOWN", "30"))
+SDK_BREAKER_PROBES = int(os.environ.get("MOJALOOP_SDK_BREAKER_PROBES", "1"))
+
+# Concurrence adaptative (AIMD) des appels SDK synchrones du processus. La fenêtre
+# initiale couvre au moins la fenêtre d'envoi d'un Job de masse (BULK_MAX_IN_FLIGHT) :
+# un Job ne démarre pas en file d'attente sur le limiteur.
+SDK_CONCURRENCY_INITIAL = int(os.environ.get(
+    "MOJALOOP_SDK_CONCURRENCY_INITIAL", os.environ.get("BULK_MAX_IN_FLIGHT", "32")))
+SDK_CONCURRENCY_MIN = int(os.environ.get("MOJALOOP_SDK_CONCURRENCY_MIN", "1"))
+SDK_CONCURRENCY_MAX = int(os.environ.get("MOJALOOP_SDK_CONCURRENCY_MAX", str(SDK_POOL_MAXSIZE)))
+SDK_LATENCY_TARGET = float(os.environ.get("MOJALOOP_SDK_LATENCY_TARGET", "2"))
+# Attente maximale d'une place dans la fenêtre avant d'abandonner l'appel
+SDK_QUEUE_TIMEOUT = float(os.environ.get("MOJALOOP_SDK_QUEUE_TIMEOUT", "30"))
+
+
+# Méthodes idempotentes, relancées aussi sur timeout de lecture et statut 5xx
+SDK_RETRY_METHODS = frozenset(['GET', 'PUT', 'DELETE', 'OPTIONS', 'HEAD'])
+
+# Limitation de débit (429) : relance après l'attente demandée par Retry-After (à
+# défaut, backoff exponentiel), au plus SDK_RATE_LIMIT_RETRIES fois. Une attente
+# annoncée au-delà de SDK_RATE_LIMIT_MAX_WAIT secondes rend le 429 à l'appelant.
+SDK_RATE_LIMIT_RETRIES = int(os.environ.get("MOJALOOP_SDK_RATE_LIMIT_RETRIES", "3"))
+SDK_RATE_LIMIT_BACKOFF = float(os.environ.get("MOJALOOP_SDK_RATE_LIMIT_BACKOFF", "0.5"))
+SDK_RATE_LIMIT_MAX_WAIT = float(os.environ.get("MOJALOOP_SDK_RATE_LIMIT_MAX_WAIT", "10"))
+
+# Identifiant qui rend un POST rejouable : le hub reconnaît une requête déjà reçue
+# sous cet identifiant. Un POST sans identifiant n'est jamais relancé.
+SDK_IDEMPOTENT_IDS = {'/transfers': 'transferId', '/bulkQuotes': 'bulkQuoteId', '/bulkTransfers': 'bulkTransferId'}
+
+
+def _replayable(method, path, payload):
+    """La requête peut-elle être renvoyée sans risque de doublon ?"""
+    if method.upper() in SDK_RETRY_METHODS:
+        return True
+    field = SDK_IDEMPOTENT_IDS.get(path)
+    return field is not None and isinstance(payload, dict) and bool(payload.get(field))
+
+
+def _rate_limit_wait(response, attempt):
+    """
+    Secondes à attendre avant de renvoyer une requête refusée en 429 (`attempt` :
+    relances déjà faites) ; None si l'attente dépasse SDK_RATE_LIMIT_MAX_WAIT.
+    Retry-After est un nombre de secondes ou une date HTTP.
+    """
+    header = (response.headers.get('Retry-After') or '').strip()
+    wait = None
+    if header:
+        try:
+            wait = float(header)
+        except ValueError:
+            try:
+                retry_at = parsedate_to_datetime(header)
+                if retry_at.tzinfo is None:
+                    retry_at = retry_at.replace(tzinfo=timezone.utc)
+                wait = (retry_at - datetime.now(timezone.utc)).total_seconds()
+            except (TypeError, ValueError):
+                wait = None
+    if wait is None:
+        wait = SDK_RATE_LIMIT_BACKOFF * (2 ** attempt)
+    wait = max(0.0, wait)
+    return wait if wait <= SDK_RATE_LIMIT_MAX_WAIT else None
+
+
+class _SdkRetry(Retry):
+    # Les 429 sont relancés par SdkClient.request (attente plafonnée, POST rejouables)
+    RETRY_AFTER_STATUS_CODES = frozenset([413, 503])
 
-def _make_requests_session_with_retries(total_retries=3, backoff_factor=0.5, status_forcelist=(500, 502, 503, 504)):
+
+def _make_requests_session_with_retries(total_retries=3, backoff_factor=0.5, status_forcelist=(500, 502, 503, 504),
+                                        pool_connections=SDK_POOL_CONNECTIONS, pool_maxsize=SDK_POOL_MAXSIZE):
     session = requests.Session()
-    retries = Retry(
+    retries = _SdkRetry(
         total=total_retries,
         backoff_factor=backoff_factor,
         status_forcelist=status_forcelist,
-        allowed_methods=frozenset(['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS', 'HEAD'])
+        # POST n'est pas rejoué sur erreur de lecture ou statut 5xx : la requête a pu
+        # atteindre le hub, la rejouer risquerait un double transfert. Les erreurs de
+        # connexion (requête jamais émise) restent relancées pour toutes les méthodes.
+        allowed_methods=SDK_RETRY_METHODS
     )
-    adapter = HTTPAdapter(max_retries=retries)
+    adapter = HTTPAdapter(max_retries=retries, pool_connections=pool_connections, pool_maxsize=pool_maxsize)
     session.mount('http://', adapter)
     session.mount('https://', adapter)
     return session
 
 
-# Signature adaptée pour le Bulk
-def execute_p2p_transfer_via_sdk(sender_msisdn, receiver_id_type, receiver_id_value, amount, currency, note, home_transaction_id=None):
+class CircuitOpenError(requests.exceptions.RequestException):
     """
-    Exécute le flux Mojaloop complet (Parties, Quote, Transfer) via le SDK /transfers endpoint.
-    Utilise le type d'ID et la valeur d'ID pour le destinataire, comme lu depuis le CSV.
-    
-    Si SIMULATION_MODE=true, simule un transfert réussi sans appeler le SDK.
+    Appel refusé sans contacter le SDK : disjoncteur ouvert ou fenêtre saturée.
+    Rien n'a été émis : l'appel peut être refait sans risque de doublon.
     """
-    
-    if home_transaction_id is None:
-        home_transaction_id = uuid.uuid4()
 
+
+class AsyncCircuitOpenError(httpx.TransportError):
+    """Équivalent de CircuitOpenError pour le client asynchrone."""
+
+
+class CircuitBreaker:
+    """
+    Disjoncteur partagé par tous les appels SDK du processus.
+
+    CLOSED    : les appels passent ; le résultat des derniers appels est suivi.
+    OPEN      : taux d'échec trop élevé, les appels échouent immédiatement
+                pendant `cooldown` secondes.
+    HALF_OPEN : `probes` appels de test sont autorisés ; un succès referme
+                le disjoncteur, un échec le rouvre.
+
+    Un échec est une erreur réseau, un timeout ou une réponse 5xx ; les erreurs
+    métier (4xx) ne comptent pas.
+    """
+
+    CLOSED = 'CLOSED'
+    OPEN = 'OPEN'
+    HALF_OPEN = 'HALF_OPEN'
+
+    def __init__(self, window=SDK_BREAKER_WINDOW, min_calls=SDK_BREAKER_MIN_CALLS,
+                 failure_rate=SDK_BREAKER_FAILURE_RATE, cooldown=SDK_BREAKER_COOLDOWN, probes=SDK_BREAKER_PROBES):
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.cooldown = cooldown
+        self.probes = max(1, probes)
+        self._outcomes = deque(maxlen=max(1, window))
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            self._refresh()
+            return self._state
+
+    def _refresh(self):
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.cooldown:
+            self._state = self.HALF_OPEN
+            self._probes_in_flight = 0
+            logger.info("Disjoncteur SDK semi-ouvert : envoi d'appels de test")
+
+    def allow(self):
+        """Réserve le droit d'appeler le SDK ; False si l'appel doit échouer immédiatement."""
+        with self._lock:
+            self._refresh()
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.HALF_OPEN and self._probes_in_flight < self.probes:
+                self._probes_in_flight += 1
+                return True
+            self.rejected += 1
+            return False
+
+    def record(self, ok):
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+                if ok:
+                    self._state = self.CLOSED
+                    self._outcomes.clear()
+                    logger.info("Disjoncteur SDK refermé")
+                else:
+                    self._trip()
+                return
+
+            self._outcomes.append(ok)
+            failures = self._outcomes.count(False)
+            if (self._state == self.CLOSED and len(self._outcomes) >= self.min_calls
+                    and failures / len(self._outcomes) >= self.failure_rate):
+                self._trip()
+
+    def cancel(self):
+        """Rend une autorisation obtenue par allow() sans qu'aucun appel n'ait été émis."""
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+
+    def _trip(self):
+        self._state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+        logger.warning("Disjoncteur SDK ouvert pour %ss", self.cooldown)
+
+    def wait_until_available(self, timeout):
+        """
+        Bloque tant qu'un appel serait refusé (disjoncteur ouvert, ou semi-ouvert
+        avec tous les appels de test en cours). Retourne False après `timeout` secondes.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                self._refresh()
+                if self._state == self.CLOSED or (self._state == self.HALF_OPEN and self._probes_in_flight < self.probes):
+                    return True
+                wait = self.cooldown - (time.monotonic() - self._opened_at) if self._state == self.OPEN else 0.1
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(max(wait, 0.05), remaining))
+
+    def retry_after(self):
+        """Secondes avant le prochain appel de test (0 si le disjoncteur n'est pas ouvert)."""
+        with self._lock:
+            self._refresh()
+            if self._state != self.OPEN:
+                return 0.0
+            return max(0.0, self.cooldown - (time.monotonic() - self._opened_at))
+
+    def reset(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._outcomes.clear()
+            self._probes_in_flight = 0
+            self.rejected = 0
+
+    def snapshot(self):
+        with self._lock:
+            self._refresh()
+            calls = len(self._outcomes)
+            return {
+                "state": self._state,
+                "recent_calls": calls,
+                "recent_failure_rate": round(self._outcomes.count(False) / calls, 3) if calls else 0.0,
+                "retry_after": round(max(0.0, self.cooldown - (time.monotonic() - self._opened_at)), 1) if self._state == self.OPEN else 0.0,
+                "rejected_calls": self.rejected,
+            }
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Fenêtre d'appels SDK simultanés ajustée en AIMD :
+      - augmentation additive (+1 par fenêtre d'appels réussis sous `latency_target`) ;
+      - diminution multiplicative (x `backoff_ratio`) sur échec ou latence excessive,
+        au plus une fois par `latency_target` pour ne pas s'effondrer sur une rafale.
+    Les appels au-delà de la fenêtre attendent une place.
+    """
+
+    def __init__(self, initial=SDK_CONCURRENCY_INITIAL, min_limit=SDK_CONCURRENCY_MIN, max_limit=SDK_CONCURRENCY_MAX,
+                 latency_target=SDK_LATENCY_TARGET, backoff_ratio=0.7):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.latency_target = latency_target
+        self.backoff_ratio = backoff_ratio
+        self._limit = float(min(max(initial, self.min_limit), self.max_limit))
+        self._in_flight = 0
+        self._last_decrease = 0.0
+        self._latency_ewma = None
+        self._condition = threading.Condition()
+
+    @property
+    def limit(self):
+        return int(self._limit)
+
+    def acquire(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while self._in_flight >= int(self._limit):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+            self._in_flight += 1
+            return True
+
+    async def aacquire(self, timeout=None):
+        """acquire() pour une coroutine : attend une place sans bloquer la boucle d'événements."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        delay = 0.005
+        while not self.acquire(timeout=0):
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.1)
+        return True
+
+    def release(self, latency, ok):
+        """Libère une place. `latency` vaut None pour un appel dont la durée n'est pas significative."""
+        with self._condition:
+            self._in_flight = max(0, self._in_flight - 1)
+            if latency is not None:
+                self._latency_ewma = latency if self._latency_ewma is None else 0.8 * self._latency_ewma + 0.2 * latency
+
+            if ok and (latency is None or latency <= self.latency_target):
+                self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+            else:
+                now = time.monotonic()
+                if now - self._last_decrease >= self.latency_target:
+                    self._limit = max(self.min_limit, self._limit * self.backoff_ratio)
+                    self._last_decrease = now
+            self._condition.notify_all()
+
+    def snapshot(self):
+        with self._condition:
+            return {
+                "limit": int(self._limit),
+                "in_flight": self._in_flight,
+                "min_limit": self.min_limit,
+                "max_limit": self.max_limit,
+                "latency_target": self.latency_target,
+                "latency_ewma": round(self._latency_ewma, 3) if self._latency_ewma is not None else None,
+            }
+
+
+# Les lots /bulkQuotes et /bulkTransfers sont lents par nature : seul leur
+# résultat, pas leur durée, alimente la fenêtre adaptative.
+LATENCY_EXEMPT_PATHS = ('/bulkQuotes', '/bulkTransfers')
+
+
+class SdkClient:
+    """
+    Client HTTP longue durée vers le SDK Scheme Adapter.
+
+    La session `requests` (et son pool de connexions keep-alive) est créée à la
+    première requête puis réutilisée par tous les threads du processus. En mode
+    simulation avec scénario, elle vise le hub simulé du processus (transfert/simulation.py).
+    """
+
+    def __init__(self, base_url=SDK_URL, pool_connections=SDK_POOL_CONNECTIONS, pool_maxsize=SDK_POOL_MAXSIZE,
+                 connect_timeout=SDK_CONNECT_TIMEOUT, read_timeout=SDK_READ_TIMEOUT, breaker=None, limiter=None):
+        self.base_url = base_url.rstrip('/')
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.timeout = (connect_timeout, read_timeout)
+        self.breaker = breaker or CircuitBreaker()
+        self.limiter = limiter or AdaptiveConcurrencyLimiter()
+        self._session = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        session = self._session
+        if session is None:
+            with self._lock:
+                if self._session is None:
+                    if SIMULATION_MODE and SIMULATION_SCENARIO:
+                        self.base_url = simulated_hub_url()
+                    self._session = _make_requests_session_with_retries(
+                        pool_connections=self.pool_connections,
+                        pool_maxsize=self.pool_maxsize,
+                    )
+                session = self._session
+        return session
+
+    def request(self, method, path, **kwargs):
+        """
+        Envoie la requête à travers le disjoncteur et la fenêtre adaptative :
+        lève CircuitOpenError sans contacter le SDK s'il est jugé indisponible.
+        Une réponse 429 est relancée après Retry-After si la requête est
+        rejouable (méthode idempotente ou POST portant son identifiant).
+        """
+        replays = 0
+        while True:
+            response = self._send(method, path, replays, **kwargs)
+            if response.status_code != 429 or replays >= SDK_RATE_LIMIT_RETRIES \
+                    or not _replayable(method, path, kwargs.get('json')):
+                return response
+            wait = _rate_limit_wait(response, replays)
+            if wait is None:
+                return response
+            replays += 1
+            logger.info("SDK %s %s limité (429) : nouvel essai dans %.1fs", method, path, wait)
+            response.close()
+            time.sleep(wait)
+
+    def _send(self, method, path, replays=0, **kwargs):
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"SDK indisponible (disjoncteur ouvert, nouvel essai dans {self.breaker.retry_after():.0f}s)")
+        if not self.limiter.acquire(timeout=SDK_QUEUE_TIMEOUT):
+            self.breaker.cancel()  # Aucun appel émis : ni succès ni échec
+            raise CircuitOpenError("SDK saturé : aucune place libre dans la fenêtre d'appels")
+
+        kwargs.setdefault('timeout', self.timeout)
+        started = time.monotonic()
+        ok = False
+        response = None
+        retries = 1 if replays else 0
+        try:
+            response = self.session.request(method, f"{self.base_url}{path}", **kwargs)
+            ok = response.status_code < 500
+            retries += _retry_count(response)
+            return response
+        except requests.exceptions.ConnectionError as e:
+            if e.args and isinstance(e.args[0], MaxRetryError):
+                # Relances épuisées : autant de relances que le Retry de la session en autorise
+                retries += self.session.get_adapter(self.base_url).max_retries.total or 0
+            raise
+        finally:
+            self.breaker.record(ok)
+            latency = None if path.startswith(LATENCY_EXEMPT_PATHS) else time.monotonic() - started
+            # Un 429 n'est pas une panne (disjoncteur) mais réduit la fenêtre d'appels
+            self.limiter.release(latency, ok and response.status_code != 429)
+            metrics.observe_sdk_request(method, path, started, response.status_code if response is not None else None, retries)
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request('POST', path, **kwargs)
+
+    def close(self):
+        """Ferme les connexions du pool ; une nouvelle session sera créée au besoin."""
+        with self._lock:
+            session, self._session = self._session, None
+        if session is not None:
+            session.close()
+
+    def _reset_after_fork(self):
+        # Un processus enfant ne doit pas réutiliser les sockets du parent
+        self._lock = threading.Lock()
+        self._session = None
+        self.breaker = CircuitBreaker()
+        self.limiter = AdaptiveConcurrencyLimiter()
+
+
+def _retry_count(response):
+    """Relances effectuées par urllib3 avant cette réponse."""
+    retries = getattr(response.raw, 'retries', None)
+    return len(retries.history) if retries is not None else 0
+
+
+sdk_client = SdkClient()
+atexit.register(sdk_client.close)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=sdk_client._reset_after_fork)
+
+
+def sdk_health():
+    """État du client SDK du processus (disjoncteur, fenêtre adaptative, cache des parties)."""
+    return {
+        "circuit_breaker": sdk_client.breaker.snapshot(),
+        "concurrency": sdk_client.limiter.snapshot(),
+        "party_cache": party_cache.stats(),
+    }
+
+
+def _format_amount(amount):
+    """Montant au format attendu par le SDK (sans zéros superflus)."""
     try:
         amount_decimal = decimal.Decimal(str(amount))
         normalized = amount_decimal.normalize()
@@ -51,37 +490,58 @@ def execute_p2p_transfer_via_sdk(sender_msisdn, receiver_id_type, receiver_id_va
             amount_str = amount_str.rstrip('0').rstrip('.')
     except decimal.InvalidOperation:
         amount_str = str(amount)
-    
-    # MODE SIMULATION : Retourne un succès simulé
-    if SIMULATION_MODE:
-        return {
-            "success": True,
-            "transfer_id": f"SIM-{uuid.uuid4().hex[:12].upper()}",
-            "status": "COMPLETED",
-            "data": {
-                "transferId": f"SIM-{uuid.uuid4().hex[:12].upper()}",
-                "currentState": "COMPLETED",
-                "from": {"idType": "MSISDN", "idValue": sender_msisdn},
-                "to": {"idType": receiver_id_type, "idValue": receiver_id_value},
-                "amount": amount_str,
-                "currency": currency,
-                "note": note,
-                "simulated": True
-            },
-            "home_transaction_id": str(home_transaction_id)
-        }
-    
-    payload = {
-        "from": {
-            "displayName": "Django DFSP Client",
-            "idType": "MSISDN", 
-            "idValue": sender_msisdn
-        },
-        "to": {
-            # Correction : Utilisation des variables dynamiques du Bulk
-            "idType": receiver_id_type, 
-            "idValue": receiver_id_value  
+    return amount_str
+
+
+def _simulated():
+    """Simulation sans scénario : succès immédiat, aucun appel réseau ni hub simulé."""
+    return SIMULATION_MODE and not SIMULATION_SCENARIO
+
+
+def _simulated_transfer_result(sender_msisdn, receiver_id_type, receiver_id_value, amount_str, currency, note, home_transaction_id, transfer_id=None):
+    transfer_id = str(transfer_id or f"SIM-{uuid.uuid4().hex[:12].upper()}")
+    return {
+        "success": True,
+        "transfer_id": transfer_id,
+        "status": "COMPLETED",
+        "data": {
+            "transferId": transfer_id,
+            "currentState": "COMPLETED",
+            "from": {"idType": "MSISDN", "idValue": sender_msisdn},
+            "to": {"idType": receiver_id_type, "idValue": receiver_id_value},
+            "amount": amount_str,
+            "currency": currency,
+            "note": note,
+            "simulated": True
         },
+        "home_transaction_id": str(home_transaction_id)
+    }
+
+
+def _payer(sender_msisdn):
+    return {
+        "displayName": "Django DFSP Client",
+        "idType": "MSISDN", 
+        "idValue": sender_msisdn
+    }
+
+
+def _payee(receiver_id_type, receiver_id_value, receiver_fsp_id=None):
+    payee = {
+        # Correction : Utilisation des variables dynamiques du Bulk
+        "idType": receiver_id_type, 
+        "idValue": receiver_id_value  
+    }
+    if receiver_fsp_id:
+        # FSP du bénéficiaire déjà connu : le SDK n'a pas à le résoudre
+        payee["fspId"] = receiver_fsp_id
+    return payee
+
+
+def _build_transfer_payload(sender_msisdn, receiver_id_type, receiver_id_value, amount_str, currency, note, home_transaction_id, receiver_fsp_id=None, transfer_id=None):
+    payload = {
+        "from": _payer(sender_msisdn),
+        "to": _payee(receiver_id_type, receiver_id_value, receiver_fsp_id),
         "amountType": "SEND",
         "currency": currency, 
         "amount": amount_str,
@@ -89,37 +549,659 @@ def execute_p2p_transfer_via_sdk(sender_msisdn, receiver_id_type, receiver_id_va
         "note": note,
         "homeTransactionId": str(home_transaction_id)
     }
+    if transfer_id:
+        # Identifiant fixé par l'appelant : le transfert peut être retrouvé (GET /transfers/{id})
+        payload["transferId"] = str(transfer_id)
+    return payload
+
+
+SDK_HEADERS = {
+    'Content-Type': 'application/json',
+    'Accept': 'application/json'
+}
 
-    headers = {
-        'Content-Type': 'application/json',
-        'Accept': 'application/json'
+
+def _success_result(sdk_data, home_transaction_id):
+    return {
+        "success": True,
+        "transfer_id": sdk_data.get('transferId'),
+        "status": sdk_data.get('currentState'),
+        "data": sdk_data,
+        "home_transaction_id": str(home_transaction_id)
     }
 
-    session = _make_requests_session_with_retries()
 
+def _failure_result(error_text, home_transaction_id):
+    return {
+        "success": False,
+        "error": f"SDK Request Failed: {error_text}",
+        "home_transaction_id": str(home_transaction_id)
+    }
+
+
+# Code d'erreur d'un transfert refusé avant tout envoi (disjoncteur ouvert, fenêtre saturée)
+SDK_UNAVAILABLE = 'SDK_UNAVAILABLE'
+
+
+def _not_sent_result(error_text, home_transaction_id):
+    """
+    Échec sans envoi : le hub n'a rien reçu. `sent` False indique à l'appelant
+    (workers de masse) que le transfert peut être refait tel quel.
+    """
+    return {
+        **_failure_result(error_text, home_transaction_id),
+        "sent": False,
+        "code": SDK_UNAVAILABLE,
+    }
+
+
+def is_not_sent(result):
+    """Vrai pour un résultat de transfert refusé avant tout envoi au hub."""
+    return isinstance(result, dict) and result.get('sent') is False
+
+
+def _sdk_error_text(e):
     try:
-        response = session.post(f"{SDK_URL}/transfers", json=payload, headers=headers, timeout=30)
+        return getattr(e.response, 'text', None) or str(e)
+    except Exception:
+        return str(e)
+
+
+# ---------------------------------------------------------------------------
+# Résolution des bénéficiaires (/parties) avec cache
+# ---------------------------------------------------------------------------
+
+# Résolution préalable du FSP bénéficiaire avant chaque /transfers (MOJALOOP_PARTY_RESOLUTION=true pour l'activer).
+# Désactivée par défaut : le SDK résout déjà le bénéficiaire dans son propre flux /transfers,
+# une résolution préalable double les allers-retours d'un bénéficiaire pas encore en cache.
+# La validation des Jobs de masse résout, elle, toujours (lookup_party) et son résultat est réutilisé.
+PARTY_RESOLUTION = os.environ.get("MOJALOOP_PARTY_RESOLUTION", "false").lower() == "true"
+# Cache par processus : nombre d'entrées (LRU), durée de vie des parties trouvées et des parties inconnues
+PARTY_CACHE_SIZE = int(os.environ.get("MOJALOOP_PARTY_CACHE_SIZE", "10000"))
+PARTY_CACHE_TTL = float(os.environ.get("MOJALOOP_PARTY_CACHE_TTL", "3600"))
+PARTY_CACHE_NEGATIVE_TTL = float(os.environ.get("MOJALOOP_PARTY_CACHE_NEGATIVE_TTL", "300"))
+
+
+class PartyCache:
+    """
+    Cache LRU à durée de vie des résolutions de parties, clé (idType, idValue).
+
+    Les parties inconnues du hub sont aussi mises en cache (durée plus courte) ;
+    les réponses non concluantes (réseau, 5xx, 429, autres 4xx) ne le sont jamais.
+    """
+
+    def __init__(self, maxsize=PARTY_CACHE_SIZE, ttl=PARTY_CACHE_TTL, negative_ttl=PARTY_CACHE_NEGATIVE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, id_type, id_value):
+        key = (id_type, id_value)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, id_type, id_value, party):
+        if self.maxsize <= 0:
+            return
+        ttl = self.ttl if party['found'] else self.negative_ttl
+        key = (id_type, id_value)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, party)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._entries), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+
+party_cache = PartyCache()
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=party_cache.clear)
+
+
+def _parties_path(id_type, id_value):
+    return f"/parties/{quote(str(id_type), safe='')}/{quote(str(id_value), safe='')}"
+
+
+# Codes d'erreur FSPIOP signifiant que la partie n'existe pas : identifiant
+# introuvable (3200), FSP du bénéficiaire introuvable (3203), partie introuvable (3204)
+PARTY_NOT_FOUND_CODES = frozenset(['3200', '3203', '3204'])
+
+
+def _party_error(body):
+    """errorInformation d'une réponse d'erreur du SDK (directe ou sous lastError.mojaloopError)."""
+    error = body.get('errorInformation')
+    if not error:
+        last_error = body.get('lastError') or {}
+        error = (last_error.get('mojaloopError') or {}).get('errorInformation')
+    return error or {}
+
+
+def _party_from_response(status_code, body):
+    """
+    Interprète la réponse du SDK à GET /parties/{type}/{id} : dict de résolution
+    ({found, fsp_id, name}) ou None si le résultat n'est pas concluant.
+
+    Seuls un 404 ou un code d'erreur « partie introuvable » concluent à une partie
+    inconnue (mise en cache négatif). Limitation de débit (429), refus d'accès
+    (401/403), autres 4xx et 5xx ne disent rien de la partie : None.
+    """
+    body = body if isinstance(body, dict) else {}
+    error = _party_error(body)
+    error_code = str(error.get('errorCode') or body.get('statusCode') or '')
+    if status_code == 404 or (status_code < 500 and status_code != 429 and error_code in PARTY_NOT_FOUND_CODES):
+        return {"found": False, "fsp_id": None, "name": None,
+                "error": error.get('errorDescription') or "Party not found"}
+    if status_code >= 400 or error:
+        return None
+
+    party = body.get('party') or {}
+    # Selon la version du SDK, la partie est sous `party` ou sous `party.body`
+    party = party.get('body', party)
+    fsp_id = (party.get('partyIdInfo') or {}).get('fspId')
+    if not fsp_id:
+        return None
+    return {"found": True, "fsp_id": fsp_id, "name": party.get('name'), "error": None}
+
+
+def resolve_party(id_type, id_value):
+    """
+    Résolution préalable à un /transfers : lookup_party si PARTY_RESOLUTION est
+    activée, None sinon (le SDK résout alors lui-même le bénéficiaire).
+    """
+    if not PARTY_RESOLUTION:
+        return None
+    return lookup_party(id_type, id_value)
+
+
+def lookup_party(id_type, id_value):
+    """
+    Résout le FSP d'un bénéficiaire via le SDK (GET /parties/{type}/{id}), en passant
+    par le cache. Retourne None en simulation sans scénario ou en cas d'erreur
+    transitoire : l'appelant laisse alors le SDK résoudre lui-même.
+    """
+    if _simulated():
+        return None
+
+    party = party_cache.get(id_type, id_value)
+    if party is not None:
+        return party
+
+    try:
+        response = sdk_client.get(_parties_path(id_type, id_value), headers=SDK_HEADERS)
+        body = response.json() if response.content else {}
+    except (requests.exceptions.RequestException, ValueError):
+        return None
+
+    party = _party_from_response(response.status_code, body)
+    if party is not None:
+        party_cache.set(id_type, id_value, party)
+    return party
+
+
+def _remember_party(receiver_id_type, receiver_id_value, sdk_data):
+    """Alimente le cache avec le FSP résolu par le SDK lors d'un /transfers."""
+    fsp_id = ((sdk_data or {}).get('to') or {}).get('fspId')
+    if fsp_id:
+        party_cache.set(receiver_id_type, receiver_id_value, {"found": True, "fsp_id": fsp_id, "name": None, "error": None})
+
+
+def _unknown_party_result(party, home_transaction_id):
+    return _failure_result(f"Party lookup failed: {party['error']}", home_transaction_id)
+
+
+# Signature adaptée pour le Bulk
+@metrics.timed_transfer
+def execute_p2p_transfer_via_sdk(sender_msisdn, receiver_id_type, receiver_id_value, amount, currency, note, home_transaction_id=None, receiver_fsp_id=None, transfer_id=None):
+    """
+    Exécute le flux Mojaloop complet (Parties, Quote, Transfer) via le SDK /transfers endpoint.
+    Utilise le type d'ID et la valeur d'ID pour le destinataire, comme lu depuis le CSV.
+    `receiver_fsp_id`, s'il est connu, est transmis au SDK (to.fspId) ; `transfer_id`,
+    s'il est fixé par avance (lignes de Job, P2P), est transmis comme transferId.
+    
+    Si SIMULATION_MODE=true, simule un transfert réussi sans appeler le SDK ; avec
+    SIMULATION_SCENARIO, l'appel vise le hub simulé du processus (transfert/simulation.py).
+    """
+    
+    if home_transaction_id is None:
+        home_transaction_id = uuid.uuid4()
+
+    amount_str = _format_amount(amount)
+    
+    # MODE SIMULATION : Retourne un succès simulé
+    if _simulated():
+        return _simulated_transfer_result(sender_msisdn, receiver_id_type, receiver_id_value, amount_str, currency, note, home_transaction_id, transfer_id)
+
+    # Phase 1 : résolution du bénéficiaire (cache), avant tout mouvement de fonds
+    if not receiver_fsp_id:
+        party = resolve_party(receiver_id_type, receiver_id_value)
+        if party is not None:
+            if not party['found']:
+                return _unknown_party_result(party, home_transaction_id)
+            receiver_fsp_id = party['fsp_id']
+
+    # Phase 2 : transfert vers le FSP connu
+    payload = _build_transfer_payload(sender_msisdn, receiver_id_type, receiver_id_value, amount_str, currency, note, home_transaction_id, receiver_fsp_id, transfer_id)
+
+    try:
+        response = sdk_client.post("/transfers", json=payload, headers=SDK_HEADERS)
         response.raise_for_status()
 
         sdk_data = response.json()
+        _remember_party(receiver_id_type, receiver_id_value, sdk_data)
+        return _success_result(sdk_data, home_transaction_id)
 
-        return {
-            "success": True,
-            "transfer_id": sdk_data.get('transferId'),
-            "status": sdk_data.get('currentState'),
-            "data": sdk_data,
-            "home_transaction_id": str(home_transaction_id)
-        }
+    except CircuitOpenError as e:
+        return _not_sent_result(str(e), home_transaction_id)
+    except requests.exceptions.RequestException as e:
+        return _failure_result(_sdk_error_text(e), home_transaction_id)
+
+
+# ---------------------------------------------------------------------------
+# Transferts groupés (/bulkQuotes + /bulkTransfers)
+# ---------------------------------------------------------------------------
+
+# Nombre maximal de transferts individuels par lot (limite Mojaloop : 1000)
+SDK_BULK_BATCH_SIZE = int(os.environ.get("MOJALOOP_SDK_BULK_BATCH_SIZE", "1000"))
+
+
+def _item_error(item_result):
+    """Message d'erreur d'un résultat individuel de lot, ou None s'il a réussi."""
+    error = item_result.get('lastError') or item_result.get('errorInformation')
+    if not error:
+        return None
+    if isinstance(error, dict):
+        info = error.get('mojaloopError', {}).get('errorInformation') or error.get('errorInformation') or error
+        return info.get('errorDescription') or json.dumps(error)
+    return str(error)
 
+
+def execute_bulk_transfer_via_sdk(sender_msisdn, transfers, currency, receiver_fsp_id, home_transaction_id=None):
+    """
+    Exécute un lot de transferts vers un même FSP bénéficiaire et une même devise :
+    un POST /bulkQuotes puis un POST /bulkTransfers pour les lignes cotées.
+
+    `transfers` est une liste de dicts (receiver_id_type, receiver_id_value, amount, note,
+    + home_transaction_id et transfer_id optionnels).
+    Retourne une liste de résultats, dans le même ordre et au même format que
+    execute_p2p_transfer_via_sdk ; chaque ligne garde son propre home_transaction_id.
+    """
+    if home_transaction_id is None:
+        home_transaction_id = uuid.uuid4()
+
+    items = []
+    for transfer in transfers:
+        items.append({
+            "transfer_id": str(transfer.get('transfer_id') or uuid.uuid4()),
+            "home_transaction_id": str(transfer.get('home_transaction_id') or uuid.uuid4()),
+            "to": _payee(transfer['receiver_id_type'], transfer['receiver_id_value'], receiver_fsp_id),
+            "amount": _format_amount(transfer['amount']),
+            "note": transfer.get('note', ''),
+        })
+
+    if _simulated():
+        return [
+            _simulated_transfer_result(sender_msisdn, item['to']['idType'], item['to']['idValue'],
+                                       item['amount'], currency, item['note'], item['home_transaction_id'], item['transfer_id'])
+            for item in items
+        ]
+
+    bulk_quote_id = str(uuid.uuid4())
+    bulk_quote_payload = {
+        "homeTransactionId": str(home_transaction_id),
+        "bulkQuoteId": bulk_quote_id,
+        "from": _payer(sender_msisdn),
+        "individualQuotes": [
+            {
+                "quoteId": item['transfer_id'],
+                "to": item['to'],
+                "amountType": "SEND",
+                "currency": currency,
+                "amount": item['amount'],
+                "transactionType": "TRANSFER",
+                "note": item['note'],
+            }
+            for item in items
+        ],
+    }
+
+    try:
+        response = sdk_client.post("/bulkQuotes", json=bulk_quote_payload, headers=SDK_HEADERS)
+        response.raise_for_status()
+        bulk_quote = response.json()
+    except CircuitOpenError as e:
+        return [_not_sent_result(str(e), item['home_transaction_id']) for item in items]
     except requests.exceptions.RequestException as e:
-        error_text = None
+        return [_failure_result(_sdk_error_text(e), item['home_transaction_id']) for item in items]
+
+    quote_results = {
+        quote.get('quoteId'): quote for quote in bulk_quote.get('individualQuoteResults', [])
+    }
+
+    individual_transfers = []
+    for item in items:
+        quote = quote_results.get(item['transfer_id'])
+        if quote is None or _item_error(quote):
+            continue
+        individual_transfers.append({
+            "transferId": item['transfer_id'],
+            "to": item['to'],
+            "amountType": "SEND",
+            "currency": currency,
+            "amount": item['amount'],
+            "ilpPacket": quote.get('ilpPacket'),
+            "condition": quote.get('condition'),
+            "note": item['note'],
+        })
+
+    transfer_results = {}
+    bulk_transfer = {}
+    bulk_transfer_error = None
+    # /bulkTransfers refusé sans envoi : les lignes cotées peuvent être refaites
+    bulk_transfer_not_sent = False
+    if individual_transfers:
+        bulk_transfer_payload = {
+            "homeTransactionId": str(home_transaction_id),
+            "bulkTransferId": str(uuid.uuid4()),
+            "bulkQuoteId": bulk_quote.get('bulkQuoteId', bulk_quote_id),
+            "from": _payer(sender_msisdn),
+            "individualTransfers": individual_transfers,
+        }
+        try:
+            response = sdk_client.post("/bulkTransfers", json=bulk_transfer_payload, headers=SDK_HEADERS)
+            response.raise_for_status()
+            bulk_transfer = response.json()
+        except CircuitOpenError as e:
+            bulk_transfer_error = str(e)
+            bulk_transfer_not_sent = True
+        except requests.exceptions.RequestException as e:
+            bulk_transfer_error = _sdk_error_text(e)
+        transfer_results = {
+            result.get('transferId'): result for result in bulk_transfer.get('individualTransferResults', [])
+        }
+
+    results = []
+    for item in items:
+        quote = quote_results.get(item['transfer_id'])
+        if quote is None or _item_error(quote):
+            results.append(_failure_result(_quote_error_text(quote), item['home_transaction_id']))
+            continue
+
+        if bulk_transfer_error:
+            result = _not_sent_result if bulk_transfer_not_sent else _failure_result
+            results.append(result(bulk_transfer_error, item['home_transaction_id']))
+            continue
+
+        transfer_result = transfer_results.get(item['transfer_id'])
+        if transfer_result is None or _item_error(transfer_result):
+            error_text = _item_error(transfer_result) if transfer_result else "Transfer missing from bulk response"
+            results.append(_failure_result(error_text, item['home_transaction_id']))
+            continue
+
+        results.append(_success_result({
+            "transferId": item['transfer_id'],
+            "currentState": bulk_transfer.get('currentState'),
+            "bulkTransferId": bulk_transfer.get('bulkTransferId'),
+            "bulkQuoteId": bulk_quote.get('bulkQuoteId', bulk_quote_id),
+            **transfer_result,
+        }, item['home_transaction_id']))
+
+    return results
+
+
+def get_transfer_state_via_sdk(transfer_id):
+    """
+    État d'un transfert auprès du hub (GET /transfers/{id}) : 'NOT_FOUND' si le hub
+    ne le connaît pas, son currentState sinon, ou None si l'état n'a pas pu être établi.
+    En simulation sans scénario, rien n'a été envoyé : 'NOT_FOUND'.
+    """
+    if _simulated():
+        return 'NOT_FOUND'
+    try:
+        response = sdk_client.get(f"/transfers/{quote(str(transfer_id), safe='')}", headers=SDK_HEADERS)
+        if response.status_code == 404:
+            return 'NOT_FOUND'
+        response.raise_for_status()
+        return response.json().get('currentState')
+    except (requests.exceptions.RequestException, ValueError):
+        return None
+
+
+def _quote_error_text(quote):
+    if quote is None:
+        return "Quote missing from bulk quote response"
+    return f"Quote failed: {_item_error(quote)}"
+
+
+# ---------------------------------------------------------------------------
+# Variante asynchrone (vues ASGI)
+# ---------------------------------------------------------------------------
+
+# Mêmes paramètres que _make_requests_session_with_retries
+SDK_RETRY_TOTAL = 3
+SDK_RETRY_BACKOFF_FACTOR = 0.5
+SDK_RETRY_STATUS_FORCELIST = (500, 502, 503, 504)
+
+
+def _retry_backoff(attempt, backoff_factor=SDK_RETRY_BACKOFF_FACTOR):
+    """Délai avant la tentative `attempt` (1 = première relance), calqué sur urllib3 Retry."""
+    if attempt <= 1:
+        return 0
+    return min(backoff_factor * (2 ** (attempt - 1)), Retry.DEFAULT_BACKOFF_MAX)
+
+
+class AsyncSdkClient:
+    """
+    Client HTTP asynchrone vers le SDK, avec pool de connexions `httpx`.
+
+    Un `httpx.AsyncClient` est lié à la boucle d'événements qui l'a créé : un
+    client est créé par boucle et fermé avec elle. Sous ASGI (Procfile), la boucle
+    du worker vit autant que le processus : un seul pool. Sous WSGI, Django exécute
+    une vue asynchrone dans une boucle éphémère (async_to_sync) ; son client est
+    fermé à l'arrêt de cette boucle, sans fuite de connexions.
+    """
+
+    def __init__(self, base_url=SDK_URL, pool_maxsize=SDK_POOL_MAXSIZE,
+                 connect_timeout=SDK_CONNECT_TIMEOUT, read_timeout=SDK_READ_TIMEOUT,
+                 total_retries=SDK_RETRY_TOTAL, status_forcelist=SDK_RETRY_STATUS_FORCELIST):
+        self.base_url = base_url.rstrip('/')
+        self.limits = httpx.Limits(max_connections=pool_maxsize, max_keepalive_connections=pool_maxsize)
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self.total_retries = total_retries
+        self.status_forcelist = frozenset(status_forcelist)
+        # boucle -> (client, garde de fermeture) ; l'entrée disparaît avec la boucle
+        self._clients = weakref.WeakKeyDictionary()
+
+    async def client(self):
+        """Client de la boucle courante, créé au premier appel."""
+        loop = asyncio.get_running_loop()
+        entry = self._clients.get(loop)
+        if entry is None:
+            if SIMULATION_MODE and SIMULATION_SCENARIO:
+                self.base_url = simulated_hub_url()
+            client = httpx.AsyncClient(base_url=self.base_url, limits=self.limits, timeout=self.timeout)
+            guard = self._close_with_loop(client)
+            await guard.__anext__()
+            entry = self._clients[loop] = (client, guard)
+        return entry[0]
+
+    async def _close_with_loop(self, client):
+        """
+        Générateur suspendu pendant toute la vie de la boucle : asyncio le referme à
+        l'arrêt de celle-ci (shutdown_asyncgens, appelé par asyncio.run, uvicorn et
+        async_to_sync), ce qui ferme le client dans sa propre boucle.
+        """
         try:
-            error_text = getattr(e.response, 'text', None) or str(e)
-        except Exception:
-            error_text = str(e)
-
-        return {
-            "success": False,
-            "error": f"SDK Request Failed: {error_text}",
-            "home_transaction_id": str(home_transaction_id)
-        }
\ No newline at end of file
+            yield
+        finally:
+            await client.aclose()
+
+    def reset(self):
+        """Abandonne les clients existants (refermés dans leur boucle) ; le prochain appel en crée un."""
+        self._clients.clear()
+
+    async def request(self, method, path, **kwargs):
+        """
+        Envoie la requête en relançant sur erreur réseau ou statut de
+        `status_forcelist`, comme le Retry urllib3 du client synchrone
+        (POST uniquement si la connexion n'a pas pu être établie), et sur 429
+        comme SdkClient.request.
+        """
+        # Même disjoncteur et même fenêtre adaptative que le client synchrone :
+        # l'état du SDK et la concurrence du processus sont partagés
+        breaker = sdk_client.breaker
+        limiter = sdk_client.limiter
+        if not breaker.allow():
+            raise AsyncCircuitOpenError(f"SDK indisponible (disjoncteur ouvert, nouvel essai dans {breaker.retry_after():.0f}s)")
+        if not await limiter.aacquire(timeout=SDK_QUEUE_TIMEOUT):
+            breaker.cancel()  # Aucun appel émis : ni succès ni échec
+            raise AsyncCircuitOpenError("SDK saturé : aucune place libre dans la fenêtre d'appels")
+
+        attempt = 0
+        rate_limited = 0
+        ok = False
+        status = None
+        started = time.monotonic()
+        try:
+            while True:
+                retryable = method.upper() in SDK_RETRY_METHODS
+                status = None
+                try:
+                    response = await (await self.client()).request(method, path, **kwargs)
+                    status = response.status_code
+                except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout):
+                    # Requête jamais émise : relance sans risque, quelle que soit la méthode
+                    if attempt >= self.total_retries:
+                        raise
+                except httpx.TransportError:
+                    if not retryable or attempt >= self.total_retries:
+                        raise
+                else:
+                    if response.status_code == 429 and rate_limited < SDK_RATE_LIMIT_RETRIES \
+                            and _replayable(method, path, kwargs.get('json')):
+                        wait = _rate_limit_wait(response, rate_limited)
+                        if wait is not None:
+                            rate_limited += 1
+                            await response.aclose()
+                            await asyncio.sleep(wait)
+                            continue
+                    if not retryable or response.status_code not in self.status_forcelist or attempt >= self.total_retries:
+                        ok = response.status_code < 500
+                        return response
+                attempt += 1
+                await asyncio.sleep(_retry_backoff(attempt))
+        finally:
+            breaker.record(ok)
+            latency = None if path.startswith(LATENCY_EXEMPT_PATHS) else time.monotonic() - started
+            limiter.release(latency, ok and status != 429)
+            metrics.observe_sdk_request(method, path, started, status, attempt + rate_limited)
+
+    async def post(self, path, **kwargs):
+        return await self.request('POST', path, **kwargs)
+
+    async def get(self, path, **kwargs):
+        return await self.request('GET', path, **kwargs)
+
+    async def aclose(self):
+        entry = self._clients.pop(asyncio.get_running_loop(), None)
+        if entry is not None:
+            await entry[0].aclose()
+
+
+async_sdk_client = AsyncSdkClient()
+
+
+def configure_sdk(base_url):
+    """
+    Redirige les clients SDK du processus vers `base_url` et désactive le mode
+    simulation : utilisé par le banc d'essai (commande benchmark) pour viser un
+    substitut local du SDK (transfert/fake_sdk.py).
+    """
+    global SIMULATION_MODE
+    SIMULATION_MODE = False
+    sdk_client.close()
+    sdk_client.base_url = base_url.rstrip('/')
+    sdk_client.breaker.reset()
+    async_sdk_client.base_url = base_url.rstrip('/')
+    async_sdk_client.reset()
+    party_cache.clear()
+
+
+async def aresolve_party(id_type, id_value):
+    """Version asynchrone de resolve_party (même cache, même contrat)."""
+    if _simulated() or not PARTY_RESOLUTION:
+        return None
+
+    party = party_cache.get(id_type, id_value)
+    if party is not None:
+        return party
+
+    try:
+        response = await async_sdk_client.get(_parties_path(id_type, id_value), headers=SDK_HEADERS)
+        body = response.json() if response.content else {}
+    except (httpx.HTTPError, ValueError):
+        return None
+
+    party = _party_from_response(response.status_code, body)
+    if party is not None:
+        party_cache.set(id_type, id_value, party)
+    return party
+
+
+@metrics.timed_transfer
+async def aexecute_p2p_transfer_via_sdk(sender_msisdn, receiver_id_type, receiver_id_value, amount, currency, note, home_transaction_id=None, receiver_fsp_id=None, transfer_id=None):
+    """
+    Version asynchrone de execute_p2p_transfer_via_sdk : même contrat d'entrée
+    et de retour, sans bloquer de thread pendant l'aller-retour SDK.
+    """
+    if home_transaction_id is None:
+        home_transaction_id = uuid.uuid4()
+
+    amount_str = _format_amount(amount)
+
+    if _simulated():
+        return _simulated_transfer_result(sender_msisdn, receiver_id_type, receiver_id_value, amount_str, currency, note, home_transaction_id, transfer_id)
+
+    if not receiver_fsp_id:
+        party = await aresolve_party(receiver_id_type, receiver_id_value)
+        if party is not None:
+            if not party['found']:
+                return _unknown_party_result(party, home_transaction_id)
+            receiver_fsp_id = party['fsp_id']
+
+    payload = _build_transfer_payload(sender_msisdn, receiver_id_type, receiver_id_value, amount_str, currency, note, home_transaction_id, receiver_fsp_id, transfer_id)
+
+    try:
+        response = await async_sdk_client.post("/transfers", json=payload, headers=SDK_HEADERS)
+        response.raise_for_status()
+
+        sdk_data = response.json()
+        _remember_party(receiver_id_type, receiver_id_value, sdk_data)
+        return _success_result(sdk_data, home_transaction_id)
+
+    except AsyncCircuitOpenError as e:
+        return _not_sent_result(str(e), home_transaction_id)
+    except httpx.HTTPError as e:
+        response = getattr(e, 'response', None)
+        error_text = (response.text if response is not None else None) or str(e) or type(e).__name__
+
+        return _failure_result(error_text, home_transaction_id)
@@ -0,0 +1,242 @@
+# transfert/simulation.py
+"""
+Hub Mojaloop simulé du mode simulation (SIMULATION_MODE=true), sur demande.
+
+Sans SIMULATION_SCENARIO, le mode simulation renvoie un succès instantané sans
+aucun appel réseau (transfert/services.py). Avec un scénario, chaque processus
+démarre à la demande un substitut local du SDK (transfert/fake_sdk.py) et y
+dirige ses clients SDK : pool de connexions, relances, disjoncteur, fenêtre
+adaptative et workers de masse tournent comme en production, face à un hub
+dont le comportement est décrit par le scénario (fichier JSON ou YAML) :
+
+    {
+      "seed": 42,
+      "timeout_hold": 35,
+      "default": {
+        "latency": {"distribution": "lognormal", "median": 0.25, "p99": 1.5},
+        "failure_rate": 0.01,
+        "timeout_rate": 0.001,
+        "rate_limit": {"rate": 300, "burst": 600}
+      },
+      "endpoints": {
+        "/parties": {"latency": {"distribution": "uniform", "min": 0.02, "max": 0.08}}
+      },
+      "fsps": {
+        "slowfsp": {"latency": {"distribution": "lognormal", "median": 1.2, "p99": 6}, "rate_limit": {"rate": 20}},
+        "flakyfsp": {"failure_rate": 0.2}
+      },
+      "parties": {"fsps": {"payeefsp": 0.8, "slowfsp": 0.15, "flakyfsp": 0.05}, "not_found_rate": 0.01}
+    }
+
+Profils : `default` s'applique à tout appel ; un profil d'`endpoints`
+(/parties, /transfers, /bulkQuotes, /bulkTransfers) puis de `fsps` (FSP du
+bénéficiaire) remplace clé par clé. Une limite de débit de `default`
+s'applique au hub entier, celle d'un FSP à ses seuls transferts : au-delà,
+le hub répond 429. Une requête en timeout reste sans réponse `timeout_hold`
+secondes (au-delà du timeout de lecture du client).
+
+Distributions de latence (secondes) : constant (value), uniform (min, max),
+normal (mean, stddev), exponential (mean), lognormal (median, p99).
+
+Les parties sont réparties entre FSP selon les poids de `parties.fsps`, de
+façon déterministe (même identifiant, même FSP) ; une part `not_found_rate`
+est inconnue du hub.
+"""
+import json
+import math
+import os
+import random
+import threading
+import time
+import zlib
+
+from .fake_sdk import FakeSdkServer
+
+# Fichier de scénario (JSON, ou YAML si l'extension est .yaml/.yml) ; vide : scénario par défaut
+SIMULATION_SCENARIO = os.environ.get("SIMULATION_SCENARIO", "")
+
+# Hub nominal : latence réaliste, ni échec ni limite
+DEFAULT_SCENARIO = {
+    "default": {"latency": {"distribution": "lognormal", "median": 0.25, "p99": 1.5}},
+    "parties": {"fsps": {"payeefsp": 1.0}},
+}
+
+# Quantile 0,99 de la loi normale centrée réduite
+Z99 = 2.3263
+
+
+class ScenarioError(ValueError):
+    pass
+
+
+def load_scenario(path):
+    """Lit un fichier de scénario JSON ou YAML."""
+    with open(path) as scenario_file:
+        if path.endswith(('.yaml', '.yml')):
+            import yaml
+            return yaml.safe_load(scenario_file) or {}
+        return json.load(scenario_file)
+
+
+class Latency:
+    """Tirage d'une latence selon une distribution du scénario."""
+
+    def __init__(self, spec):
+        spec = dict(spec or {'distribution': 'constant', 'value': 0})
+        self.distribution = spec.pop('distribution', 'constant')
+        try:
+            if self.distribution == 'constant':
+                self.params = (float(spec.get('value', 0)),)
+            elif self.distribution == 'uniform':
+                self.params = (float(spec['min']), float(spec['max']))
+            elif self.distribution == 'normal':
+                self.params = (float(spec['mean']), float(spec['stddev']))
+            elif self.distribution == 'exponential':
+                self.params = (float(spec['mean']),)
+            elif self.distribution == 'lognormal':
+                median, p99 = float(spec['median']), float(spec['p99'])
+                if median <= 0 or p99 < median:
+                    raise ScenarioError("lognormal : median > 0 et p99 >= median requis")
+                self.params = (math.log(median), math.log(p99 / median) / Z99)
+            else:
+                raise ScenarioError(f"Distribution de latence inconnue : {self.distribution}")
+        except KeyError as e:
+            raise ScenarioError(f"Paramètre {e} manquant pour la distribution {self.distribution}")
+
+    def sample(self, rng):
+        if self.distribution == 'constant':
+            value = self.params[0]
+        elif self.distribution == 'uniform':
+            value = rng.uniform(*self.params)
+        elif self.distribution == 'normal':
+            value = rng.gauss(*self.params)
+        elif self.distribution == 'exponential':
+            value = rng.expovariate(1 / self.params[0]) if self.params[0] > 0 else 0.0
+        else:
+            value = rng.lognormvariate(*self.params)
+        return max(0.0, value)
+
+
+class _Bucket:
+    """Seau à jetons d'une limite de débit du hub."""
+
+    def __init__(self, spec):
+        self.rate = float(spec['rate'])
+        self.burst = float(spec.get('burst', max(1.0, self.rate)))
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    def take(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class Scenario:
+    """Comportement du hub simulé (interface attendue par fake_sdk.FakeSdkServer)."""
+
+    PROFILE_KEYS = ('latency', 'failure_rate', 'timeout_rate', 'rate_limit')
+
+    def __init__(self, spec):
+        spec = spec or {}
+        self._random = random.Random(spec.get('seed'))
+        self._lock = threading.Lock()
+        self.timeout_hold = float(spec.get('timeout_hold', 35))
+
+        self.default = self._profile(spec.get('default'))
+        self.endpoints = {name: self._profile(profile) for name, profile in (spec.get('endpoints') or {}).items()}
+        self.fsps = {name: self._profile(profile) for name, profile in (spec.get('fsps') or {}).items()}
+        self._profiles = {}
+
+        # Limites de débit : hub entier (default) et par FSP
+        self.global_bucket = _Bucket(self.default['rate_limit']) if self.default.get('rate_limit') else None
+        self.fsp_buckets = {name: _Bucket(profile['rate_limit']) for name, profile in self.fsps.items() if profile.get('rate_limit')}
+
+        parties = spec.get('parties') or {}
+        weights = parties.get('fsps') or {'payeefsp': 1.0}
+        total = float(sum(weights.values()))
+        if total <= 0:
+            raise ScenarioError("parties.fsps : au moins un poids positif requis")
+        self.party_fsps = []
+        cumulated = 0.0
+        for name, weight in weights.items():
+            cumulated += weight / total
+            self.party_fsps.append((cumulated, name))
+        self.not_found_rate = float(parties.get('not_found_rate', 0))
+
+    def _profile(self, profile):
+        profile = dict(profile or {})
+        unknown = set(profile) - set(self.PROFILE_KEYS)
+        if unknown:
+            raise ScenarioError(f"Clé(s) de profil inconnue(s) : {', '.join(sorted(unknown))}")
+        if 'latency' in profile:
+            profile['latency'] = Latency(profile['latency'])
+        return profile
+
+    def _resolved(self, endpoint, fsp_id):
+        """Profil effectif : default, puis point d'appel, puis FSP du bénéficiaire."""
+        key = (endpoint, fsp_id)
+        profile = self._profiles.get(key)
+        if profile is None:
+            profile = {'latency': Latency(None), 'failure_rate': 0.0, 'timeout_rate': 0.0}
+            for layer in (self.default, self.endpoints.get(endpoint), self.fsps.get(fsp_id)):
+                profile.update({name: value for name, value in (layer or {}).items() if name != 'rate_limit'})
+            self._profiles[key] = profile
+        return profile
+
+    def decide(self, method, endpoint, fsp_id):
+        profile = self._resolved(endpoint, fsp_id)
+        with self._lock:
+            if self.global_bucket and not self.global_bucket.take():
+                return 0.0, 'rate_limited'
+            bucket = self.fsp_buckets.get(fsp_id)
+            if bucket and method == 'POST' and not bucket.take():
+                return 0.0, 'rate_limited'
+            delay = profile['latency'].sample(self._random)
+            draw = self._random.random()
+        if draw < profile['timeout_rate']:
+            return delay, 'timeout'
+        # /bulkTransfers : les échecs sont tirés ligne à ligne (item_fails)
+        if endpoint != '/bulkTransfers' and draw < profile['timeout_rate'] + profile['failure_rate']:
+            return delay, 'error'
+        return delay, 'ok'
+
+    def item_fails(self, fsp_id):
+        rate = self._resolved('/bulkTransfers', fsp_id)['failure_rate']
+        if not rate:
+            return False
+        with self._lock:
+            return self._random.random() < rate
+
+    def party_fsp(self, id_type, id_value):
+        draw = zlib.crc32(f"{id_type}:{id_value}".encode()) / 2 ** 32
+        if draw < self.not_found_rate:
+            return None
+        draw = (draw - self.not_found_rate) / (1 - self.not_found_rate) if self.not_found_rate < 1 else 0.0
+        for threshold, name in self.party_fsps:
+            if draw < threshold:
+                return name
+        return self.party_fsps[-1][1]
+
+
+_hub = None
+_hub_pid = None
+_hub_lock = threading.Lock()
+
+
+def simulated_hub_url():
+    """
+    URL du hub simulé du processus, démarré au premier appel. Un processus
+    forké (workers de masse, gunicorn) démarre le sien.
+    """
+    global _hub, _hub_pid
+    with _hub_lock:
+        if _hub is None or _hub_pid != os.getpid():
+            spec = load_scenario(SIMULATION_SCENARIO) if SIMULATION_SCENARIO else DEFAULT_SCENARIO
+            _hub = FakeSdkServer(Scenario(spec)).start()
+            _hub_pid = os.getpid()
+        return _hub.url
@@ -1,7 +1,9 @@
 from django.urls import path
-from transfert.views import P2PTransferAPIView, TransferListAPIView
+from transfert.views import AsyncP2PTransferView, P2PTransferAPIView, SdkHealthAPIView, TransferListAPIView
 
 urlpatterns = [
     path('transfers/p2p/', P2PTransferAPIView.as_view(), name='p2p-transfer'),
+    path('transfers/p2p/async/', AsyncP2PTransferView.as_view(), name='p2p-transfer-async'),
     path('transfers/', TransferListAPIView.as_view(), name='transfer-list'),
+    path('sdk/health/', SdkHealthAPIView.as_view(), name='sdk-health'),
 ]
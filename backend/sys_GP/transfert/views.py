@@ -1,10 +1,25 @@
+import base64
+import binascii
+import uuid
+from datetime import datetime
+
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Q
+from django.http import JsonResponse
 from django.shortcuts import render
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
 
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 
-from .services import execute_p2p_transfer_via_sdk 
+from .idempotency import IDEMPOTENCY_HEADER, MAX_KEY_LENGTH, REPLAY_HEADERS, fingerprint, p2p_home_transaction_id, p2p_transfer_id, replay_cache
+from .ledger import InsufficientFunds, reserve, settle
+from .payloads import RESULT_FIELDS, apply_sdk_result, archive
+from .services import aexecute_p2p_transfer_via_sdk, execute_p2p_transfer_via_sdk, sdk_health
 from .models import Account, Transfer
 from .serializers import P2PTransferSerializer, TransferListSerializer
 
@@ -39,66 +54,382 @@ class P2PTransferAPIView(APIView):
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        # Appel au service qui exécute le transfert via le SDK/Mojaloop
-        sdk_result = execute_p2p_transfer_via_sdk(
-            sender_msisdn=sender_account.msisdn,
-            receiver_id_type="MSISDN",  # Type par défaut pour P2P
-            receiver_id_value=data['receiver_msisdn'],
-            amount=data['amount'],
-            currency=data.get('currency', 'XOF'),
-            note=data.get('note', 'Transfert P2P')
-        )
+        # Idempotence : une clé déjà vue renvoie le résultat enregistré, sans appel SDK
+        home_transaction_id, error = _home_transaction_id(request.headers, sender_account)
+        if error:
+            return Response(*error)
+        replay = _cached_replay(home_transaction_id, data)
+        if replay is None:
+            replay = _stored_replay(
+                Transfer.objects.filter(home_transaction_id=home_transaction_id).first(), data
+            )
+        if replay is not None:
+            return Response(*replay, headers=REPLAY_HEADERS)
+
+        # Réservation de l'identifiant avant tout mouvement de fonds (index unique)
+        try:
+            new_transfer = Transfer.objects.create(**_initiated_fields(sender_account, data, home_transaction_id))
+        except IntegrityError:
+            replay = _stored_replay(Transfer.objects.get(home_transaction_id=home_transaction_id), data)
+            return Response(*replay, headers=REPLAY_HEADERS)
+
+        # Réservation des fonds sur le compte expéditeur (grand livre), puis appel
+        # au service qui exécute le transfert via le SDK/Mojaloop
+        try:
+            reserve(sender_account, data['amount'], home_transaction_id)
+        except InsufficientFunds as e:
+            sdk_result = _insufficient_funds_result(e, home_transaction_id)
+        else:
+            sdk_result = execute_p2p_transfer_via_sdk(
+                sender_msisdn=sender_account.msisdn,
+                receiver_id_type="MSISDN",  # Type par défaut pour P2P
+                receiver_id_value=data['receiver_msisdn'],
+                amount=data['amount'],
+                currency=data.get('currency', 'XOF'),
+                note=data.get('note', 'Transfert P2P'),
+                home_transaction_id=home_transaction_id,
+                transfer_id=new_transfer.transfer_id,
+            )
         
-        # Enregistrement de la trace locale (succès ou échec)
-        new_transfer = Transfer.objects.create(
-            sender=sender_account,
-            receiver_msisdn=data['receiver_msisdn'],
-            amount=data['amount'],
-            currency=data.get('currency', 'XOF'),
-            transfer_id=sdk_result.get('transfer_id'),
-            home_transaction_id=sdk_result['home_transaction_id'],
-            status='MOJALOOP_COMPLETED' if sdk_result['success'] else 'FAILED',
-            sdk_response_data=sdk_result.get('data') or sdk_result,
-            note=data.get('note', 'Transfert P2P')
-        )
-
-        if sdk_result['success']:
-            return Response({
-                "message": "Mojaloop P2P Transfer COMPLETED.",
-                "transfer_id": new_transfer.transfer_id,
-                "home_transaction_id": new_transfer.home_transaction_id,
-                "status": new_transfer.status,
-                "amount": str(new_transfer.amount),
-                "currency": new_transfer.currency,
-            }, status=status.HTTP_201_CREATED)
+        # Enregistrement de la trace locale (succès ou échec) et règlement de la réservation
+        _apply_result(new_transfer, sdk_result)
+        _record_result(new_transfer)
+
+        body, http_status = _p2p_response(sdk_result, new_transfer)
+        _remember(new_transfer, body, http_status)
+        return Response(body, status=http_status)
+
+
+def _api_policy(view_class, request, *args, **kwargs):
+    """
+    Applique à une requête la politique DRF de `view_class` : parseurs,
+    authentification, permissions et limites de débit. Retourne (requête DRF,
+    None), ou (None, réponse d'erreur rendue) si la requête est refusée.
+    """
+    view = view_class()
+    view.args, view.kwargs = args, kwargs
+    drf_request = view.initialize_request(request, *args, **kwargs)
+    view.request = drf_request
+    view.headers = view.default_response_headers
+    try:
+        view.initial(drf_request, *args, **kwargs)
+        drf_request.data  # Corps lu et validé ici : ParseError est rendu comme par DRF
+    except Exception as exc:
+        response = view.finalize_response(drf_request, view.handle_exception(exc), *args, **kwargs)
+        return None, response.render()
+    return drf_request, None
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncP2PTransferView(View):
+    """
+    Variante asynchrone de P2PTransferAPIView.post, servie par sgp/asgi.py
+    (ex: `uvicorn sgp.asgi:application`). L'aller-retour SDK n'occupe aucun
+    thread : un processus peut porter de nombreux transferts en vol.
+
+    DRF ne sait pas exécuter une vue asynchrone : la politique de
+    P2PTransferAPIView (parseurs, authentification, permissions, limites de
+    débit) est appliquée par _api_policy. Comme pour toute APIView, la
+    protection CSRF relève de l'authentification (SessionAuthentication).
+    """
+    api_view = P2PTransferAPIView
+
+    async def post(self, request, *args, **kwargs):
+        drf_request, denied = await sync_to_async(_api_policy)(self.api_view, request, *args, **kwargs)
+        if denied is not None:
+            return denied
+
+        serializer = P2PTransferSerializer(data=drf_request.data)
+        if not serializer.is_valid():
+            return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        data = serializer.validated_data
+
+        try:
+            sender_account = await Account.objects.aget(msisdn=data['sender_msisdn'])
+        except Account.DoesNotExist:
+            return JsonResponse(
+                {"error": "Sender account not found in local DB."},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        home_transaction_id, error = _home_transaction_id(request.headers, sender_account)
+        if error:
+            return JsonResponse(error[0], status=error[1])
+        replay = _cached_replay(home_transaction_id, data)
+        if replay is None:
+            replay = _stored_replay(
+                await Transfer.objects.filter(home_transaction_id=home_transaction_id).afirst(), data
+            )
+        if replay is not None:
+            return JsonResponse(replay[0], status=replay[1], headers=REPLAY_HEADERS)
+
+        try:
+            new_transfer = await Transfer.objects.acreate(**_initiated_fields(sender_account, data, home_transaction_id))
+        except IntegrityError:
+            replay = _stored_replay(await Transfer.objects.aget(home_transaction_id=home_transaction_id), data)
+            return JsonResponse(replay[0], status=replay[1], headers=REPLAY_HEADERS)
+
+        try:
+            await sync_to_async(reserve)(sender_account, data['amount'], home_transaction_id)
+        except InsufficientFunds as e:
+            sdk_result = _insufficient_funds_result(e, home_transaction_id)
         else:
-            return Response({
-                "message": "Mojaloop P2P Transfer FAILED.",
-                "details": sdk_result.get('error', 'Unknown error'),
-                "home_transaction_id": new_transfer.home_transaction_id,
-            }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+            sdk_result = await aexecute_p2p_transfer_via_sdk(
+                sender_msisdn=sender_account.msisdn,
+                receiver_id_type="MSISDN",
+                receiver_id_value=data['receiver_msisdn'],
+                amount=data['amount'],
+                currency=data.get('currency', 'XOF'),
+                note=data.get('note', 'Transfert P2P'),
+                home_transaction_id=home_transaction_id,
+                transfer_id=new_transfer.transfer_id,
+            )
+
+        _apply_result(new_transfer, sdk_result)
+        await sync_to_async(_record_result)(new_transfer)
+
+        body, http_status = _p2p_response(sdk_result, new_transfer)
+        _remember(new_transfer, body, http_status)
+        return JsonResponse(body, status=http_status)
+
+
+
+def _home_transaction_id(headers, sender_account):
+    """
+    home_transaction_id de la soumission : dérivé de l'en-tête Idempotency-Key
+    s'il est fourni, aléatoire sinon. Retourne (identifiant, erreur).
+    """
+    key = headers.get(IDEMPOTENCY_HEADER)
+    if key is None:
+        return str(uuid.uuid4()), None
+    key = key.strip()
+    if not key or len(key) > MAX_KEY_LENGTH:
+        return None, ({"error": f"{IDEMPOTENCY_HEADER} invalide (1 à {MAX_KEY_LENGTH} caractères)."}, status.HTTP_400_BAD_REQUEST)
+    return p2p_home_transaction_id(sender_account.msisdn, key), None
+
+
+def _initiated_fields(sender_account, data, home_transaction_id):
+    """
+    Transfer local créé (INITIATED) avant l'appel SDK, avec un transferId dérivé
+    du home_transaction_id : le SDK peut renvoyer la requête sans risque de doublon.
+    """
+    return dict(
+        sender=sender_account,
+        receiver_msisdn=data['receiver_msisdn'],
+        amount=data['amount'],
+        currency=data.get('currency', 'XOF'),
+        home_transaction_id=home_transaction_id,
+        transfer_id=p2p_transfer_id(home_transaction_id),
+        status='INITIATED',
+        note=data.get('note', 'Transfert P2P')
+    )
+
+
+def _apply_result(transfer, sdk_result):
+    """Reporte le résultat SDK sur le Transfer local."""
+    transfer.transfer_id = sdk_result.get('transfer_id') or transfer.transfer_id
+    apply_sdk_result(transfer, sdk_result)
+
+
+def _record_result(transfer):
+    """Enregistre le résultat, archive la réponse brute et règle la réservation dans la même transaction."""
+    with transaction.atomic():
+        transfer.save(update_fields=RESULT_FIELDS)
+        archive([transfer])
+        settle(transfer.home_transaction_id, [transfer])
+
+
+def _insufficient_funds_result(error, home_transaction_id):
+    """Résultat d'un transfert refusé avant tout appel SDK, faute de solde disponible."""
+    return {
+        "success": False,
+        "error": str(error),
+        "code": error.code,
+        "home_transaction_id": str(home_transaction_id),
+    }
+
+
+def _data_fingerprint(data):
+    return fingerprint(data['receiver_msisdn'], data['amount'], data.get('currency', 'XOF'))
+
+
+def _mismatch():
+    return {"error": f"{IDEMPOTENCY_HEADER} déjà utilisée pour un transfert différent."}, status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+def _cached_replay(home_transaction_id, data):
+    entry = replay_cache.get(home_transaction_id)
+    if entry is None:
+        return None
+    stored_fingerprint, body, http_status = entry
+    if stored_fingerprint != _data_fingerprint(data):
+        return _mismatch()
+    return body, http_status
+
+
+def _stored_replay(transfer, data):
+    """Réponse rejouée à partir d'un Transfer existant (None s'il n'existe pas)."""
+    if transfer is None:
+        return None
+    if fingerprint(transfer.receiver_msisdn, transfer.amount, transfer.currency) != _data_fingerprint(data):
+        return _mismatch()
+    if transfer.status == 'INITIATED':
+        return {
+            "message": "Transfer already in progress for this Idempotency-Key.",
+            "home_transaction_id": transfer.home_transaction_id,
+        }, status.HTTP_409_CONFLICT
+    sdk_result = {"success": transfer.status == 'MOJALOOP_COMPLETED', "error": transfer.error_message, "code": transfer.error_code}
+    body, http_status = _p2p_response(sdk_result, transfer)
+    _remember(transfer, body, http_status)
+    return body, http_status
+
+
+def _remember(transfer, body, http_status):
+    replay_cache.set(
+        transfer.home_transaction_id,
+        fingerprint(transfer.receiver_msisdn, transfer.amount, transfer.currency),
+        body, http_status,
+    )
+
+
+def _p2p_response(sdk_result, new_transfer):
+    """Corps et statut HTTP de la réponse P2P (partagés par les vues sync et async)."""
+    if sdk_result['success']:
+        return {
+            "message": "Mojaloop P2P Transfer COMPLETED.",
+            "transfer_id": new_transfer.transfer_id,
+            "home_transaction_id": new_transfer.home_transaction_id,
+            "status": new_transfer.status,
+            "amount": str(new_transfer.amount),
+            "currency": new_transfer.currency,
+        }, status.HTTP_201_CREATED
+    if sdk_result.get('code') == InsufficientFunds.code:
+        return {
+            "message": "P2P Transfer REJECTED.",
+            "details": sdk_result['error'],
+            "home_transaction_id": new_transfer.home_transaction_id,
+        }, status.HTTP_422_UNPROCESSABLE_ENTITY
+    return {
+        "message": "Mojaloop P2P Transfer FAILED.",
+        "details": sdk_result.get('error', 'Unknown error'),
+        "home_transaction_id": new_transfer.home_transaction_id,
+    }, status.HTTP_503_SERVICE_UNAVAILABLE
+
+
+class SdkHealthAPIView(APIView):
+    """
+    État du client SDK de ce processus, pour la supervision : disjoncteur
+    (CLOSED / OPEN / HALF_OPEN), fenêtre de concurrence adaptative et cache des parties.
+    """
+
+    def get(self, request):
+        return Response(sdk_health(), status=status.HTTP_200_OK)
 
 
 class TransferListAPIView(APIView):
-    """API pour lister les transactions"""
-    
+    """
+    API pour lister les transactions, de la plus récente à la plus ancienne.
+
+    Pagination par curseur sur (created_at, id) : chaque page est lue directement
+    dans l'index, quel que soit le nombre de transactions déjà parcourues.
+    Le total est exact par défaut ; au-delà de COUNT_EXACT_LIMIT transactions, la
+    liste non filtrée est estimée (PostgreSQL) sauf si `count=exact` est demandé.
+    """
+    DEFAULT_LIMIT = 50
+    MAX_LIMIT = 500
+    COUNT_EXACT_LIMIT = 10000
+
     def get(self, request):
         # Filtres optionnels
         sender_msisdn = request.query_params.get('sender_msisdn')
         status_filter = request.query_params.get('status')
-        limit = int(request.query_params.get('limit', 50))
-        
-        queryset = Transfer.objects.all().order_by('-created_at')
-        
+        count_mode = request.query_params.get('count')
+        try:
+            limit = min(int(request.query_params.get('limit', self.DEFAULT_LIMIT)), self.MAX_LIMIT)
+        except ValueError:
+            return Response({"error": "limit doit être un entier."}, status=status.HTTP_400_BAD_REQUEST)
+        if limit < 1:
+            return Response({"error": "limit doit être positif."}, status=status.HTTP_400_BAD_REQUEST)
+        if count_mode not in (None, '', 'exact', 'estimate'):
+            return Response({"error": "count doit valoir 'exact' ou 'estimate'."}, status=status.HTTP_400_BAD_REQUEST)
+
+        queryset = Transfer.objects.select_related('sender').order_by('-created_at', '-id')
+
         if sender_msisdn:
             queryset = queryset.filter(sender__msisdn=sender_msisdn)
         if status_filter:
             queryset = queryset.filter(status=status_filter)
-        
-        transfers = queryset[:limit]
+        filtered = bool(sender_msisdn or status_filter)
+
+        cursor = request.query_params.get('cursor')
+        page_queryset = queryset
+        if cursor:
+            try:
+                created_at, last_id = _decode_cursor(cursor)
+            except ValueError:
+                return Response({"error": "Curseur invalide."}, status=status.HTTP_400_BAD_REQUEST)
+            page_queryset = queryset.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=last_id)
+            )
+
+        # Une ligne de plus que demandé : indique s'il existe une page suivante
+        transfers = list(page_queryset[:limit + 1])
+        next_cursor = None
+        if len(transfers) > limit:
+            transfers = transfers[:limit]
+            next_cursor = _encode_cursor(transfers[-1])
+
         serializer = TransferListSerializer(transfers, many=True)
-        
+
+        count, count_exact = _transfer_count(queryset, count_mode, filtered, self.COUNT_EXACT_LIMIT)
+
         return Response({
-            "count": queryset.count(),
+            "count": count,
+            "count_exact": count_exact,
+            "next_cursor": next_cursor,
             "transfers": serializer.data
-        }, status=status.HTTP_200_OK)
\ No newline at end of file
+        }, status=status.HTTP_200_OK)
+
+
+def _encode_cursor(transfer):
+    """Curseur opaque désignant la position (created_at, id) d'une transaction."""
+    raw = f"{transfer.created_at.isoformat()}|{transfer.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def _decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, last_id = raw.rsplit('|', 1)
+        created_at = datetime.fromisoformat(created_at)
+        return created_at, int(last_id)
+    except (binascii.Error, UnicodeDecodeError) as e:
+        raise ValueError(str(e))
+
+
+def _transfer_count(queryset, count_mode, filtered, exact_limit):
+    """
+    Total des transactions et son exactitude, (count, exact). Par défaut, le
+    comptage s'arrête à `exact_limit` lignes : en deçà il est exact ; au-delà,
+    la liste non filtrée est estimée à partir des statistiques PostgreSQL.
+    `count=exact` compte toujours tout, `count=estimate` estime d'emblée.
+    """
+    if count_mode != 'exact':
+        if count_mode != 'estimate':
+            bounded = queryset[:exact_limit + 1].count()
+            if bounded <= exact_limit:
+                return bounded, True
+        estimate = _estimated_count() if not filtered else None
+        if estimate is not None:
+            return estimate, False
+    return queryset.count(), True
+
+
+def _estimated_count():
+    """Nombre de transactions selon les statistiques PostgreSQL ; None ailleurs ou si elles manquent."""
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE relname = %s", [Transfer._meta.db_table])
+        row = cursor.fetchone()
+    return row[0] if row and row[0] >= 0 else None
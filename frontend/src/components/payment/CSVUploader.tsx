@@ -3,7 +3,7 @@ import { Upload, FileText, Download, X, AlertCircle } from 'lucide-react';
 import { Button } from '@/components/ui/button';
 import { Card, CardContent } from '@/components/ui/card';
 import { downloadSampleCSV } from '@/utils/helpers';
-import { sendBulkPaymentCSV } from '@/lib/paymentApi';
+import { fetchBulkRecipients, sendBulkPaymentCSV } from '@/lib/paymentApi';
 import { Recipient } from '@/types';
 import { cn } from '@/lib/utils';
 import { useToast } from '@/hooks/use-toast';
@@ -36,14 +36,18 @@ export const CSVUploader = ({ onUpload }: CSVUploaderProps) => {
       try {
         // Envoi du fichier au backend
         const response = await sendBulkPaymentCSV(file);
-        const total = response.data.total_processed || 0;
+        const total = response.data.total_transfers || 0;
         setUploadedFile({ name: file.name, count: total });
         // Stocke le job_id pour la récupération du rapport
         if (response.data.job_id) {
           window.sessionStorage.setItem('last_bulk_job_id', response.data.job_id.toString());
         }
+        // La liste des bénéficiaires est paginée côté backend : on affiche la première page
+        const page = response.data.job_id
+          ? await fetchBulkRecipients(response.data.job_id)
+          : { data: { recipients: [] } };
         // Utilise le numéro comme ID pour le rapport (affichage colonne ID = numéro)
-        const recipients = (response.data.recipients || []).map((r: any, i: number) => ({
+        const recipients = ((page.data as any)?.recipients || []).map((r: any, i: number) => ({
           id: r.phoneNumber || r.valeur_id || r.id || '',
           phoneNumber: r.phoneNumber || r.valeur_id || '',
           fullName: r.fullName || r.nom_complet || '',
@@ -93,6 +93,13 @@ export async function fetchBulkJobStatus(jobId: number) {
   return apiFetch(`${BULK_STATUS_PATH}${jobId}/`, { method: 'GET' });
 }
 
+/**
+ * Récupère une page des bénéficiaires d'un job de transfert de masse
+ */
+export async function fetchBulkRecipients(jobId: number, offset = 0, limit = 1000) {
+  return apiFetch(`/api/v1/bulk/recipients/${jobId}/?offset=${offset}&limit=${limit}`, { method: 'GET' });
+}
+
 /**
  * Récupère les transactions (depuis localStorage en mode démo)
  */